@@ -0,0 +1,202 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+from dotenv import load_dotenv
+from sqlalchemy import text
+from archive import archived_version, read_archived_responses
+
+load_dotenv()
+
+# 커밋 순서가 result_id 순서와 다를 수 있어 워터마크 바로 아래 구간도 다시 읽고 이미 본 응답은 버립니다.
+DELTA_OVERLAP_IDS = int(os.getenv("DELTA_OVERLAP_IDS", "1000"))
+# 삭제된 응답을 반영하기 위해 이 시간이 지나면 전체를 다시 읽습니다.
+DELTA_FULL_RELOAD_SECONDS = float(os.getenv("DELTA_FULL_RELOAD_SECONDS", "3600"))
+DELTA_MAX_FRAMES = int(os.getenv("DELTA_MAX_FRAMES", "16"))
+# "pandas"(기본값)는 응답을 프로세스 메모리에 두고 pandas로 집계하고,
+# "duckdb"는 설문별 로컬 Parquet 스냅샷을 DuckDB SQL로 집계합니다. (snapshot.py, duckdb 설치 필요)
+ANALYTICS_ENGINE = os.getenv("ANALYTICS_ENGINE", "pandas")
+
+RESPONSE_COLUMNS = ['result_id', 'created_at', 'item_key', 'item_title', 'item_type', 'response_content', 'sentiment']
+
+SURVEY_STRUCTURE_QUERY = text("""
+    SELECT CAST(si.item_key AS text), si.item_title, array_agg(io.option_content ORDER BY io.option_id) as options
+    FROM survey_version_items svi
+    JOIN survey_items si ON si.item_id = svi.item_id
+    JOIN item_options io ON si.item_id = io.item_id
+    WHERE svi.survey_id = :sid AND si.item_type != '인풋박스'
+    GROUP BY svi.position, si.item_id, si.item_title ORDER BY svi.position;
+""")
+
+RESPONSES_SQL = """
+    SELECT sr.result_id, sr.completed_at, CAST(si.item_key AS text), si.item_title, si.item_type,
+           COALESCE(io.option_content, ur.response_text) AS response_content,
+           sa.sentiment_label
+    FROM survey_results sr
+    JOIN user_responses ur ON sr.result_id = ur.result_id AND sr.completed_at = ur.completed_at
+    JOIN survey_items si ON ur.item_id = si.item_id
+    LEFT JOIN item_options io ON ur.option_id = io.option_id
+    LEFT JOIN sentiment_analysis sa ON ur.response_id = sa.response_id AND ur.completed_at = sa.completed_at
+    WHERE sr.survey_id = :sid AND sr.status = 'completed'
+"""
+RESPONSES_QUERY = text(RESPONSES_SQL + ";")
+RESPONSES_SINCE_QUERY = text(RESPONSES_SQL + " AND sr.result_id > :after;")
+
+# 보관 파일의 열 이름 -> RESPONSE_COLUMNS
+ARCHIVE_COLUMNS = {'result_id': 'result_id', 'completed_at': 'created_at', 'item_key': 'item_key', 'item_title': 'item_title',
+                   'item_type': 'item_type', 'response_content': 'response_content', 'sentiment_label': 'sentiment'}
+
+
+def load_survey_structure(s, survey_id):
+    """객관식 문항의 [item_key, item_title, options]를 문항 순서대로 반환합니다."""
+    return pd.DataFrame(s.execute(SURVEY_STRUCTURE_QUERY, {"sid": survey_id}).fetchall(), columns=['item_key', 'item_title', 'options'])
+
+
+def load_responses(s, survey_id):
+    """완료된 응답을 (응답, 문항) 한 행씩의 long 형식으로 반환합니다.
+
+    보관된 버전은 Parquet 파일에서 읽고, 보관 이후에 들어온 응답만 DB에서 읽어 덧붙입니다.
+    """
+    archived = archived_version(s, survey_id)
+    if archived is None:
+        return pd.DataFrame(s.execute(RESPONSES_QUERY, {"sid": survey_id}).fetchall(), columns=RESPONSE_COLUMNS)
+    archived_df = read_archived_responses(survey_id, list(ARCHIVE_COLUMNS)).rename(columns=ARCHIVE_COLUMNS)
+    late_df = load_responses_since(s, survey_id, archived.max_result_id)
+    return archived_df if late_df.empty else pd.concat([archived_df, late_df], ignore_index=True)
+
+
+def load_responses_since(s, survey_id, after_result_id):
+    """result_id가 after_result_id보다 큰 완료 응답만 long 형식으로 반환합니다."""
+    return pd.DataFrame(s.execute(RESPONSES_SINCE_QUERY, {"sid": survey_id, "after": after_result_id}).fetchall(), columns=RESPONSE_COLUMNS)
+
+
+def pivot_responses(long_df):
+    """long 형식 응답을 응답자 한 명당 한 행인 표로 바꿉니다."""
+    pivot_df = long_df.pivot_table(
+        index=['result_id', 'created_at'],
+        columns='item_title',
+        values='response_content',
+        aggfunc=lambda x: ', '.join(x.dropna().astype(str))
+    ).reset_index()
+    return pivot_df.rename(columns=pivot_column_name)
+
+
+def pivot_column_name(title):
+    """피벗 표의 문항 열 이름을 화면용으로 줄입니다."""
+    return '만족도' if '만족도' in title else '개선점' if '개선점' in title or '의견' in title else title
+
+
+def option_counts(long_df, item_key, options):
+    """한 문항의 선택지별 응답 수를 선택지 순서대로 반환합니다. 응답이 없는 선택지는 0입니다."""
+    response_counts = long_df[long_df['item_key'] == item_key]['response_content'].value_counts()
+    return pd.Series(0, index=options).add(response_counts, fill_value=0)
+
+
+def _daily_option_counts(long_df):
+    if long_df.empty:
+        return pd.Series(dtype="int64")
+    days = pd.to_datetime(long_df['created_at']).dt.date
+    return long_df.groupby([long_df['item_key'], days, long_df['response_content']]).size()
+
+
+class ResponseFrame:
+    """설문 하나의 응답(long/pivot)과 문항별 일자별 선택지 집계를 메모리에 두고, 새 응답만 읽어 덧붙입니다."""
+
+    def __init__(self, survey_id):
+        self.survey_id = survey_id
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.long_df = pd.DataFrame(columns=RESPONSE_COLUMNS)
+        self.pivot_df = pd.DataFrame()
+        self.daily_counts = pd.Series(dtype="int64")
+        self.seen = set()
+        self.watermark = 0
+        self.loaded_at = None
+
+    def refresh(self, s, full=False):
+        """워터마크 이후의 응답만 읽어 반영하고, 새로 추가된 응답자 수를 반환합니다."""
+        with self.lock:
+            if full or self.loaded_at is None or time.monotonic() - self.loaded_at > DELTA_FULL_RELOAD_SECONDS:
+                self._reset()
+                rows = load_responses(s, self.survey_id)
+                self.loaded_at = time.monotonic()
+            else:
+                rows = load_responses_since(s, self.survey_id, max(0, self.watermark - DELTA_OVERLAP_IDS))
+                rows = rows[~rows['result_id'].isin(self.seen)]
+            if rows.empty:
+                return 0
+
+            # 한 응답자의 행은 같은 트랜잭션에서 저장되므로, 새 응답자 단위로 피벗해 이어 붙여도 결과가 같습니다.
+            self.long_df = pd.concat([self.long_df, rows], ignore_index=True) if not self.long_df.empty else rows.reset_index(drop=True)
+            new_pivot = pivot_responses(rows)
+            self.pivot_df = pd.concat([self.pivot_df, new_pivot], ignore_index=True) if not self.pivot_df.empty else new_pivot
+            self.daily_counts = self.daily_counts.add(_daily_option_counts(rows), fill_value=0) if not self.daily_counts.empty else _daily_option_counts(rows)
+            new_ids = set(rows['result_id'].unique())
+            self.seen |= new_ids
+            self.watermark = max(self.watermark, max(new_ids))
+            return len(new_ids)
+
+    def snapshot(self):
+        """화면에서 수정해도 공유 프레임에 영향이 없도록 (pivot, long) 복사본을 반환합니다."""
+        with self.lock:
+            if self.pivot_df.empty:
+                return pd.DataFrame(), pd.DataFrame()
+            return self.pivot_df.copy(), self.long_df.copy()
+
+    def has_responses(self):
+        with self.lock:
+            return not self.pivot_df.empty
+
+    def between(self, start_date, end_date):
+        """완료 시간이 기간 안인 (pivot, long) 응답을 복사본으로 반환합니다."""
+        pivot_df, long_df = self.snapshot()
+        if pivot_df.empty:
+            return pivot_df, long_df
+        pivot_df['created_at'] = pd.to_datetime(pivot_df['created_at'])
+        long_df['created_at'] = pd.to_datetime(long_df['created_at'])
+        return (pivot_df[(pivot_df['created_at'].dt.date >= start_date) & (pivot_df['created_at'].dt.date <= end_date)],
+                long_df[(long_df['created_at'].dt.date >= start_date) & (long_df['created_at'].dt.date <= end_date)])
+
+    def option_counts_between(self, item_key, options, start_date, end_date):
+        """기간 안의 선택지별 응답 수를 누적 집계에서 바로 계산합니다."""
+        with self.lock:
+            if self.daily_counts.empty or item_key not in self.daily_counts.index.get_level_values(0):
+                return pd.Series(0, index=options)
+            per_item = self.daily_counts.loc[item_key]
+            days = per_item.index.get_level_values(0)
+            in_range = per_item[(days >= start_date) & (days <= end_date)]
+            return pd.Series(0, index=options).add(in_range.groupby(level=1).sum(), fill_value=0)
+
+
+class ResponseFrameStore:
+    """프로세스 안에서 설문별 ResponseFrame(또는 frame_class)을 최근 사용 순으로 최대 max_frames개까지 보관합니다."""
+
+    def __init__(self, max_frames=DELTA_MAX_FRAMES, frame_class=ResponseFrame):
+        self.max_frames = max_frames
+        self.frame_class = frame_class
+        self._lock = threading.Lock()
+        self._frames = OrderedDict()
+
+    def get(self, survey_id):
+        with self._lock:
+            frame = self._frames.get(survey_id)
+            if frame is None:
+                frame = self._frames[survey_id] = self.frame_class(survey_id)
+            self._frames.move_to_end(survey_id)
+            while len(self._frames) > self.max_frames:
+                self._frames.popitem(last=False)
+            return frame
+
+
+response_frames = ResponseFrameStore()
+
+
+def get_response_frames():
+    """ANALYTICS_ENGINE에 맞는 프레임 저장소를 반환합니다. duckdb는 선택 설치이므로 쓸 때만 불러옵니다."""
+    if ANALYTICS_ENGINE == "duckdb":
+        from snapshot import snapshot_frames
+        return snapshot_frames
+    return response_frames
@@ -0,0 +1,215 @@
+"""닫힌 설문 버전의 응답을 Parquet으로 보관하고, 보관이 끝난 달의 응답 파티션을 떼어냅니다.
+
+하루 한 번 정도 cron 등으로 실행합니다. 실행할 때마다 앞으로 쓸 월 파티션을 미리 만들고, 오래된 임시 저장 응답도 지웁니다.
+
+    python archive.py
+
+닫힌 버전: 그룹의 최신 버전이 아니고, 최근 ARCHIVE_AFTER_DAYS일 동안 응답도 발송 예약도 없는 버전.
+survey_results는 응답자당 한 행이라 작고 발송 현황/중복 응답 확인에 쓰이므로 남겨 두고,
+행 수가 대부분인 user_responses와 sentiment_analysis의 월 파티션만 떼어내 지웁니다.
+"""
+import logging
+import os
+import re
+from datetime import date, datetime, timedelta
+from pathlib import Path
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+from response_store import delete_stale_drafts
+
+load_dotenv()
+
+db_user = os.getenv("DB_USER")
+db_password = os.getenv("DB_PASSWORD")
+db_host = os.getenv("DB_HOST")
+db_port = os.getenv("DB_PORT")
+db_name = os.getenv("DB_NAME")
+
+db_uri = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
+
+# 보관 파일은 ARCHIVE_DIR/responses/survey_id=<버전>/ 아래에 저장됩니다. (hive 형식 디렉터리)
+ARCHIVE_DIR = Path(os.getenv("ARCHIVE_DIR", "archive"))
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+ARCHIVE_COMPRESSION = os.getenv("ARCHIVE_COMPRESSION", "zstd")
+ARCHIVE_CHUNK_ROWS = int(os.getenv("ARCHIVE_CHUNK_ROWS", "50000"))
+ARCHIVE_LOCK_TIMEOUT = os.getenv("ARCHIVE_LOCK_TIMEOUT", "5s")
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+
+RESPONSES_ROOT = ARCHIVE_DIR / "responses"
+
+logger = logging.getLogger("survey.archive")
+
+ARCHIVE_SCHEMA = pa.schema([
+    ("result_id", pa.int32()),
+    ("status", pa.string()),
+    ("completed_at", pa.timestamp("us")),
+    ("response_id", pa.int32()),
+    ("item_id", pa.int32()),
+    ("item_key", pa.string()),
+    ("item_title", pa.string()),
+    ("item_type", pa.string()),
+    ("option_id", pa.int32()),
+    ("response_content", pa.string()),
+    ("sentiment_label", pa.string()),
+    ("sentiment_score", pa.float64()),
+])
+# 디렉터리 이름(survey_id=<버전>)으로 나뉘는 열입니다. 스키마를 고정해 두면 파일을 열어 추론하지 않습니다.
+PARTITIONING = ds.partitioning(pa.schema([("survey_id", pa.int32())]), flavor="hive")
+
+ENSURE_PARTITIONS = text("""
+    SELECT create_response_partitions((CURRENT_DATE - :back * interval '1 month')::date, (CURRENT_DATE + :ahead * interval '1 month')::date);
+""")
+
+CLOSED_VERSIONS = text("""
+    SELECT s.survey_id
+    FROM surveys s
+    JOIN survey_groups g ON g.survey_group_id = s.survey_group_id
+    WHERE g.latest_survey_id <> s.survey_id AND g.deleted_at IS NULL
+      AND NOT EXISTS (SELECT 1 FROM survey_archives a WHERE a.survey_id = s.survey_id)
+      AND EXISTS (SELECT 1 FROM survey_results sr WHERE sr.survey_id = s.survey_id)
+      AND NOT EXISTS (SELECT 1 FROM survey_results sr WHERE sr.survey_id = s.survey_id AND sr.completed_at > :cutoff)
+      AND NOT EXISTS (SELECT 1 FROM survey_sends ss WHERE ss.survey_id = s.survey_id AND ss.scheduled_at > :cutoff)
+    ORDER BY s.survey_id;
+""")
+
+# 완료 시간 순으로 정렬해 저장하므로 행 그룹 통계로 기간 조건을 건너뛸 수 있습니다.
+EXPORT_RESPONSES = text("""
+    SELECT sr.result_id, sr.status, sr.completed_at, ur.response_id, ur.item_id, CAST(si.item_key AS text) AS item_key,
+           si.item_title, si.item_type, ur.option_id, COALESCE(io.option_content, ur.response_text) AS response_content,
+           sa.sentiment_label, sa.sentiment_score
+    FROM survey_results sr
+    JOIN user_responses ur ON ur.result_id = sr.result_id AND ur.completed_at = sr.completed_at
+    JOIN survey_items si ON si.item_id = ur.item_id
+    LEFT JOIN item_options io ON io.option_id = ur.option_id
+    LEFT JOIN sentiment_analysis sa ON sa.response_id = ur.response_id AND sa.completed_at = ur.completed_at
+    WHERE sr.survey_id = :sid
+    ORDER BY sr.completed_at, sr.result_id, ur.response_id;
+""")
+
+RECORD_ARCHIVE = text("""
+    INSERT INTO survey_archives (survey_id, path, row_count, max_result_id) VALUES (:sid, :path, :rows, :max_result_id);
+""")
+
+ARCHIVE_INFO = text("SELECT path, max_result_id FROM survey_archives WHERE survey_id = :sid;")
+
+MONTH_PARTITIONS = text("""
+    SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'user_responses'::regclass
+    ORDER BY c.relname;
+""")
+
+# 그 달의 응답자가 모두 보관 파일에 들어 있어야 파티션을 떼어낼 수 있습니다.
+MONTH_FULLY_ARCHIVED = text("""
+    SELECT NOT EXISTS (
+        SELECT 1 FROM survey_results sr
+        WHERE sr.completed_at >= :start AND sr.completed_at < :end
+          AND NOT EXISTS (SELECT 1 FROM survey_archives a WHERE a.survey_id = sr.survey_id AND a.max_result_id >= sr.result_id)
+    );
+""")
+
+PARTITION_NAME = re.compile(r"^user_responses_(\d{4})_(\d{2})$")
+
+
+def ensure_response_partitions(s, months_back=0, months_ahead=PARTITION_MONTHS_AHEAD):
+    """앞으로 쓸 월 파티션을 미리 만들고, 새로 만든 달의 수를 반환합니다. 커밋은 호출하는 쪽에서 합니다."""
+    return s.execute(ENSURE_PARTITIONS, {"back": months_back, "ahead": months_ahead}).scalar_one()
+
+
+def archive_path(survey_id):
+    return RESPONSES_ROOT / f"survey_id={survey_id}" / f"{survey_id}.parquet"
+
+
+def export_version(engine, survey_id):
+    """설문 버전 하나의 응답 전체를 Parquet 파일로 내보내고 survey_archives에 기록합니다."""
+    path = archive_path(survey_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # 점으로 시작하는 파일은 pyarrow 데이터셋 탐색에서 제외되므로, 쓰는 도중의 파일을 읽을 일이 없습니다.
+    tmp_path = path.parent / f".{path.name}.tmp"
+    rows, max_result_id = 0, 0
+    with Session(engine) as s:
+        result = s.execute(EXPORT_RESPONSES.execution_options(yield_per=ARCHIVE_CHUNK_ROWS), {"sid": survey_id})
+        with pq.ParquetWriter(tmp_path, ARCHIVE_SCHEMA, compression=ARCHIVE_COMPRESSION) as writer:
+            for chunk in result.mappings().partitions():
+                table = pa.Table.from_pylist([dict(row) for row in chunk], schema=ARCHIVE_SCHEMA)
+                writer.write_table(table, row_group_size=ARCHIVE_CHUNK_ROWS)
+                rows += table.num_rows
+                max_result_id = max(max_result_id, max(row["result_id"] for row in chunk))
+        os.replace(tmp_path, path)
+        s.execute(RECORD_ARCHIVE, {"sid": survey_id, "path": str(path), "rows": rows, "max_result_id": max_result_id})
+        s.commit()
+    logger.info("archived survey %s: %s rows -> %s", survey_id, rows, path)
+    return rows
+
+
+def detach_archived_months(engine, cutoff):
+    """cutoff 이전에 끝난 달 중 응답이 모두 보관된 달의 user_responses/sentiment_analysis 파티션을 떼어내 지웁니다."""
+    detached = []
+    with Session(engine) as s:
+        names = s.execute(MONTH_PARTITIONS).scalars().all()
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if not match:
+            continue
+        start = date(int(match[1]), int(match[2]), 1)
+        end = (start + timedelta(days=32)).replace(day=1)
+        if end > cutoff.date():
+            continue
+        suffix = f"{match[1]}_{match[2]}"
+        with Session(engine) as s:
+            s.execute(text(f"SET LOCAL lock_timeout = '{ARCHIVE_LOCK_TIMEOUT}';"))
+            if not s.execute(MONTH_FULLY_ARCHIVED, {"start": start, "end": end}).scalar_one():
+                continue
+            # sentiment_analysis가 user_responses를 참조하므로 먼저 떼어냅니다.
+            for table in ("sentiment_analysis", "user_responses"):
+                s.execute(text(f'ALTER TABLE {table} DETACH PARTITION "{table}_{suffix}";'))
+                s.execute(text(f'DROP TABLE "{table}_{suffix}";'))
+            s.commit()
+        detached.append(suffix)
+        logger.info("detached response partitions for %s", suffix)
+    return detached
+
+
+def run_archive(engine):
+    cutoff = datetime.now() - timedelta(days=ARCHIVE_AFTER_DAYS)
+    with Session(engine) as s:
+        created = ensure_response_partitions(s)
+        stale_drafts = delete_stale_drafts(s)
+        survey_ids = s.execute(CLOSED_VERSIONS, {"cutoff": cutoff}).scalars().all()
+        s.commit()
+    for survey_id in survey_ids:
+        export_version(engine, survey_id)
+    detached = detach_archived_months(engine, cutoff)
+    return {"partitions_created": created, "stale_drafts_deleted": stale_drafts, "archived_versions": list(survey_ids), "detached_months": detached}
+
+
+def archived_version(s, survey_id):
+    """보관된 버전이면 (파일 경로, 파일에 든 마지막 result_id)를, 아니면 None을 반환합니다."""
+    return s.execute(ARCHIVE_INFO, {"sid": survey_id}).one_or_none()
+
+
+def read_archived_responses(survey_id, columns):
+    """보관 파일에서 한 버전의 완료 응답을 읽습니다.
+
+    survey_id 디렉터리 조건과 status 조건을 pyarrow에 넘겨, 다른 버전의 파일과 필요 없는 행 그룹은 읽지 않습니다.
+    """
+    dataset = ds.dataset(RESPONSES_ROOT, schema=ARCHIVE_SCHEMA.append(pa.field("survey_id", pa.int32())),
+                         format="parquet", partitioning=PARTITIONING)
+    table = dataset.to_table(
+        columns=columns,
+        filter=(ds.field("survey_id") == survey_id) & (ds.field("status") == "completed"),
+    )
+    return table.to_pandas()
+
+
+def remove_archive_files(paths):
+    for path in paths:
+        Path(path).unlink(missing_ok=True)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(run_archive(create_engine(db_uri)))
@@ -0,0 +1,103 @@
+"""자주 실행되는 조회의 실행 계획을 확인합니다. bench/synthetic_data.py로 만든 로컬 Postgres에서 실행합니다.
+
+조회마다 EXPLAIN을 실행해, 행이 --min-rows 이상인 테이블(파티션)을 순차 스캔하는 조회가 있으면 실패(종료 코드 1)합니다.
+작은 테이블은 순차 스캔이 더 빠를 수 있으므로 검사하지 않습니다.
+
+    python bench/synthetic_data.py --truncate --surveys 20 --versions 3 --results 100000
+    python bench/explain_check.py
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from analytics import RESPONSES_QUERY, RESPONSES_SINCE_QUERY, SURVEY_STRUCTURE_QUERY  # noqa: E402
+from response_store import FIND_DRAFT  # noqa: E402
+from send_store import COMPLETED_USERS_QUERY, COUNT_NON_RESPONDERS, TARGET_COUNT_QUERY  # noqa: E402
+from synthetic_data import bench_engine  # noqa: E402
+
+# 페이지 코드 안에 직접 쓰인 조회는 같은 SQL을 여기에 둡니다.
+DUPLICATE_CHECK = text("SELECT status FROM survey_results WHERE send_id = :send_id AND email = :email;")
+RESPONDENT_ITEMS = text("""
+    SELECT si.item_id, si.item_title, si.item_type, array_agg(io.option_content ORDER BY io.option_id) as options, array_agg(io.option_id ORDER BY io.option_id) as option_ids
+    FROM survey_version_items svi
+    JOIN survey_items si ON si.item_id = svi.item_id
+    LEFT JOIN item_options io ON si.item_id = io.item_id
+    WHERE svi.survey_id = :sid
+    GROUP BY svi.position, si.item_id, si.item_title, si.item_type
+    ORDER BY svi.position;
+""")
+GROUP_VERSIONS = text("SELECT version FROM surveys WHERE survey_group_id = :group_id ORDER BY version DESC;")
+SURVEY_BY_VERSION = text("SELECT survey_id FROM surveys WHERE survey_group_id = :gid AND version = :ver;")
+
+# 응답 수가 중간인 설문을 기준으로 봅니다. 가장 큰 설문은 전체의 큰 비율이라 순차 스캔이 맞는 계획일 수 있습니다.
+TYPICAL_SURVEY = text("""
+    WITH counts AS (
+        SELECT survey_id, count(*) AS n FROM survey_results WHERE status = 'completed' GROUP BY survey_id
+    )
+    SELECT c.survey_id, s.survey_group_id, s.version, (SELECT max(result_id) FROM survey_results) AS max_result_id
+    FROM counts c JOIN surveys s ON s.survey_id = c.survey_id
+    ORDER BY c.n LIMIT 1 OFFSET (SELECT count(*) / 2 FROM counts);
+""")
+SAMPLE_RESULT = text("""
+    SELECT send_id, email FROM survey_results WHERE survey_id = :sid AND send_id IS NOT NULL AND status = 'completed' LIMIT 1;
+""")
+TABLE_ROWS = text("SELECT relname, reltuples FROM pg_class WHERE relkind IN ('r', 'p');")
+
+
+def hot_queries(params):
+    sid, send_id, email = params["survey_id"], params["send_id"], params["email"]
+    return {
+        "respondent.duplicate_check": (DUPLICATE_CHECK, {"send_id": send_id, "email": email}),
+        "respondent.items": (RESPONDENT_ITEMS, {"sid": sid}),
+        "respondent.find_draft": (FIND_DRAFT, {"sid": sid, "send_id": send_id, "email": email}),
+        "dashboard.versions": (GROUP_VERSIONS, {"group_id": params["survey_group_id"]}),
+        "dashboard.survey_by_version": (SURVEY_BY_VERSION, {"gid": params["survey_group_id"], "ver": params["version"]}),
+        "dashboard.structure": (SURVEY_STRUCTURE_QUERY, {"sid": sid}),
+        "dashboard.responses": (RESPONSES_QUERY, {"sid": sid}),
+        "dashboard.responses_since": (RESPONSES_SINCE_QUERY, {"sid": sid, "after": params["max_result_id"] - 100}),
+        "dashboard.target_count": (TARGET_COUNT_QUERY, {"sid": sid}),
+        "send.completed_users": (COMPLETED_USERS_QUERY, {"send_id": send_id}),
+        "send.non_responders": (COUNT_NON_RESPONDERS, {"send_ids": [send_id]}),
+    }
+
+
+def seq_scans(plan):
+    """실행 계획 트리에서 순차 스캔하는 테이블 이름을 모두 찾습니다."""
+    found = [plan["Relation Name"]] if plan["Node Type"] == "Seq Scan" else []
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+def check(args):
+    engine = bench_engine(args.dsn)
+    with Session(engine) as s:
+        typical = s.execute(TYPICAL_SURVEY).one_or_none()
+        if typical is None:
+            raise SystemExit("완료된 응답이 없습니다. 먼저 bench/synthetic_data.py로 데이터를 만드세요.")
+        sample = s.execute(SAMPLE_RESULT, {"sid": typical.survey_id}).one()
+        params = {**typical._asdict(), "send_id": sample.send_id, "email": sample.email}
+        table_rows = dict(s.execute(TABLE_ROWS).all())
+
+        failures = 0
+        for name, (query, query_params) in hot_queries(params).items():
+            plan = s.execute(text(f"EXPLAIN (FORMAT JSON) {query.text}"), query_params).scalar_one()
+            plan = (json.loads(plan) if isinstance(plan, str) else plan)[0]["Plan"]
+            large = sorted({table for table in seq_scans(plan) if table_rows.get(table, 0) >= args.min_rows})
+            failures += bool(large)
+            detail = f"seq scan on {', '.join(large)}" if large else ""
+            print(f"  {name:30s} cost {plan['Total Cost']:>12.1f}  {'FAIL' if large else 'ok':4s}  {detail}")
+    print(f"survey_id={params['survey_id']}, {failures} failing queries")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", help="기본값은 BENCH_DB_URI 환경변수")
+    parser.add_argument("--min-rows", type=int, default=10000, help="이 행 수 이상인 테이블의 순차 스캔만 실패로 봅니다")
+    check(parser.parse_args())
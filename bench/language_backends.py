@@ -0,0 +1,83 @@
+"""Azure Language 기록과 로컬 분석기를 비교하는 오프라인 벤치마크.
+
+기록 파일은 한 줄에 하나씩 {"text": ..., "sentiment": ..., "key_phrases": [...]} 형식의 JSONL입니다.
+
+    # 주관식 답변(한 줄에 하나)을 Azure로 분석해 기록 파일 만들기
+    python bench/language_backends.py record answers.txt azure_recorded.jsonl
+
+    # 기록 파일 기준으로 로컬 분석기의 처리량과 일치율 측정
+    python bench/language_backends.py compare azure_recorded.jsonl
+"""
+import argparse
+import json
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from text_analysis import AzureLanguageBackend, LocalLanguageBackend  # noqa: E402
+
+
+def record(source, output):
+    texts = [line.strip() for line in Path(source).read_text(encoding="utf-8").splitlines() if line.strip()]
+    backend = AzureLanguageBackend()
+    sentiments = backend.analyze_sentiment(texts)
+    key_phrases = backend.extract_key_phrases(texts)
+    with open(output, "w", encoding="utf-8") as f:
+        for text, (label, score), phrases in zip(texts, sentiments, key_phrases):
+            f.write(json.dumps({"text": text, "sentiment": label, "score": score, "key_phrases": phrases}, ensure_ascii=False) + "\n")
+    print(f"recorded {len(texts)} documents -> {output}")
+
+
+def compare(recorded, batch_size, repeat):
+    rows = [json.loads(line) for line in Path(recorded).read_text(encoding="utf-8").splitlines() if line.strip()]
+    texts = [row["text"] for row in rows]
+    backend = LocalLanguageBackend()
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        sentiments, key_phrases = [], []
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            sentiments.extend(backend.analyze_sentiment(batch))
+            key_phrases.extend(backend.extract_key_phrases(batch))
+    elapsed = time.perf_counter() - started
+
+    labeled = [(row["sentiment"], label) for row, (label, _) in zip(rows, sentiments) if row.get("sentiment")]
+    agreement = sum(expected == actual for expected, actual in labeled) / len(labeled) if labeled else None
+    overlaps = []
+    for row, phrases in zip(rows, key_phrases):
+        expected = {p.lower() for p in row.get("key_phrases", [])}
+        actual = {p.lower() for p in phrases}
+        if expected or actual:
+            overlaps.append(len(expected & actual) / len(expected | actual))
+
+    report = {
+        "documents": len(texts),
+        "batch_size": batch_size,
+        "docs_per_second": round(len(texts) * repeat / elapsed, 1) if elapsed else None,
+        "sentiment_agreement": round(agreement, 4) if agreement is not None else None,
+        "sentiment_confusion": {f"{e}->{a}": n for (e, a), n in sorted(Counter(labeled).items())},
+        "key_phrase_jaccard": round(sum(overlaps) / len(overlaps), 4) if overlaps else None,
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    record_parser = sub.add_parser("record")
+    record_parser.add_argument("source")
+    record_parser.add_argument("output")
+    compare_parser = sub.add_parser("compare")
+    compare_parser.add_argument("recorded")
+    compare_parser.add_argument("--batch-size", type=int, default=500)
+    compare_parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.source, args.output)
+    else:
+        compare(args.recorded, args.batch_size, args.repeat)
@@ -0,0 +1,310 @@
+"""분석/쓰기 경로 벤치마크. bench/synthetic_data.py로 만든 로컬 Postgres에서 실행합니다.
+
+결과는 커밋별 JSON으로 저장되므로 두 커밋의 결과를 비교해 회귀를 찾을 수 있습니다.
+
+    # 응답이 가장 많은 설문을 대상으로 측정하고 bench/results/<커밋>.json에 저장
+    python bench/suite.py run
+
+    # 두 결과 비교 (중앙값이 10% 넘게 느려진 항목은 REGRESSION으로 표시)
+    python bench/suite.py compare bench/results/abc1234.json bench/results/def5678.json
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from analytics import ResponseFrame, load_responses, load_survey_structure, option_counts, pivot_responses  # noqa: E402
+from response_store import SubmissionBuffer, prepare_submission, save_responses  # noqa: E402
+from send_store import count_sends, list_completed_users, list_sends  # noqa: E402
+from survey_store import list_survey_groups  # noqa: E402
+from synthetic_data import NEGATIVE_ANSWERS, POSITIVE_ANSWERS, bench_engine  # noqa: E402
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+BUSIEST_SURVEY = text("""
+    SELECT survey_id FROM survey_results WHERE status = 'completed'
+    GROUP BY survey_id ORDER BY count(*) DESC LIMIT 1;
+""")
+
+SUBMISSION_ITEMS = text("""
+    SELECT si.item_id, si.item_type, array_agg(io.option_id ORDER BY io.option_id) AS option_ids
+    FROM survey_version_items svi
+    JOIN survey_items si ON si.item_id = svi.item_id
+    LEFT JOIN item_options io ON io.item_id = si.item_id
+    WHERE svi.survey_id = :sid
+    GROUP BY svi.position, si.item_id, si.item_type ORDER BY svi.position;
+""")
+
+
+def _git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return commit, dirty
+
+
+def _summary(samples_ms):
+    ordered = sorted(samples_ms)
+    return {
+        "runs": len(ordered),
+        "min_ms": round(ordered[0], 2),
+        "median_ms": round(statistics.median(ordered), 2),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+        "mean_ms": round(statistics.fmean(ordered), 2),
+    }
+
+
+def measure(fn, repeat, warmup=1):
+    """fn을 warmup회 실행한 뒤 repeat회 측정하고, 마지막 반환값과 통계를 돌려줍니다."""
+    result = None
+    for _ in range(warmup):
+        result = fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return result, _summary(samples)
+
+
+def bench_analytics(engine, survey_id, repeat):
+    cases = {}
+    with Session(engine) as s:
+        long_df, cases["responses.fetch"] = measure(lambda: load_responses(s, survey_id), repeat)
+        structure_df, cases["responses.structure"] = measure(lambda: load_survey_structure(s, survey_id), repeat)
+    _, cases["responses.pivot"] = measure(lambda: pivot_responses(long_df), repeat)
+    _, cases["responses.distributions"] = measure(
+        lambda: [option_counts(long_df, row["item_key"], row["options"]) for _, row in structure_df.iterrows()], repeat
+    )
+    return cases, {"response_rows": len(long_df), "choice_items": len(structure_df)}
+
+
+def bench_engines(engine, survey_id, repeat):
+    """대시보드 한 번 그리기(기간 필터 + 피벗 + 문항별 분포)를 pandas 프레임과 DuckDB 스냅샷(snapshot.py)으로 비교합니다.
+
+    cold는 처음 열 때(전체 적재/추출 포함), warm은 적재된 뒤 기간만 바꿔 다시 그릴 때입니다. duckdb가 없으면 건너뜁니다.
+    """
+    try:
+        from snapshot import SnapshotFrame
+    except ImportError:
+        print("duckdb가 설치되어 있지 않아 engines 측정을 건너뜁니다.")
+        return {}, {}
+    with Session(engine) as s:
+        structure_df = load_survey_structure(s, survey_id)
+        days = s.execute(text("SELECT min(completed_at)::date, max(completed_at)::date FROM survey_results WHERE survey_id = :sid AND status = 'completed';"),
+                         {"sid": survey_id}).one()
+
+    def render(frame):
+        pivot_df, long_df = frame.between(*days)
+        counts = [frame.option_counts_between(row["item_key"], row["options"], *days) for _, row in structure_df.iterrows()]
+        return pivot_df, counts
+
+    cases = {}
+    with tempfile.TemporaryDirectory() as root:
+        for name, make_frame in (("pandas", ResponseFrame), ("duckdb", lambda sid: SnapshotFrame(sid, root=root))):
+            def cold():
+                frame = make_frame(survey_id)
+                with Session(engine) as s:
+                    frame.refresh(s, full=True)
+                render(frame)
+                return frame
+            # 전체 적재는 느릴 수 있어 한 번만 잽니다.
+            frame, cases[f"engine.{name}.cold"] = measure(cold, 1, warmup=0)
+            _, cases[f"engine.{name}.warm"] = measure(lambda: render(frame), repeat)
+    return cases, {"engine_days": [str(day) for day in days]}
+
+
+def build_submissions(engine, survey_id, count):
+    with Session(engine) as s:
+        items = s.execute(SUBMISSION_ITEMS, {"sid": survey_id}).all()
+        send_id = s.execute(text("SELECT send_id FROM survey_sends WHERE survey_id = :sid LIMIT 1;"), {"sid": survey_id}).scalar_one()
+    answers = POSITIVE_ANSWERS + NEGATIVE_ANSWERS
+    submissions = []
+    for n in range(count):
+        responses = {}
+        for i, (item_id, item_type, option_ids) in enumerate(items):
+            if item_type == "라디오버튼":
+                responses[item_id] = {"option_id": option_ids[(n + i) % len(option_ids)]}
+            elif item_type == "체크박스":
+                responses[item_id] = option_ids[(n + i) % len(option_ids)::3]
+            else:
+                responses[item_id] = {"text": answers[(n + i) % len(answers)]}
+        submissions.append((send_id, f"bench{n}@example.com", responses))
+    return submissions
+
+
+def bench_submissions(engine, survey_id, count, sentiment):
+    """응답 제출을 한 건씩 커밋하며 측정하고, 측정이 끝나면 만든 행을 지웁니다."""
+    analyze = None
+    if sentiment == "local":
+        from text_analysis import LocalLanguageBackend
+        backend = LocalLanguageBackend()
+        analyze = lambda text_document: backend.analyze_sentiment([text_document])[0]  # noqa: E731
+
+    samples, result_ids = [], []
+    started_all = time.perf_counter()
+    try:
+        for send_id, email, responses in build_submissions(engine, survey_id, count):
+            started = time.perf_counter()
+            with Session(engine) as s:
+                result_ids.append(save_responses(s, survey_id, send_id, email, responses, analyze_sentiment=analyze))
+                s.commit()
+            samples.append((time.perf_counter() - started) * 1000)
+        elapsed = time.perf_counter() - started_all
+    finally:
+        with Session(engine) as s:
+            s.execute(text("DELETE FROM survey_results WHERE result_id = ANY(:ids);"), {"ids": result_ids})
+            s.commit()
+    return {"submit.save_responses": {**_summary(samples), "submissions_per_second": round(count / elapsed, 1)}}
+
+
+def bench_concurrent_submissions(engine, survey_id, count, concurrency):
+    """같은 동시 제출 부하에서 제출마다 커밋하는 경로와 그룹 커밋(SubmissionBuffer)을 비교합니다.
+
+    응답자 concurrency명이 동시에 제출하는 상황을 스레드로 흉내 내며, 지연은 제출 시작부터 커밋 완료(응답 확인)까지입니다.
+    """
+    # 제출마다 커밋하는 경로는 동시 제출 수만큼 연결이 필요합니다.
+    pooled = create_engine(engine.url, pool_size=concurrency, max_overflow=0)
+    buffer_engine = create_engine(engine.url, pool_size=1, max_overflow=1)
+    buffer = SubmissionBuffer(buffer_engine)
+
+    def per_request(submission):
+        send_id, email, responses = submission
+        with Session(pooled) as s:
+            result_id = save_responses(s, survey_id, send_id, email, responses)
+            s.commit()
+        return result_id
+
+    def group_commit(submission):
+        send_id, email, responses = submission
+        return buffer.submit(prepare_submission(survey_id, send_id, email, responses))
+
+    cases, result_ids = {}, []
+    try:
+        for name, submit in (("per_request", per_request), ("group_commit", group_commit)):
+            submissions = build_submissions(engine, survey_id, count)
+            samples = []
+
+            def timed(submission):
+                started = time.perf_counter()
+                result_ids.append(submit(submission))
+                samples.append((time.perf_counter() - started) * 1000)
+
+            started_all = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                list(pool.map(timed, submissions))
+            elapsed = time.perf_counter() - started_all
+            cases[f"submit.concurrent.{name}"] = {**_summary(samples), "submissions_per_second": round(count / elapsed, 1), "concurrency": concurrency}
+    finally:
+        with Session(engine) as s:
+            s.execute(text("DELETE FROM survey_results WHERE result_id = ANY(:ids);"), {"ids": result_ids})
+            s.commit()
+        pooled.dispose()
+        buffer.close()
+        buffer_engine.dispose()
+    return cases
+
+
+def bench_send_status(engine, survey_id, repeat):
+    cases = {}
+    with Session(engine) as s:
+        group_id = s.execute(text("SELECT survey_group_id FROM surveys WHERE survey_id = :sid;"), {"sid": survey_id}).scalar_one()
+        (page_df, _), cases["send_status.surveys"] = measure(lambda: list_survey_groups(s), repeat)
+        _, cases["send_status.send_counts"] = measure(lambda: count_sends(s, [int(gid) for gid in page_df["survey_group_id"]]), repeat)
+        sends_df, cases["send_status.sends"] = measure(lambda: list_sends(s, group_id), repeat)
+        _, cases["send_status.completed_users"] = measure(
+            lambda: [list_completed_users(s, send_id) for send_id in sends_df["send_id"]], repeat
+        )
+    return cases, {"sends": len(sends_df)}
+
+
+def run(args):
+    engine = bench_engine(args.dsn)
+    with Session(engine) as s:
+        survey_id = args.survey_id or s.execute(BUSIEST_SURVEY).scalar_one_or_none()
+    if survey_id is None:
+        raise SystemExit("완료된 응답이 없습니다. 먼저 bench/synthetic_data.py로 데이터를 만드세요.")
+
+    commit, dirty = _git_commit()
+    cases, dataset = {}, {"survey_id": survey_id}
+    for name, fn in (
+        ("analytics", lambda: bench_analytics(engine, survey_id, args.repeat)),
+        ("send_status", lambda: bench_send_status(engine, survey_id, args.repeat)),
+        ("engines", lambda: bench_engines(engine, survey_id, args.repeat)),
+    ):
+        if args.only and name not in args.only:
+            continue
+        group_cases, group_dataset = fn()
+        cases.update(group_cases)
+        dataset.update(group_dataset)
+    if not args.only or "submit" in args.only:
+        cases.update(bench_submissions(engine, survey_id, args.submissions, args.sentiment))
+        cases.update(bench_concurrent_submissions(engine, survey_id, args.submissions, args.concurrency))
+
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "label": args.label,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "dataset": dataset,
+        "cases": cases,
+    }
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{args.label or commit}{'-dirty' if dirty else ''}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    print(f"saved -> {output}")
+
+
+def compare(args):
+    old = json.loads(Path(args.old).read_text(encoding="utf-8"))
+    new = json.loads(Path(args.new).read_text(encoding="utf-8"))
+    print(f"{old['commit']} -> {new['commit']}")
+    regressions = 0
+    for name in sorted(set(old["cases"]) | set(new["cases"])):
+        before, after = old["cases"].get(name), new["cases"].get(name)
+        if not before or not after:
+            print(f"  {name:32s} {'(new)' if after else '(removed)'}")
+            continue
+        change = after["median_ms"] / before["median_ms"] - 1 if before["median_ms"] else 0
+        flag = "REGRESSION" if change > args.threshold else "improved" if change < -args.threshold else ""
+        regressions += flag == "REGRESSION"
+        print(f"  {name:32s} {before['median_ms']:>10.2f}ms -> {after['median_ms']:>10.2f}ms  {change:+7.1%}  {flag}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run")
+    run_parser.add_argument("--dsn", help="기본값은 BENCH_DB_URI 환경변수")
+    run_parser.add_argument("--survey-id", type=int, help="기본값은 완료 응답이 가장 많은 설문")
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--submissions", type=int, default=200)
+    run_parser.add_argument("--sentiment", choices=("none", "local"), default="none", help="제출 경로에서 감성 분석을 함께 측정할지 여부")
+    run_parser.add_argument("--concurrency", type=int, default=32, help="동시 제출 비교(제출마다 커밋 vs 그룹 커밋)에서 동시에 제출하는 응답자 수")
+    run_parser.add_argument("--only", nargs="*", choices=("analytics", "engines", "send_status", "submit"))
+    run_parser.add_argument("--label", help="결과 파일 이름 (기본값은 커밋 해시)")
+    run_parser.add_argument("--output")
+    compare_parser = sub.add_parser("compare")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        run(args)
+    else:
+        compare(args)
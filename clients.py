@@ -0,0 +1,150 @@
+import os
+import time
+import threading
+from collections import defaultdict, deque
+
+import httpx
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from openai import AzureOpenAI
+from azure.core.credentials import AzureKeyCredential
+from azure.core.pipeline.policies import SansIOHTTPPolicy
+from azure.core.pipeline.transport import RequestsTransport
+from azure.ai.textanalytics import TextAnalyticsClient
+from dotenv import load_dotenv
+
+load_dotenv()
+
+openai_endpoint = os.getenv("AZURE_ENDPOINT")
+openai_api_key = os.getenv("OPENAI_API_KEY")
+openai_api_version = os.getenv("OPENAI_API_VERSION")
+
+language_endpoint = os.getenv("AZURE_LNG_ENDPOINT")
+language_api_key = os.getenv("AZURE_LNG_API_KEY")
+
+# 프로세스 전체에서 공유하는 HTTP 커넥션 풀 설정
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+
+
+class LatencyStats:
+    """서비스별 외부 호출 지연 시간을 최근 window개까지 기록합니다."""
+
+    def __init__(self, window=500):
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._calls = defaultdict(int)
+        self._errors = defaultdict(int)
+
+    def record(self, service, seconds, ok=True):
+        with self._lock:
+            self._samples[service].append(seconds)
+            self._calls[service] += 1
+            if not ok:
+                self._errors[service] += 1
+
+    def summary(self):
+        with self._lock:
+            snapshot = {service: sorted(samples) for service, samples in self._samples.items()}
+            calls, errors = dict(self._calls), dict(self._errors)
+
+        def percentile(values, p):
+            return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+        return {
+            service: {
+                "calls": calls[service],
+                "errors": errors.get(service, 0),
+                "p50_ms": round(percentile(values, 0.50), 1),
+                "p95_ms": round(percentile(values, 0.95), 1),
+                "max_ms": round(values[-1] * 1000, 1),
+            }
+            for service, values in snapshot.items() if values
+        }
+
+
+latency_stats = LatencyStats()
+
+
+class _LatencyPolicy(SansIOHTTPPolicy):
+    """azure-core 파이프라인에서 호출 단위 지연 시간을 기록합니다."""
+
+    def __init__(self, service):
+        self._service = service
+
+    def on_request(self, request):
+        request.context["started_at"] = time.perf_counter()
+
+    def on_response(self, request, response):
+        started = request.context.get("started_at")
+        if started is not None:
+            latency_stats.record(self._service, time.perf_counter() - started, response.http_response.status_code < 400)
+
+    def on_exception(self, request):
+        started = request.context.get("started_at")
+        if started is not None:
+            latency_stats.record(self._service, time.perf_counter() - started, ok=False)
+
+
+def _build_httpx_client(service):
+    def on_request(request):
+        request.extensions["started_at"] = time.perf_counter()
+
+    def on_response(response):
+        # 스트리밍 응답의 경우 헤더 수신 시점(TTFB)까지의 시간이 기록됩니다.
+        started = response.request.extensions.get("started_at")
+        if started is not None:
+            latency_stats.record(service, time.perf_counter() - started, response.status_code < 400)
+
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        event_hooks={"request": [on_request], "response": [on_response]},
+    )
+
+
+def _build_requests_transport():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=HTTP_MAX_KEEPALIVE, pool_maxsize=HTTP_MAX_CONNECTIONS)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return RequestsTransport(
+        session=session,
+        session_owner=False,
+        connection_timeout=HTTP_CONNECT_TIMEOUT,
+        read_timeout=HTTP_READ_TIMEOUT,
+    )
+
+
+@st.cache_resource
+def get_openai_client():
+    """프로세스당 하나의 AzureOpenAI 클라이언트를 반환합니다."""
+    return AzureOpenAI(
+        api_version=openai_api_version,
+        azure_endpoint=openai_endpoint,
+        api_key=openai_api_key,
+        http_client=_build_httpx_client("openai"),
+    )
+
+
+@st.cache_resource
+def get_text_analytics_client():
+    """프로세스당 하나의 TextAnalyticsClient를 반환합니다."""
+    return TextAnalyticsClient(
+        endpoint=language_endpoint,
+        credential=AzureKeyCredential(language_api_key),
+        transport=_build_requests_transport(),
+        per_call_policies=[_LatencyPolicy("language")],
+    )
+
+
+def get_latency_stats():
+    return latency_stats.summary()
@@ -0,0 +1,98 @@
+import logging
+import os
+import threading
+import time
+import streamlit as st
+from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from tracing import current_page, trace_page
+
+load_dotenv()
+
+db_user = os.getenv("DB_USER")
+db_password = os.getenv("DB_PASSWORD")
+db_name = os.getenv("DB_NAME")
+
+# 읽기 전용 복제본. 설정하지 않으면 모든 조회가 주 DB로 갑니다.
+replica_host = os.getenv("DB_REPLICA_HOST")
+replica_port = os.getenv("DB_REPLICA_PORT", os.getenv("DB_PORT"))
+
+replica_uri = f"postgresql://{db_user}:{db_password}@{replica_host}:{replica_port}/{db_name}" if replica_host else None
+
+# 복제 지연이 이보다 크면 주 DB에서 읽습니다. 방금 쓴 내용을 읽는 동안에도 이 시간만큼은 주 DB를 씁니다.
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "2"))
+REPLICA_CONNECT_TIMEOUT = int(os.getenv("REPLICA_CONNECT_TIMEOUT", "2"))
+
+logger = logging.getLogger("survey.db_routing")
+
+# 복제본에서 마지막으로 반영한 트랜잭션 이후 경과 시간. 받은 WAL을 모두 반영했으면 주 DB가 한가한 것이므로 0입니다.
+REPLICA_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END;
+""")
+
+
+class ReplicaMonitor:
+    """복제 지연을 REPLICA_LAG_CHECK_SECONDS마다 한 번만 확인해 프로세스 안에서 공유합니다."""
+
+    def __init__(self, check_seconds=REPLICA_LAG_CHECK_SECONDS):
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._checked_at = None
+        self._checking = False
+        self._lag = None
+
+    def lag_seconds(self, replica):
+        """복제 지연(초)을 반환합니다. 복제본에 연결할 수 없으면 None입니다.
+
+        확인은 한 스레드만 락 밖에서 합니다. 복제본이 응답하지 않아 연결이 REPLICA_CONNECT_TIMEOUT까지 걸려도
+        다른 스레드는 기다리지 않고 마지막으로 확인한 값(처음이면 None, 즉 주 DB)을 씁니다.
+        """
+        with self._lock:
+            fresh = self._checked_at is not None and time.monotonic() - self._checked_at < self.check_seconds
+            if fresh or self._checking:
+                return self._lag
+            self._checking = True
+        lag = None
+        try:
+            with replica.session as s:
+                lag = float(s.execute(REPLICA_LAG_QUERY).scalar_one())
+        except SQLAlchemyError as e:
+            logger.warning("replica unavailable, reading from primary: %s", e)
+        finally:
+            with self._lock:
+                self._lag, self._checked_at, self._checking = lag, time.monotonic(), False
+        return lag
+
+
+replica_monitor = ReplicaMonitor()
+
+_primary_until = 0.0
+
+
+def note_primary_write():
+    """이 프로세스에서 방금 주 DB에 쓴 내용이 복제본에 반영될 때까지 조회를 주 DB로 보냅니다."""
+    global _primary_until
+    _primary_until = time.monotonic() + REPLICA_MAX_LAG_SECONDS
+
+
+def read_connection(primary):
+    """분석/목록 조회에 쓸 연결을 고릅니다.
+
+    복제본이 설정되어 있고 지연이 REPLICA_MAX_LAG_SECONDS 이하이면 복제본을, 그 밖에는 primary를 그대로 반환합니다.
+    쓰기와 중복 응답 확인처럼 최신 값이 필요한 곳은 이 함수를 거치지 않고 primary를 사용합니다.
+    """
+    if replica_uri is None or time.monotonic() < _primary_until:
+        return primary
+    replica = st.connection("postgres_replica", type="sql", url=replica_uri,
+                           connect_args={"connect_timeout": REPLICA_CONNECT_TIMEOUT})
+    lag = replica_monitor.lag_seconds(replica)
+    if lag is None or lag > REPLICA_MAX_LAG_SECONDS:
+        return primary
+    trace_page(current_page(), replica)
+    return replica
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import random
+import re
+import unicodedata
+from sqlalchemy import text
+
+NUM_PERM = 64
+BAND_ROWS = 2
+NEAR_DUPLICATE_THRESHOLD = 0.5
+GENERIC_SUFFIXES = ("설문조사", "설문", "조사")
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(20240601)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+
+
+def normalize_topic(topic):
+    """공백, 문장부호, 대소문자와 '조사'/'설문' 같은 일반 접미어를 제거한 주제 키를 만듭니다."""
+    normalized = unicodedata.normalize("NFKC", topic).lower()
+    normalized = re.sub(r"[\s\W_]+", "", normalized)
+    stripped = True
+    while stripped:
+        stripped = False
+        for suffix in GENERIC_SUFFIXES:
+            if normalized.endswith(suffix) and len(normalized) > len(suffix):
+                normalized = normalized[:-len(suffix)]
+                stripped = True
+    return normalized
+
+
+def _shingles(normalized):
+    if len(normalized) < 2:
+        return {normalized}
+    return {normalized[i:i + 2] for i in range(len(normalized) - 1)}
+
+
+def minhash_signature(normalized):
+    hashed = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big") for s in _shingles(normalized)]
+    return [min((a * h + b) % _MERSENNE_PRIME for h in hashed) for a, b in _PERMUTATIONS]
+
+
+def lsh_bands(signature):
+    return [
+        f"{band}:{hashlib.blake2b(repr(signature[start:start + BAND_ROWS]).encode(), digest_size=8).hexdigest()}"
+        for band, start in enumerate(range(0, NUM_PERM, BAND_ROWS))
+    ]
+
+
+def _estimate_similarity(sig_a, sig_b):
+    return sum(a == b for a, b in zip(sig_a, sig_b)) / NUM_PERM
+
+
+def _bump_stats(s, prompt_version, column):
+    s.execute(text(f"""
+        INSERT INTO survey_draft_cache_stats (prompt_version, {column}) VALUES (:pv, 1)
+        ON CONFLICT (prompt_version) DO UPDATE SET {column} = survey_draft_cache_stats.{column} + 1;
+    """), {"pv": prompt_version})
+
+
+def find_cached_draft(conn, topic, prompt_version):
+    """같거나 비슷한 주제로 생성된 초안을 찾아 {cache_id, topic, similarity, draft}로 반환합니다. 없으면 None."""
+    normalized = normalize_topic(topic)
+    if not normalized:
+        return None
+    signature = minhash_signature(normalized)
+    with conn.session as s:
+        _bump_stats(s, prompt_version, "lookups")
+        exact = s.execute(text("""
+            SELECT cache_id, topic, draft FROM survey_draft_cache
+            WHERE normalized_topic = :topic AND prompt_version = :pv;
+        """), {"topic": normalized, "pv": prompt_version}).mappings().fetchone()
+        if exact:
+            _bump_stats(s, prompt_version, "exact_hits")
+            s.commit()
+            return {"cache_id": exact["cache_id"], "topic": exact["topic"], "similarity": 1.0, "draft": exact["draft"]}
+
+        candidates = s.execute(text("""
+            SELECT cache_id, topic, draft, minhash FROM survey_draft_cache
+            WHERE prompt_version = :pv AND lsh_bands && CAST(:bands AS text[])
+            LIMIT 50;
+        """), {"pv": prompt_version, "bands": lsh_bands(signature)}).mappings().fetchall()
+        best = max(candidates, key=lambda row: _estimate_similarity(signature, row["minhash"]), default=None)
+        if best is None or _estimate_similarity(signature, best["minhash"]) < NEAR_DUPLICATE_THRESHOLD:
+            s.commit()
+            return None
+        _bump_stats(s, prompt_version, "near_hits")
+        s.commit()
+    return {"cache_id": best["cache_id"], "topic": best["topic"], "similarity": _estimate_similarity(signature, best["minhash"]), "draft": best["draft"]}
+
+
+def mark_cached_draft_used(conn, cache_id, prompt_version):
+    with conn.session as s:
+        s.execute(text("UPDATE survey_draft_cache SET hit_count = hit_count + 1 WHERE cache_id = :id;"), {"id": cache_id})
+        _bump_stats(s, prompt_version, "accepted")
+        s.commit()
+
+
+def store_draft(conn, topic, prompt_version, draft):
+    normalized = normalize_topic(topic)
+    if not normalized:
+        return
+    signature = minhash_signature(normalized)
+    with conn.session as s:
+        s.execute(text("""
+            INSERT INTO survey_draft_cache (topic, normalized_topic, prompt_version, draft, minhash, lsh_bands)
+            VALUES (:topic, :normalized, :pv, CAST(:draft AS jsonb), :minhash, :bands)
+            ON CONFLICT (normalized_topic, prompt_version)
+            DO UPDATE SET topic = EXCLUDED.topic, draft = EXCLUDED.draft, created_at = CURRENT_TIMESTAMP;
+        """), {
+            "topic": topic, "normalized": normalized, "pv": prompt_version,
+            "draft": json.dumps(draft, ensure_ascii=False), "minhash": signature, "bands": lsh_bands(signature),
+        })
+        s.commit()
+
+
+def get_cache_hit_rate(conn, prompt_version):
+    """(조회 수, 적중률)을 반환합니다. 적중은 완전 일치와 유사 주제 일치를 모두 포함합니다."""
+    with conn.session as s:
+        row = s.execute(text("""
+            SELECT lookups, exact_hits + near_hits AS hits FROM survey_draft_cache_stats WHERE prompt_version = :pv;
+        """), {"pv": prompt_version}).mappings().fetchone()
+    if not row or not row["lookups"]:
+        return 0, None
+    return row["lookups"], row["hits"] / row["lookups"]
@@ -0,0 +1,191 @@
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+import httpx
+import openai
+from dotenv import load_dotenv
+from clients import get_openai_client
+from tracing import record_span
+
+load_dotenv()
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "45"))
+LLM_BACKOFF_BASE_SECONDS = 0.5
+LLM_BACKOFF_MAX_SECONDS = 20.0
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+
+class LLMGatewayError(Exception):
+    """LLM 게이트웨이에서 발생하는 오류의 기본 클래스입니다."""
+
+
+class ContentFilterError(LLMGatewayError):
+    """입력(prompt) 또는 생성 결과(completion)가 콘텐츠 정책으로 차단된 경우입니다."""
+
+    def __init__(self, source):
+        super().__init__(f"content filtered ({source})")
+        self.source = source
+
+
+class LLMTimeoutError(LLMGatewayError):
+    """요청 마감 시간 안에 응답을 받지 못한 경우입니다."""
+
+
+class LLMUnavailableError(LLMGatewayError):
+    """재시도를 모두 소진했거나 재시도할 수 없는 API 오류입니다."""
+
+
+class UsageLedger:
+    """기능(feature)별 호출 수, 재시도, 토큰 사용량과 지연 시간을 누적합니다."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows = defaultdict(lambda: defaultdict(float))
+
+    def record(self, feature, latency, ok, retries=0, filtered=False, usage=None):
+        with self._lock:
+            row = self._rows[feature]
+            row["calls"] += 1
+            row["errors"] += 0 if ok else 1
+            row["filtered"] += 1 if filtered else 0
+            row["retries"] += retries
+            row["latency_total"] += latency
+            row["latency_max"] = max(row["latency_max"], latency)
+            if usage is not None:
+                row["prompt_tokens"] += usage.prompt_tokens or 0
+                row["completion_tokens"] += usage.completion_tokens or 0
+
+    def summary(self):
+        with self._lock:
+            return {
+                feature: {
+                    "calls": int(row["calls"]),
+                    "errors": int(row["errors"]),
+                    "filtered": int(row["filtered"]),
+                    "retries": int(row["retries"]),
+                    "prompt_tokens": int(row["prompt_tokens"]),
+                    "completion_tokens": int(row["completion_tokens"]),
+                    "avg_latency_ms": round(row["latency_total"] / row["calls"] * 1000, 1),
+                    "max_latency_ms": round(row["latency_max"] * 1000, 1),
+                }
+                for feature, row in self._rows.items() if row["calls"]
+            }
+
+
+ledger = UsageLedger()
+_semaphore = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+
+
+def _finish(feature, started, ok, retries=0, filtered=False, usage=None):
+    latency = time.perf_counter() - started
+    ledger.record(feature, latency, ok, retries=retries, filtered=filtered, usage=usage)
+    record_span(f"llm.{feature}", "llm", latency * 1000, ok=ok, retries=retries)
+
+
+def _retry_after(e):
+    response = getattr(e, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+def _backoff(attempt, e):
+    jittered = random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * (2 ** attempt)))
+    return max(jittered, _retry_after(e) or 0)
+
+
+def _is_content_filter(e):
+    return isinstance(e, openai.BadRequestError) and "content_filter" in str(getattr(e, "body", None) or e)
+
+
+def chat_completion(feature, client=None, deadline_seconds=None, **kwargs):
+    """chat.completions.create를 동시 실행 제한, 재시도, 마감 시간과 함께 호출합니다.
+
+    - 프로세스 전체 동시 요청 수는 LLM_MAX_CONCURRENCY로 제한됩니다.
+    - 429/5xx/연결 오류는 Retry-After를 존중하는 지터 지수 백오프로 재시도합니다.
+    - 콘텐츠 필터 차단은 입력/출력 모두 ContentFilterError로 통일합니다.
+    - stream=True이면 청크 이터레이터를 반환하며, 끝까지 읽을 때까지 동시 실행 슬롯을 점유합니다.
+    """
+    client = client or get_openai_client()
+    deadline = time.monotonic() + (deadline_seconds or LLM_DEADLINE_SECONDS)
+    started = time.perf_counter()
+    if not _semaphore.acquire(timeout=max(0, deadline - time.monotonic())):
+        _finish(feature, started, ok=False)
+        raise LLMTimeoutError("동시 요청 대기 시간이 마감 시간을 넘었습니다.")
+
+    retries = 0
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise LLMTimeoutError("LLM 응답 마감 시간을 넘었습니다.")
+            try:
+                response = client.with_options(timeout=remaining, max_retries=0).chat.completions.create(**kwargs)
+                break
+            except openai.BadRequestError as e:
+                if _is_content_filter(e):
+                    raise ContentFilterError("prompt") from e
+                raise LLMUnavailableError(f"API 요청 오류가 발생했습니다: {e}") from e
+            except RETRYABLE_ERRORS as e:
+                wait = _backoff(retries, e)
+                if retries >= LLM_MAX_RETRIES or time.monotonic() + wait >= deadline:
+                    if isinstance(e, openai.APITimeoutError):
+                        raise LLMTimeoutError("LLM 응답 마감 시간을 넘었습니다.") from e
+                    raise LLMUnavailableError(f"LLM 서비스가 응답하지 않습니다: {e}") from e
+                retries += 1
+                time.sleep(wait)
+            except openai.APIError as e:
+                raise LLMUnavailableError(f"API 요청 오류가 발생했습니다: {e}") from e
+    except LLMGatewayError as e:
+        _semaphore.release()
+        _finish(feature, started, ok=False, retries=retries, filtered=isinstance(e, ContentFilterError))
+        raise
+
+    if kwargs.get("stream"):
+        return _guarded_stream(feature, response, started, deadline, retries)
+
+    _semaphore.release()
+    filtered = bool(response.choices) and response.choices[0].finish_reason == "content_filter"
+    _finish(feature, started, ok=not filtered, retries=retries, filtered=filtered, usage=response.usage)
+    if filtered:
+        raise ContentFilterError("completion")
+    return response
+
+
+def _guarded_stream(feature, stream, started, deadline, retries):
+    ok, filtered, usage = False, False, None
+    try:
+        for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].finish_reason == "content_filter":
+                filtered = True
+                raise ContentFilterError("completion")
+            yield chunk
+            if time.monotonic() > deadline:
+                raise LLMTimeoutError("LLM 응답 마감 시간을 넘었습니다.")
+        ok = True
+    except (openai.APITimeoutError, openai.APIConnectionError, httpx.TransportError) as e:
+        # 스트림을 읽는 중의 끊김(httpx.ReadTimeout, RemoteProtocolError 등)은 SDK가 감싸지 않고 그대로 올라옵니다.
+        raise LLMTimeoutError("LLM 스트리밍 응답이 중단되었습니다.") from e
+    finally:
+        stream.close()
+        _semaphore.release()
+        _finish(feature, started, ok=ok, retries=retries, filtered=filtered, usage=usage)
+
+
+def get_llm_ledger():
+    return ledger.summary()
@@ -1,16 +1,20 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-from wordcloud import WordCloud
-import matplotlib.pyplot as plt
+import streamlit.components.v1 as components
 from datetime import datetime, timedelta
 from sqlalchemy import text
-from openai import AzureOpenAI
-from azure.core.credentials import AzureKeyCredential
-from azure.ai.textanalytics import TextAnalyticsClient
-import json
 import os
 from dotenv import load_dotenv
+from tracing import render_timing_panel, span, trace_page
+from clients import get_openai_client
+from text_analysis import CachedLanguageBackend, get_language_backend
+from query_cache import cached_query, start_invalidation_listener
+from db_routing import read_connection
+from analytics import get_response_frames, load_survey_structure
+from llm_gateway import ContentFilterError, LLMGatewayError
+from send_store import count_targets
+from report import (ai_evaluation, daily_chart, distribution_chart, get_latest_report, count_pending_reports, kpis,
+                    request_report, sentiment_groups, text_responses, word_cloud_figure)
 
 load_dotenv()
 
@@ -20,27 +24,16 @@ db_host = os.getenv("DB_HOST")
 db_port = os.getenv("DB_PORT")
 db_name = os.getenv("DB_NAME")
 
-openai_endpoint = os.getenv("AZURE_ENDPOINT")
-openai_api_key = os.getenv("OPENAI_API_KEY")
-openai_api_version = os.getenv("OPENAI_API_VERSION")
-openai_deployment = os.getenv("GPT_DEPLOYMENT_NAME")
-
-# Get environment variables
-language_endpoint = os.getenv("AZURE_LNG_ENDPOINT")
-language_api_key = os.getenv("AZURE_LNG_API_KEY")
-
-lang_credential = AzureKeyCredential(language_api_key)
-
-text_analytics_client = TextAnalyticsClient(language_endpoint, credential=lang_credential)
+# 캠페인 진행 중 실시간 모니터링용 자동 새로고침 간격(초). 0은 끄기입니다.
+AUTO_REFRESH_OPTIONS = [0, 10, 30, 60]
 
 db_uri = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
 conn = st.connection("postgres", type="sql", url=db_uri)
+trace_page("dashboard", conn)
+language_backend = CachedLanguageBackend(get_language_backend(), lambda: conn.session)
+start_invalidation_listener(db_uri)
 
-client = AzureOpenAI(
-        api_version=openai_api_version,
-        azure_endpoint=openai_endpoint,
-        api_key=openai_api_key,
-    )
+client = get_openai_client()
 
 st.markdown("""
 <style>
@@ -51,95 +44,52 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-@st.cache_data(ttl=10)
+@cached_query("surveys")
 def get_survey_list():
-    query = """
-        SELECT DISTINCT ON (survey_group_id) survey_group_id, survey_title
-        FROM surveys ORDER BY survey_group_id, version DESC;
-    """
-    return conn.query(query, ttl=10)
+    query = text("""
+        SELECT survey_group_id, survey_title FROM survey_groups WHERE deleted_at IS NULL ORDER BY survey_group_id;
+    """)
+    with read_connection(conn).session as s:
+        return pd.DataFrame(s.execute(query).fetchall(), columns=['survey_group_id', 'survey_title'])
 
-@st.cache_data(ttl=10)
+@cached_query("surveys:group:{survey_group_id}")
 def get_versions_for_group(_conn, survey_group_id):
     query = text("SELECT version FROM surveys WHERE survey_group_id = :group_id ORDER BY version DESC;")
     df = pd.DataFrame(_conn.execute(query, {"group_id": survey_group_id}).fetchall(), columns=['version'])
     return df['version'].tolist()
 
-@st.cache_data(ttl=10)
+@cached_query("survey_sends:survey:{survey_id}")
 def get_target_count(_conn, survey_id):
-    query = text("SELECT SUM(jsonb_array_length(recipients)) FROM survey_sends WHERE survey_id = :sid;")
-    result = _conn.execute(query, {"sid": survey_id}).scalar_one_or_none()
-    return result or 0
+    return count_targets(_conn, survey_id)
 
-@st.cache_data(ttl=10)
+@cached_query("surveys:survey:{survey_id}")
 def get_survey_structure(_conn, survey_id):
-    query = text("""
-        SELECT si.item_title, array_agg(io.option_content ORDER BY io.option_id) as options
-        FROM survey_items si JOIN item_options io ON si.item_id = io.item_id
-        WHERE si.survey_id = :sid AND si.item_type != '인풋박스'
-        GROUP BY si.item_id, si.item_title ORDER BY si.item_id;
-    """)
-    df = pd.DataFrame(_conn.execute(query, {"sid": survey_id}).fetchall(), columns=['item_title', 'options'])
-    return df
-
-@st.cache_data(ttl=10)
-def get_responses_for_survey(_conn, survey_id):
-    query = text("""
-        SELECT sr.result_id, sr.completed_at, si.item_title, si.item_type,
-               COALESCE(io.option_content, ur.response_text) AS response_content,
-               sa.sentiment_label
-        FROM survey_results sr
-        JOIN user_responses ur ON sr.result_id = ur.result_id
-        JOIN survey_items si ON ur.item_id = si.item_id
-        LEFT JOIN item_options io ON ur.option_id = io.option_id
-        LEFT JOIN sentiment_analysis sa ON ur.response_id = sa.response_id
-        WHERE sr.survey_id = :sid AND sr.status = 'completed';
-    """)
-    long_df = pd.DataFrame(_conn.execute(query, {"sid": survey_id}).fetchall(), columns=['result_id', 'created_at', 'item_title', 'item_type', 'response_content', 'sentiment'])
-    if long_df.empty: return pd.DataFrame(), pd.DataFrame()
-    pivot_df = long_df.pivot_table(
-        index=['result_id', 'created_at'], 
-        columns='item_title', 
-        values='response_content',
-        aggfunc=lambda x: ', '.join(x.dropna().astype(str))
-    ).reset_index()
-    pivot_df = pivot_df.rename(columns=lambda c: '만족도' if '만족도' in c else '개선점' if '개선점' in c or '의견' in c else c)
-    return pivot_df, long_df
+    return load_survey_structure(_conn, survey_id)
 
 @st.cache_data(ttl=3600)
 def get_ai_evaluation(_client, text_responses_df):
-    if not _client: return {"summary": "AI 클라이언트가 초기화되지 않았습니다.", "insights": []}
-    if text_responses_df.empty: return {"summary": "분석할 텍스트 응답이 없습니다.", "insights": []}
+    return ai_evaluation(_client, text_responses_df)
 
-    def format_row(row):
-        return f"질문: {row['item_title']}\n답변: {row['response_content']}\n사전 분석된 감성: {row['sentiment']}"
-    
-    full_text_input = "\n\n".join(text_responses_df.apply(format_row, axis=1))
-    
-    system_prompt = """
-        당신은 전문 시장 조사 분석가입니다. '질문', '답변', 그리고 사전 분석된 '감성'('Positive', 'Negative', 'Neutral')으로 구성된 일련의 사용자 설문조사 응답이 주어집니다.
-        당신의 임무는 주어진 세 가지 정보를 모두 활용하여 포괄적인 분석을 수행하는 것입니다.
-
-        1.  먼저, 주어진 모든 피드백을 종합하여, 간결하고 전문적인 한 문단의 종합 평가를 한국어로 생성해 주세요.
-
-        출력은 반드시 "summary"와 "insights"라는 두 개의 키를 가진 유효한 JSON 형식이어야 합니다.
-
-        예시:
-        {
-        "summary": "사용자들은 전반적으로 새로운 기능에 긍정적인 반응을 보였으나, 일부는 가격 정책에 대해 우려를 표했습니다. 특히 UI/UX의 직관성에 대한 높은 평가가 두드러졌습니다.",
-        }
-    """
-    response = _client.chat.completions.create(
-        model=openai_deployment,
-        response_format={"type": "json_object"},
-        temperature=0.9,
-        max_tokens=500,
-        messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": full_text_input}
-        ]
-    )
-    return json.loads(response.choices[0].message.content)
+def render_latest_report(final_survey_id, start_date, end_date):
+    """워커가 미리 만들어 둔 마지막 보고서를 보여 주고, 새 보고서 생성을 요청받습니다."""
+    with read_connection(conn).session as s:
+        latest = get_latest_report(s, final_survey_id)
+        pending = count_pending_reports(s, final_survey_id)
+    with st.expander("📑 마지막 생성 보고서", expanded=False):
+        report_cols = st.columns([3, 1])
+        with report_cols[0]:
+            if latest is None: st.caption("아직 생성된 보고서가 없습니다.")
+            else: st.caption(f"{latest['finished_at']:%Y-%m-%d %H:%M} 생성 · 분석 기간 {latest['start_date']} ~ {latest['end_date']}")
+            if pending: st.caption(f"생성 대기 중인 보고서 {pending}건")
+        with report_cols[1]:
+            if st.button("보고서 생성", key="request_report", use_container_width=True):
+                with conn.session as s:
+                    request_report(s, final_survey_id, start_date, end_date)
+                    s.commit()
+                st.toast("보고서 생성을 요청했습니다. 잠시 후 이곳에 표시됩니다.")
+        if latest is not None:
+            st.download_button("HTML 다운로드", latest["html"], file_name=f"survey_{final_survey_id}_report_{latest['report_id']}.html", mime="text/html")
+            components.html(latest["html"], height=800, scrolling=True)
 
 st.markdown("""
 <div style='background:linear-gradient(90deg,#5359ff 0,#6a82fb 100%);padding:24px 0 12px 0;text-align:center;color:white;border-radius:8px;'>
@@ -149,45 +99,54 @@ st.markdown("""
 """, unsafe_allow_html=True)
 st.markdown("<br>", unsafe_allow_html=True)
 
-survey_list_df = get_survey_list()
+with span("survey_list", kind="query"):
+    survey_list_df = get_survey_list()
 if survey_list_df.empty:
     st.warning("분석할 수 있는 설문이 없습니다. 먼저 설문을 생성해주세요.")
     st.stop()
 
-filter_cols = st.columns([2, 1, 1, 1, 1])
+filter_cols = st.columns([2, 1, 1, 1, 1, 1])
 with filter_cols[0]:
     selected_title = st.selectbox("분석할 설문을 선택하세요:", survey_list_df['survey_title'].tolist(), key="selected_survey")
     selected_group_id = int(survey_list_df[survey_list_df['survey_title'] == selected_title]['survey_group_id'].iloc[0])
 with filter_cols[1]:
-    with conn.session as s: available_versions = get_versions_for_group(s, selected_group_id)
+    with read_connection(conn).session as s: available_versions = get_versions_for_group(s, selected_group_id)
     selected_version = st.selectbox("버전 선택:", available_versions, format_func=lambda v: f"v{v}", index=0)
 start_date_default, end_date_default = datetime.now().date() - timedelta(days=30), datetime.now().date()
 with filter_cols[2]: start_date = st.date_input("시작일", value=start_date_default)
 with filter_cols[3]: end_date = st.date_input("종료일", value=end_date_default)
-with filter_cols[4]: search_button = st.button("조회", use_container_width=True, type="primary")
+with filter_cols[4]: refresh_seconds = st.selectbox("자동 새로고침:", AUTO_REFRESH_OPTIONS, format_func=lambda sec: f"{sec}초" if sec else "끄기")
+with filter_cols[5]: search_button = st.button("조회", use_container_width=True, type="primary")
 
 st.markdown("---")
 
 if search_button:
-    with conn.session as s:
+    with read_connection(conn).session as s:
         query = text("SELECT survey_id FROM surveys WHERE survey_group_id = :gid AND version = :ver;")
         result = s.execute(query, {"gid": selected_group_id, "ver": selected_version}).scalar_one_or_none()
     if result is None: st.error("선택된 설문과 버전에 해당하는 데이터를 찾을 수 없습니다."); st.stop()
-    
-    final_survey_id = result
-    
-    with conn.session as s:
-        df_full_responses, df_long_full = get_responses_for_survey(s, final_survey_id)
+
+    # 조회 조건을 기억해 두어야 자동 새로고침(fragment 재실행) 때도 같은 설문을 다시 그릴 수 있습니다.
+    st.session_state.dashboard_query = {
+        "final_survey_id": result, "selected_title": selected_title, "selected_version": selected_version,
+        "start_date": start_date, "end_date": end_date,
+    }
+
+def render_dashboard(final_survey_id, selected_title, selected_version, start_date, end_date):
+    # ANALYTICS_ENGINE=duckdb이면 로컬 Parquet 스냅샷에서 DuckDB로 집계합니다.
+    frame = get_response_frames().get(final_survey_id)
+    # 응답 조회는 캠페인 중 제출이 몰리는 주 DB 대신 복제본에서 읽습니다.
+    with read_connection(conn).session as s, span("responses_fetch", kind="query", survey_id=final_survey_id):
+        new_results = frame.refresh(s)
         survey_structure_df = get_survey_structure(s, final_survey_id)
+    st.caption(f"마지막 갱신: {datetime.now().strftime('%H:%M:%S')} · 새 응답 {new_results}건 반영")
+    render_latest_report(final_survey_id, start_date, end_date)
 
-    if df_full_responses.empty: st.warning("선택된 설문과 버전에 대한 응답 데이터가 없습니다.")
+    if not frame.has_responses(): st.warning("선택된 설문과 버전에 대한 응답 데이터가 없습니다.")
     else:
-        df_full_responses['created_at'] = pd.to_datetime(df_full_responses['created_at'])
-        df_responses = df_full_responses[(df_full_responses['created_at'].dt.date >= start_date) & (df_full_responses['created_at'].dt.date <= end_date)]
-        
-        df_long_full['created_at'] = pd.to_datetime(df_long_full['created_at'])
-        df_long_responses = df_long_full[(df_long_full['created_at'].dt.date >= start_date) & (df_long_full['created_at'].dt.date <= end_date)]
-        
+        with span("responses_window", survey_id=final_survey_id):
+            df_responses, df_long_responses = frame.between(start_date, end_date)
+
         if df_responses.empty: st.info(f"선택하신 기간({start_date} ~ {end_date})에 해당하는 응답이 없습니다.")
         else:
             tab_graph, tab_table = st.tabs(["📊 그래프로 보기", "📄 전체 응답 보기"])
@@ -195,57 +154,43 @@ if search_button:
                 st.subheader(f"'{selected_title}' (v{selected_version}) 통계 결과")
                 st.caption(f"분석 기간: {start_date} ~ {end_date}")
 
-                with conn.session as s: target_count = get_target_count(s, final_survey_id)
-                df_text_analysis = df_long_responses[df_long_responses['item_type'] == '인풋박스'].copy()
-                df_text_analysis.dropna(subset=['response_content'], inplace=True)
-                meaningless_responses = ['.', '없음', '없습니다']
-                df_text_analysis = df_text_analysis[~df_text_analysis['response_content'].isin(meaningless_responses)]
-                df_text_analysis = df_text_analysis[df_text_analysis['response_content'].str.strip() != '']
+                with read_connection(conn).session as s: target_count = get_target_count(s, final_survey_id)
+                df_text_analysis = text_responses(df_long_responses)
 
                 kpi_cols = st.columns(4)
-                total_responses = len(df_responses)
-                response_rate = f"{total_responses / target_count:.1%}" if target_count > 0 else "N/A"
-                text_responses_with_sentiment = df_text_analysis[df_text_analysis['sentiment'].notna()]
-                positive_responses = (text_responses_with_sentiment['sentiment'] == 'positive').sum()
-                positive_rate = f"{positive_responses / len(text_responses_with_sentiment):.1%}" if not text_responses_with_sentiment.empty else "N/A"
-
-                kpi_cols[0].metric(label="총 응답 수", value=f"{total_responses} 건")
-                kpi_cols[1].metric(label="응답률 (목표 대비)", value=response_rate)
-                kpi_cols[2].metric(label="긍정 답변 비율", value=positive_rate)
-                kpi_cols[3].metric(label="분석 기간", value=f"{(end_date - start_date).days + 1} 일")
+                for kpi_col, (label, value) in zip(kpi_cols, kpis(df_responses, df_text_analysis, target_count, start_date, end_date)):
+                    kpi_col.metric(label=label, value=value)
                 
                 st.markdown("---")
                 
-                with st.spinner("AI가 텍스트 응답을 분석 및 요약하고 있습니다..."):
-                    ai_evaluation = get_ai_evaluation(client, df_text_analysis)
+                with st.spinner("AI가 텍스트 응답을 분석 및 요약하고 있습니다..."), span("ai_summary"):
+                    try: evaluation = get_ai_evaluation(client, df_text_analysis)
+                    except ContentFilterError: evaluation = {"summary": "응답 내용이 콘텐츠 정책에 위배되어 AI 평가를 생성할 수 없습니다."}
+                    except LLMGatewayError as e: evaluation = {"summary": f"AI 평가를 생성하지 못했습니다: {e}"}
 
                 st.subheader("🤖 AI 종합 평가")
-                st.info(ai_evaluation.get("summary", "AI 평가를 생성하지 못했습니다."))
+                st.info(evaluation.get("summary", "AI 평가를 생성하지 못했습니다."))
                 
                 st.markdown("---")
                 
                 with st.container(border=True):
                     st.write("#### 🗓️ 일자별 응답 수")
-                    daily_counts = df_responses['created_at'].dt.date.value_counts().sort_index()
-                    fig_daily_bar = px.bar(x=daily_counts.index, y=daily_counts.values, labels={'x': '날짜', 'y': '응답 건수'})
-                    fig_daily_bar.update_yaxes(rangemode='tozero'); st.plotly_chart(fig_daily_bar, use_container_width=True)
+                    with span("daily_chart"):
+                        st.plotly_chart(daily_chart(df_responses), use_container_width=True)
 
                 st.markdown("---")
                 
                 left_col, right_col = st.columns(2)
                 with left_col:
                     st.subheader("💬 주관식 답변 분석")
-                    subjective_questions = df_text_analysis['item_title'].unique()
-                    if not subjective_questions.any():
+                    subjective_questions = sentiment_groups(df_text_analysis)
+                    if not subjective_questions:
                         st.info("분석할 주관식 답변이 없습니다.")
                     else:
-                        for question_title in subjective_questions:
+                        for question_title, groups in subjective_questions.items():
                             with st.container(border=True):
                                 st.write(f"**Q. {question_title}**")
-                                question_responses = df_text_analysis[df_text_analysis['item_title'] == question_title]
-                                positive = question_responses[question_responses['sentiment'] == 'positive']['response_content'].tolist()
-                                negative = question_responses[question_responses['sentiment'] == 'negative']['response_content'].tolist()
-                                neutral = question_responses[question_responses['sentiment'] == 'neutral']['response_content'].tolist()
+                                positive, negative, neutral = groups["positive"], groups["negative"], groups["neutral"]
 
                                 if positive:
                                     with st.expander(f"😃 긍정적인 답변 ({len(positive)}개)"):
@@ -262,20 +207,14 @@ if search_button:
                         keyword = df_text_analysis["response_content"].dropna().tolist()
                         
                         if keyword:
-                            with st.spinner("답변에서 핵심 키워드를 추출 중입니다..."):
-                                response = text_analytics_client.extract_key_phrases(keyword)
-                                successful_responses = [doc for doc in response if not doc.is_error]
+                            with st.spinner("답변에서 핵심 키워드를 추출 중입니다..."), span("key_phrases", docs=len(keyword)):
+                                key_phrases_per_doc = language_backend.extract_key_phrases(keyword)
+                                all_key_phrases = [phrase for phrases in key_phrases_per_doc for phrase in phrases]
                                 
-                            if successful_responses:
-                                all_key_phrases = [phrase for doc in successful_responses for phrase in doc.key_phrases]
-                                text_data_for_wc = " ".join(all_key_phrases)
+                            if all_key_phrases:
                                 try:
-                                    font_path = "fonts/MALGUN.TTF"
-                                    wordcloud = WordCloud(width=800, height=350, background_color='white', font_path=font_path).generate(text_data_for_wc)
-                                    fig_wc, ax = plt.subplots(figsize=(10, 5))
-                                    ax.imshow(wordcloud, interpolation='bilinear')
-                                    ax.axis('off')
-                                    st.pyplot(fig_wc)
+                                    with span("word_cloud"):
+                                        st.pyplot(word_cloud_figure(all_key_phrases))
                                 except Exception:
                                     st.warning("워드클라우트 생성에 실패했습니다.")
                         else:
@@ -295,18 +234,23 @@ if search_button:
                 st.subheader("📊 문항별 응답 분포")
                 if survey_structure_df.empty: st.info("분석할 객관식 문항이 없습니다.")
                 else:
-                    chart_cols = st.columns(2)
-                    for i, row in survey_structure_df.iterrows():
-                        q_title = row['item_title']
-                        all_options = row['options']
-                        with chart_cols[i % 2]:
-                            with st.container(border=True):
-                                st.write(f"**Q. {q_title}**")
-                                q_data = df_long_responses[df_long_responses['item_title'] == q_title]
-                                response_counts = q_data['response_content'].value_counts()
-                                full_counts = pd.Series(0, index=all_options).add(response_counts, fill_value=0)
-                                fig = px.bar(y=full_counts.index, x=full_counts.values, labels={'y': '응답', 'x': '응답 수'}, orientation='h')
-                                fig.update_layout(showlegend=False, height=300, yaxis={'categoryorder':'total ascending'}); fig.update_xaxes(dtick=1)
-                                st.plotly_chart(fig, use_container_width=True)
+                    with span("distribution_charts", items=len(survey_structure_df)):
+                        chart_cols = st.columns(2)
+                        for i, row in survey_structure_df.iterrows():
+                            q_title = row['item_title']
+                            all_options = row['options']
+                            with chart_cols[i % 2]:
+                                with st.container(border=True):
+                                    st.write(f"**Q. {q_title}**")
+                                    full_counts = frame.option_counts_between(row['item_key'], all_options, start_date, end_date)
+                                    st.plotly_chart(distribution_chart(full_counts), use_container_width=True)
+
+dashboard_query = st.session_state.get("dashboard_query")
+if dashboard_query and refresh_seconds:
+    st.fragment(run_every=refresh_seconds)(render_dashboard)(**dashboard_query)
+elif dashboard_query:
+    render_dashboard(**dashboard_query)
 else:
-    st.info("조회할 설문과 기간을 선택하고 '조회' 버튼을 눌러주세요.")
\ No newline at end of file
+    st.info("조회할 설문과 기간을 선택하고 '조회' 버튼을 눌러주세요.")
+
+render_timing_panel()
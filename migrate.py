@@ -0,0 +1,52 @@
+import os
+from pathlib import Path
+from sqlalchemy import create_engine
+from dotenv import load_dotenv
+
+load_dotenv()
+
+db_user = os.getenv("DB_USER")
+db_password = os.getenv("DB_PASSWORD")
+db_host = os.getenv("DB_HOST")
+db_port = os.getenv("DB_PORT")
+db_name = os.getenv("DB_NAME")
+
+db_uri = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+
+
+def applied_versions(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version    TEXT PRIMARY KEY,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    cursor.execute("SELECT version FROM schema_migrations;")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate(engine):
+    """migrations 폴더의 SQL 파일을 파일명 순서대로, 아직 적용되지 않은 것만 실행합니다."""
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        applied = applied_versions(cursor)
+        raw.commit()
+        for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+            if path.stem in applied:
+                continue
+            cursor.execute(path.read_text(encoding="utf-8"))
+            cursor.execute("INSERT INTO schema_migrations (version) VALUES (%s);", (path.stem,))
+            raw.commit()
+            print(f"applied {path.name}")
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+
+
+if __name__ == "__main__":
+    migrate(create_engine(db_uri))
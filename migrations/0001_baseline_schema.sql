@@ -0,0 +1,57 @@
+-- 애플리케이션이 사용하는 기존 테이블 구조 (이미 존재하는 DB에서는 아무 작업도 하지 않습니다)
+
+CREATE TABLE IF NOT EXISTS surveys (
+    survey_id       SERIAL PRIMARY KEY,
+    survey_group_id INTEGER NOT NULL,
+    version         INTEGER NOT NULL DEFAULT 1,
+    survey_title    TEXT NOT NULL,
+    survey_content  TEXT,
+    page            BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at      TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS survey_items (
+    item_id    SERIAL PRIMARY KEY,
+    survey_id  INTEGER NOT NULL REFERENCES surveys (survey_id) ON DELETE CASCADE,
+    item_title TEXT NOT NULL,
+    item_type  TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS item_options (
+    option_id      SERIAL PRIMARY KEY,
+    item_id        INTEGER NOT NULL REFERENCES survey_items (item_id) ON DELETE CASCADE,
+    option_content TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS survey_sends (
+    send_id      UUID PRIMARY KEY,
+    survey_id    INTEGER NOT NULL REFERENCES surveys (survey_id) ON DELETE CASCADE,
+    scheduled_at TIMESTAMP NOT NULL,
+    status       TEXT NOT NULL,
+    recipients   JSONB NOT NULL DEFAULT '[]'::jsonb,
+    created_at   TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS survey_results (
+    result_id    SERIAL PRIMARY KEY,
+    survey_id    INTEGER NOT NULL REFERENCES surveys (survey_id) ON DELETE CASCADE,
+    send_id      UUID REFERENCES survey_sends (send_id) ON DELETE CASCADE,
+    email        TEXT,
+    status       TEXT NOT NULL,
+    completed_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS user_responses (
+    response_id   SERIAL PRIMARY KEY,
+    result_id     INTEGER NOT NULL REFERENCES survey_results (result_id) ON DELETE CASCADE,
+    item_id       INTEGER NOT NULL REFERENCES survey_items (item_id) ON DELETE CASCADE,
+    option_id     INTEGER REFERENCES item_options (option_id) ON DELETE CASCADE,
+    response_text TEXT
+);
+
+CREATE TABLE IF NOT EXISTS sentiment_analysis (
+    analysis_id     SERIAL PRIMARY KEY,
+    response_id     INTEGER NOT NULL REFERENCES user_responses (response_id) ON DELETE CASCADE,
+    sentiment_label TEXT NOT NULL,
+    sentiment_score DOUBLE PRECISION
+);
@@ -0,0 +1,15 @@
+-- 동시에 같은 설문 그룹의 새 버전을 저장할 때 MAX(version)+1 경합으로 버전이 중복되지 않도록 합니다.
+-- 이미 경합으로 중복된 버전이 있으면 제약을 걸 수 없으므로, 그룹 안에서 (version, survey_id) 순서로 번호를 다시 매깁니다.
+WITH renumbered AS (
+    SELECT survey_id, row_number() OVER (PARTITION BY survey_group_id ORDER BY version, survey_id) AS version
+    FROM surveys
+    WHERE survey_group_id IN (
+        SELECT survey_group_id FROM surveys GROUP BY survey_group_id, version HAVING count(*) > 1
+    )
+)
+UPDATE surveys s SET version = r.version
+FROM renumbered r
+WHERE r.survey_id = s.survey_id AND s.version IS DISTINCT FROM r.version;
+
+ALTER TABLE surveys
+    ADD CONSTRAINT surveys_group_version_key UNIQUE (survey_group_id, version);
@@ -0,0 +1,48 @@
+-- 설문 버전 간 문항 공유 (copy-on-write)
+-- survey_items 행은 한 번 저장되면 변경되지 않으며, 버전별 문항 구성은 survey_version_items가 가집니다.
+-- survey_items.survey_id는 해당 문항을 처음 저장한 버전을 가리킵니다.
+-- item_key는 버전이 바뀌어도 유지되는 논리 문항 ID, content_hash는 문항 내용(유형/제목/옵션)의 해시입니다.
+
+ALTER TABLE survey_items
+    ADD COLUMN item_key UUID,
+    ADD COLUMN content_hash TEXT;
+
+-- 기존 데이터는 같은 설문 그룹 안에서 제목이 같은 문항을 같은 논리 문항으로 한 번만 매칭합니다.
+WITH keys AS (
+    SELECT s.survey_group_id, si.item_title, gen_random_uuid() AS item_key
+    FROM survey_items si JOIN surveys s ON s.survey_id = si.survey_id
+    GROUP BY s.survey_group_id, si.item_title
+)
+UPDATE survey_items si SET item_key = k.item_key
+FROM surveys s, keys k
+WHERE s.survey_id = si.survey_id AND k.survey_group_id = s.survey_group_id AND k.item_title = si.item_title;
+
+-- 인풋박스 문항의 옵션까지 넣는 이 계산은 0016_item_owner_fk.sql에서 survey_store.item_content_hash()와 같게 다시 계산합니다.
+UPDATE survey_items si SET content_hash = h.content_hash
+FROM (
+    SELECT si.item_id,
+           md5(array_to_string(ARRAY[si.item_type, si.item_title] || array_agg(io.option_content ORDER BY io.option_id), E'\x1f')) AS content_hash
+    FROM survey_items si LEFT JOIN item_options io ON io.item_id = si.item_id
+    GROUP BY si.item_id
+) h
+WHERE h.item_id = si.item_id;
+
+ALTER TABLE survey_items
+    ALTER COLUMN item_key SET NOT NULL,
+    ALTER COLUMN content_hash SET NOT NULL;
+
+CREATE INDEX survey_items_item_key_idx ON survey_items (item_key, content_hash);
+
+CREATE TABLE survey_version_items (
+    survey_id INTEGER NOT NULL REFERENCES surveys (survey_id) ON DELETE CASCADE,
+    position  INTEGER NOT NULL,
+    item_id   INTEGER NOT NULL REFERENCES survey_items (item_id) ON DELETE CASCADE,
+    PRIMARY KEY (survey_id, position),
+    UNIQUE (survey_id, item_id)
+);
+
+CREATE INDEX survey_version_items_item_id_idx ON survey_version_items (item_id);
+
+INSERT INTO survey_version_items (survey_id, position, item_id)
+SELECT survey_id, row_number() OVER (PARTITION BY survey_id ORDER BY item_id), item_id
+FROM survey_items;
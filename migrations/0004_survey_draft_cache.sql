@@ -0,0 +1,24 @@
+-- AI 설문 초안 캐시: 정규화한 주제와 프롬프트 버전으로 저장하고, MinHash LSH 밴드로 유사 주제를 찾습니다.
+
+CREATE TABLE survey_draft_cache (
+    cache_id         SERIAL PRIMARY KEY,
+    topic            TEXT NOT NULL,
+    normalized_topic TEXT NOT NULL,
+    prompt_version   TEXT NOT NULL,
+    draft            JSONB NOT NULL,
+    minhash          BIGINT[] NOT NULL,
+    lsh_bands        TEXT[] NOT NULL,
+    hit_count        INTEGER NOT NULL DEFAULT 0,
+    created_at       TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (normalized_topic, prompt_version)
+);
+
+CREATE INDEX survey_draft_cache_lsh_idx ON survey_draft_cache USING GIN (lsh_bands);
+
+CREATE TABLE survey_draft_cache_stats (
+    prompt_version TEXT PRIMARY KEY,
+    lookups        INTEGER NOT NULL DEFAULT 0,
+    exact_hits     INTEGER NOT NULL DEFAULT 0,
+    near_hits      INTEGER NOT NULL DEFAULT 0,
+    accepted       INTEGER NOT NULL DEFAULT 0
+);
@@ -0,0 +1,46 @@
+-- 설문/응답/발송 데이터가 바뀌면 survey_cache 채널로 바뀐 survey_id와 survey_group_id를 알립니다.
+-- 문장(statement) 단위 트리거라서 대량 INSERT도 설문마다 알림 한 번만 보냅니다.
+-- 같은 트랜잭션에서 같은 내용의 알림은 Postgres가 하나로 합치며, 알림은 커밋 시점에 전달됩니다.
+
+CREATE OR REPLACE FUNCTION notify_survey_cache() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    changed RECORD;
+BEGIN
+    IF TG_TABLE_NAME = 'surveys' THEN
+        FOR changed IN SELECT DISTINCT survey_id, survey_group_id AS group_id FROM changed_rows LOOP
+            PERFORM pg_notify('survey_cache', json_build_object('table', TG_TABLE_NAME, 'survey_id', changed.survey_id, 'group_id', changed.group_id)::text);
+        END LOOP;
+    ELSE
+        FOR changed IN
+            SELECT DISTINCT c.survey_id, s.survey_group_id AS group_id
+            FROM changed_rows c LEFT JOIN surveys s ON s.survey_id = c.survey_id
+        LOOP
+            PERFORM pg_notify('survey_cache', json_build_object('table', TG_TABLE_NAME, 'survey_id', changed.survey_id, 'group_id', changed.group_id)::text);
+        END LOOP;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+-- 전이 테이블(REFERENCING)을 쓰는 트리거는 이벤트를 하나만 가질 수 있어 INSERT/UPDATE/DELETE를 따로 만듭니다.
+CREATE TRIGGER surveys_notify_insert AFTER INSERT ON surveys
+    REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION notify_survey_cache();
+CREATE TRIGGER surveys_notify_update AFTER UPDATE ON surveys
+    REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION notify_survey_cache();
+CREATE TRIGGER surveys_notify_delete AFTER DELETE ON surveys
+    REFERENCING OLD TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION notify_survey_cache();
+
+CREATE TRIGGER survey_results_notify_insert AFTER INSERT ON survey_results
+    REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION notify_survey_cache();
+CREATE TRIGGER survey_results_notify_update AFTER UPDATE ON survey_results
+    REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION notify_survey_cache();
+CREATE TRIGGER survey_results_notify_delete AFTER DELETE ON survey_results
+    REFERENCING OLD TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION notify_survey_cache();
+
+CREATE TRIGGER survey_sends_notify_insert AFTER INSERT ON survey_sends
+    REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION notify_survey_cache();
+CREATE TRIGGER survey_sends_notify_update AFTER UPDATE ON survey_sends
+    REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION notify_survey_cache();
+CREATE TRIGGER survey_sends_notify_delete AFTER DELETE ON survey_sends
+    REFERENCING OLD TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION notify_survey_cache();
@@ -0,0 +1,24 @@
+-- 설문 그룹별 최신 버전 포인터. 목록 화면이 surveys 전체를 DISTINCT ON으로 훑지 않고 이 테이블만 읽습니다.
+-- survey_store.save_survey_version이 새 버전을 저장하는 같은 트랜잭션에서 갱신합니다.
+
+CREATE TABLE survey_groups (
+    survey_group_id   INTEGER PRIMARY KEY,
+    latest_survey_id  INTEGER NOT NULL REFERENCES surveys (survey_id) ON DELETE CASCADE,
+    latest_version    INTEGER NOT NULL,
+    survey_title      TEXT NOT NULL,
+    survey_content    TEXT,
+    page              BOOLEAN NOT NULL DEFAULT FALSE,
+    latest_created_at TIMESTAMP NOT NULL
+);
+
+-- 목록 조회에 필요한 컬럼을 모두 담아 인덱스만으로(index-only scan) 응답할 수 있게 합니다.
+CREATE INDEX survey_groups_listing_idx ON survey_groups (survey_group_id)
+    INCLUDE (latest_survey_id, latest_version, survey_title, survey_content, page, latest_created_at);
+
+INSERT INTO survey_groups (survey_group_id, latest_survey_id, latest_version, survey_title, survey_content, page, latest_created_at)
+SELECT DISTINCT ON (survey_group_id) survey_group_id, survey_id, version, survey_title, survey_content, page, created_at
+FROM surveys
+ORDER BY survey_group_id, version DESC;
+
+-- 마이그레이션은 트랜잭션 안에서 실행되므로 VACUUM 대신 ANALYZE만 하고, 가시성 맵은 autovacuum에 맡깁니다.
+ANALYZE survey_groups;
@@ -0,0 +1,22 @@
+-- 설문 목록의 키셋 페이지네이션(created_at, survey_group_id)과 제목/내용 부분 검색을 위한 인덱스입니다.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- 그룹의 생성 시각(첫 버전 기준)은 새 버전을 저장해도 바뀌지 않아 페이지 경계가 흔들리지 않습니다.
+ALTER TABLE survey_groups ADD COLUMN created_at TIMESTAMP;
+
+UPDATE survey_groups g
+SET created_at = s.first_created_at
+FROM (SELECT survey_group_id, MIN(created_at) AS first_created_at FROM surveys GROUP BY survey_group_id) s
+WHERE s.survey_group_id = g.survey_group_id;
+
+ALTER TABLE survey_groups ALTER COLUMN created_at SET NOT NULL;
+ALTER TABLE survey_groups ALTER COLUMN created_at SET DEFAULT CURRENT_TIMESTAMP;
+
+CREATE INDEX survey_groups_keyset_idx ON survey_groups (created_at DESC, survey_group_id DESC)
+    INCLUDE (latest_survey_id, latest_version, survey_title, page, latest_created_at);
+
+CREATE INDEX survey_groups_search_idx ON survey_groups
+    USING GIN ((survey_title || ' ' || COALESCE(survey_content, '')) gin_trgm_ops);
+
+ANALYZE survey_groups;
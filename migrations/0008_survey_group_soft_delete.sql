@@ -0,0 +1,43 @@
+-- 설문 그룹 삭제를 즉시 처리되는 소프트 삭제(deleted_at)와, 관련 행을 나눠 지우는 백그라운드 정리 작업으로 나눕니다.
+
+ALTER TABLE survey_groups ADD COLUMN deleted_at TIMESTAMP;
+
+-- 목록 인덱스는 삭제되지 않은 그룹만 담도록 부분 인덱스로 다시 만듭니다.
+DROP INDEX survey_groups_listing_idx;
+DROP INDEX survey_groups_keyset_idx;
+DROP INDEX survey_groups_search_idx;
+
+CREATE INDEX survey_groups_listing_idx ON survey_groups (survey_group_id)
+    INCLUDE (latest_survey_id, latest_version, survey_title, survey_content, page, latest_created_at)
+    WHERE deleted_at IS NULL;
+
+CREATE INDEX survey_groups_keyset_idx ON survey_groups (created_at DESC, survey_group_id DESC)
+    INCLUDE (latest_survey_id, latest_version, survey_title, page, latest_created_at)
+    WHERE deleted_at IS NULL;
+
+CREATE INDEX survey_groups_search_idx ON survey_groups
+    USING GIN ((survey_title || ' ' || COALESCE(survey_content, '')) gin_trgm_ops)
+    WHERE deleted_at IS NULL;
+
+-- 정리 작업 큐와 진행 상황입니다. 한 배치가 끝날 때마다 deleted_rows가 늘어납니다.
+CREATE TABLE survey_purge_jobs (
+    survey_group_id INTEGER PRIMARY KEY,
+    survey_title    TEXT,
+    requested_at    TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    started_at      TIMESTAMP,
+    finished_at     TIMESTAMP,
+    phase           TEXT NOT NULL DEFAULT 'pending',
+    deleted_rows    BIGINT NOT NULL DEFAULT 0,
+    last_error      TEXT
+);
+
+CREATE INDEX survey_purge_jobs_pending_idx ON survey_purge_jobs (requested_at) WHERE finished_at IS NULL;
+
+-- 배치 삭제와 ON DELETE CASCADE가 테이블 전체를 훑지 않도록 외래 키 컬럼에 인덱스를 둡니다.
+CREATE INDEX IF NOT EXISTS survey_results_survey_id_idx ON survey_results (survey_id);
+CREATE INDEX IF NOT EXISTS survey_results_send_id_idx ON survey_results (send_id);
+CREATE INDEX IF NOT EXISTS user_responses_result_id_idx ON user_responses (result_id);
+CREATE INDEX IF NOT EXISTS user_responses_item_id_idx ON user_responses (item_id);
+CREATE INDEX IF NOT EXISTS user_responses_option_id_idx ON user_responses (option_id);
+CREATE INDEX IF NOT EXISTS sentiment_analysis_response_id_idx ON sentiment_analysis (response_id);
+CREATE INDEX IF NOT EXISTS survey_sends_survey_id_idx ON survey_sends (survey_id);
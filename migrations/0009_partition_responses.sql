@@ -0,0 +1,138 @@
+-- 응답 테이블(survey_results, user_responses, sentiment_analysis)을 completed_at 기준 월별 파티션으로 바꿉니다.
+-- 하위 테이블도 completed_at을 함께 저장해 같은 달 파티션끼리만 조인되고, 오래된 달은 통째로 떼어낼 수 있습니다.
+-- 기존 행은 새 테이블로 복사하고, SERIAL 시퀀스는 그대로 이어서 사용합니다.
+
+ALTER TABLE sentiment_analysis RENAME TO sentiment_analysis_unpartitioned;
+ALTER TABLE user_responses RENAME TO user_responses_unpartitioned;
+ALTER TABLE survey_results RENAME TO survey_results_unpartitioned;
+
+ALTER INDEX IF EXISTS sentiment_analysis_pkey RENAME TO sentiment_analysis_unpartitioned_pkey;
+ALTER INDEX IF EXISTS user_responses_pkey RENAME TO user_responses_unpartitioned_pkey;
+ALTER INDEX IF EXISTS survey_results_pkey RENAME TO survey_results_unpartitioned_pkey;
+DROP INDEX IF EXISTS survey_results_survey_id_idx;
+DROP INDEX IF EXISTS survey_results_send_id_idx;
+DROP INDEX IF EXISTS user_responses_result_id_idx;
+DROP INDEX IF EXISTS user_responses_item_id_idx;
+DROP INDEX IF EXISTS user_responses_option_id_idx;
+DROP INDEX IF EXISTS sentiment_analysis_response_id_idx;
+
+ALTER SEQUENCE survey_results_result_id_seq OWNED BY NONE;
+ALTER SEQUENCE user_responses_response_id_seq OWNED BY NONE;
+ALTER SEQUENCE sentiment_analysis_analysis_id_seq OWNED BY NONE;
+
+CREATE TABLE survey_results (
+    result_id    INTEGER NOT NULL DEFAULT nextval('survey_results_result_id_seq'),
+    survey_id    INTEGER NOT NULL REFERENCES surveys (survey_id) ON DELETE CASCADE,
+    send_id      UUID REFERENCES survey_sends (send_id) ON DELETE CASCADE,
+    email        TEXT,
+    status       TEXT NOT NULL,
+    completed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (result_id, completed_at)
+) PARTITION BY RANGE (completed_at);
+
+CREATE TABLE user_responses (
+    response_id   INTEGER NOT NULL DEFAULT nextval('user_responses_response_id_seq'),
+    result_id     INTEGER NOT NULL,
+    completed_at  TIMESTAMP NOT NULL,
+    item_id       INTEGER NOT NULL REFERENCES survey_items (item_id) ON DELETE CASCADE,
+    option_id     INTEGER REFERENCES item_options (option_id) ON DELETE CASCADE,
+    response_text TEXT,
+    PRIMARY KEY (response_id, completed_at),
+    FOREIGN KEY (result_id, completed_at) REFERENCES survey_results (result_id, completed_at) ON DELETE CASCADE
+) PARTITION BY RANGE (completed_at);
+
+CREATE TABLE sentiment_analysis (
+    analysis_id     INTEGER NOT NULL DEFAULT nextval('sentiment_analysis_analysis_id_seq'),
+    response_id     INTEGER NOT NULL,
+    completed_at    TIMESTAMP NOT NULL,
+    sentiment_label TEXT NOT NULL,
+    sentiment_score DOUBLE PRECISION,
+    PRIMARY KEY (analysis_id, completed_at),
+    FOREIGN KEY (response_id, completed_at) REFERENCES user_responses (response_id, completed_at) ON DELETE CASCADE
+) PARTITION BY RANGE (completed_at);
+
+ALTER SEQUENCE survey_results_result_id_seq OWNED BY survey_results.result_id;
+ALTER SEQUENCE user_responses_response_id_seq OWNED BY user_responses.response_id;
+ALTER SEQUENCE sentiment_analysis_analysis_id_seq OWNED BY sentiment_analysis.analysis_id;
+
+-- 월 파티션이 아직 없는 행(완료 시간이 없던 예전 행 포함)을 받아 두는 기본 파티션입니다.
+CREATE TABLE survey_results_default PARTITION OF survey_results DEFAULT;
+CREATE TABLE user_responses_default PARTITION OF user_responses DEFAULT;
+CREATE TABLE sentiment_analysis_default PARTITION OF sentiment_analysis DEFAULT;
+
+-- from_month부터 to_month까지 세 테이블의 월 파티션을 만들고, 새로 만든 파티션 수를 반환합니다.
+-- 보관 처리로 떼어낸 파티션은 다시 만들지 않도록 survey_results 파티션이 없는 달만 만듭니다.
+CREATE OR REPLACE FUNCTION create_response_partitions(from_month DATE, to_month DATE) RETURNS INTEGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    month_start DATE := date_trunc('month', from_month);
+    suffix TEXT;
+    created INTEGER := 0;
+BEGIN
+    WHILE month_start <= to_month LOOP
+        suffix := to_char(month_start, 'YYYY_MM');
+        IF to_regclass('survey_results_' || suffix) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I PARTITION OF survey_results FOR VALUES FROM (%L) TO (%L)',
+                           'survey_results_' || suffix, month_start, month_start + interval '1 month');
+            EXECUTE format('CREATE TABLE %I PARTITION OF user_responses FOR VALUES FROM (%L) TO (%L)',
+                           'user_responses_' || suffix, month_start, month_start + interval '1 month');
+            EXECUTE format('CREATE TABLE %I PARTITION OF sentiment_analysis FOR VALUES FROM (%L) TO (%L)',
+                           'sentiment_analysis_' || suffix, month_start, month_start + interval '1 month');
+            created := created + 1;
+        END IF;
+        month_start := (month_start + interval '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$;
+
+SELECT create_response_partitions(
+    COALESCE((SELECT min(completed_at)::date FROM survey_results_unpartitioned), CURRENT_DATE),
+    (CURRENT_DATE + interval '12 months')::date
+);
+
+INSERT INTO survey_results (result_id, survey_id, send_id, email, status, completed_at)
+SELECT result_id, survey_id, send_id, email, status, COALESCE(completed_at, TIMESTAMP '1970-01-01')
+FROM survey_results_unpartitioned;
+
+INSERT INTO user_responses (response_id, result_id, completed_at, item_id, option_id, response_text)
+SELECT ur.response_id, ur.result_id, COALESCE(sr.completed_at, TIMESTAMP '1970-01-01'), ur.item_id, ur.option_id, ur.response_text
+FROM user_responses_unpartitioned ur
+JOIN survey_results_unpartitioned sr ON sr.result_id = ur.result_id;
+
+INSERT INTO sentiment_analysis (analysis_id, response_id, completed_at, sentiment_label, sentiment_score)
+SELECT sa.analysis_id, sa.response_id, COALESCE(sr.completed_at, TIMESTAMP '1970-01-01'), sa.sentiment_label, sa.sentiment_score
+FROM sentiment_analysis_unpartitioned sa
+JOIN user_responses_unpartitioned ur ON ur.response_id = sa.response_id
+JOIN survey_results_unpartitioned sr ON sr.result_id = ur.result_id;
+
+DROP TABLE sentiment_analysis_unpartitioned, user_responses_unpartitioned, survey_results_unpartitioned;
+
+-- 분할 테이블의 인덱스는 각 파티션에 자동으로 만들어집니다.
+CREATE INDEX survey_results_survey_id_idx ON survey_results (survey_id);
+CREATE INDEX survey_results_send_id_idx ON survey_results (send_id);
+CREATE INDEX user_responses_result_id_idx ON user_responses (result_id);
+CREATE INDEX user_responses_item_id_idx ON user_responses (item_id);
+CREATE INDEX user_responses_option_id_idx ON user_responses (option_id);
+CREATE INDEX sentiment_analysis_response_id_idx ON sentiment_analysis (response_id);
+
+-- 0005의 캐시 무효화 트리거를 새 테이블에 다시 답니다. 분할 테이블의 문장 트리거는 모든 파티션의 변경을 함께 봅니다.
+CREATE TRIGGER survey_results_notify_insert AFTER INSERT ON survey_results
+    REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION notify_survey_cache();
+CREATE TRIGGER survey_results_notify_update AFTER UPDATE ON survey_results
+    REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION notify_survey_cache();
+CREATE TRIGGER survey_results_notify_delete AFTER DELETE ON survey_results
+    REFERENCING OLD TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION notify_survey_cache();
+
+-- 보관(Parquet으로 내보낸) 설문 버전 목록입니다. 응답이 이 result_id까지 파일에 들어 있습니다.
+CREATE TABLE survey_archives (
+    survey_id     INTEGER PRIMARY KEY REFERENCES surveys (survey_id) ON DELETE CASCADE,
+    path          TEXT NOT NULL,
+    row_count     BIGINT NOT NULL,
+    max_result_id INTEGER NOT NULL,
+    archived_at   TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+ANALYZE survey_results;
+ANALYZE user_responses;
+ANALYZE sentiment_analysis;
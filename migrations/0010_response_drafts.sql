@@ -0,0 +1,37 @@
+-- 응답자가 작성 중인 답변을 survey_results의 'in_progress' 행에 임시 저장합니다.
+-- 제출하면 완료 행을 새로 만들고 임시 저장 행은 지우므로, 완료 응답의 result_id는 계속 완료 순서대로 늘어납니다.
+
+ALTER TABLE survey_results ADD COLUMN draft_answers JSONB;
+ALTER TABLE survey_results ADD COLUMN updated_at TIMESTAMP;
+
+CREATE INDEX survey_results_drafts_idx ON survey_results (send_id, email) WHERE status = 'in_progress';
+
+-- 임시 저장은 몇 초마다 일어나므로 캐시 무효화 알림을 보내지 않습니다. (완료 응답만 집계/현황에 쓰입니다)
+CREATE OR REPLACE FUNCTION notify_survey_cache() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    changed RECORD;
+BEGIN
+    IF TG_TABLE_NAME = 'surveys' THEN
+        FOR changed IN SELECT DISTINCT survey_id, survey_group_id AS group_id FROM changed_rows LOOP
+            PERFORM pg_notify('survey_cache', json_build_object('table', TG_TABLE_NAME, 'survey_id', changed.survey_id, 'group_id', changed.group_id)::text);
+        END LOOP;
+    ELSIF TG_TABLE_NAME = 'survey_results' THEN
+        FOR changed IN
+            SELECT DISTINCT c.survey_id, s.survey_group_id AS group_id
+            FROM changed_rows c LEFT JOIN surveys s ON s.survey_id = c.survey_id
+            WHERE c.status <> 'in_progress'
+        LOOP
+            PERFORM pg_notify('survey_cache', json_build_object('table', TG_TABLE_NAME, 'survey_id', changed.survey_id, 'group_id', changed.group_id)::text);
+        END LOOP;
+    ELSE
+        FOR changed IN
+            SELECT DISTINCT c.survey_id, s.survey_group_id AS group_id
+            FROM changed_rows c LEFT JOIN surveys s ON s.survey_id = c.survey_id
+        LOOP
+            PERFORM pg_notify('survey_cache', json_build_object('table', TG_TABLE_NAME, 'survey_id', changed.survey_id, 'group_id', changed.group_id)::text);
+        END LOOP;
+    END IF;
+    RETURN NULL;
+END;
+$$;
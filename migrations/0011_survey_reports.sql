@@ -0,0 +1,22 @@
+-- 워커(report.py)가 미리 만들어 두는 설문 보고서입니다. content는 gzip으로 압축한 HTML 한 장입니다.
+-- fingerprint는 보고서에 쓰인 응답 집합의 지문이라, 같은 지문의 보고서가 있으면 다시 만들지 않고 재사용합니다.
+
+CREATE TABLE survey_reports (
+    report_id    SERIAL PRIMARY KEY,
+    survey_id    INTEGER NOT NULL REFERENCES surveys (survey_id) ON DELETE CASCADE,
+    send_id      UUID REFERENCES survey_sends (send_id) ON DELETE SET NULL,
+    start_date   DATE NOT NULL,
+    end_date     DATE NOT NULL,
+    fingerprint  TEXT,
+    status       TEXT NOT NULL DEFAULT 'pending',
+    requested_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    started_at   TIMESTAMP,
+    finished_at  TIMESTAMP,
+    content      BYTEA,
+    last_error   TEXT
+);
+
+CREATE INDEX survey_reports_pending_idx ON survey_reports (requested_at) WHERE status = 'pending';
+CREATE INDEX survey_reports_latest_idx ON survey_reports (survey_id, finished_at DESC) WHERE status = 'done';
+-- 발송 마감 후 자동 예약은 발송 건마다 한 번만 합니다.
+CREATE UNIQUE INDEX survey_reports_send_id_idx ON survey_reports (send_id) WHERE send_id IS NOT NULL;
@@ -0,0 +1,14 @@
+-- 주관식 답변의 감성/핵심 구문 분석 결과를 설문과 상관없이 공유하는 캐시입니다.
+-- 키는 정규화한 답변(NFC, 대소문자, 공백/문장부호 정리)의 SHA-256이라 "좋아요!!"와 "좋아요"는 한 번만 분석합니다.
+-- 분석기마다 결과가 다르므로 backend도 키에 포함합니다.
+
+CREATE TABLE text_analysis_cache (
+    backend         TEXT NOT NULL,
+    text_hash       TEXT NOT NULL,
+    normalized_text TEXT NOT NULL,
+    sentiment_label TEXT,
+    sentiment_score DOUBLE PRECISION,
+    key_phrases     JSONB,
+    created_at      TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (backend, text_hash)
+);
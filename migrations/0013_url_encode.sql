@@ -0,0 +1,21 @@
+-- 미응답자 리마인드 발송이 수신자 목록과 설문 URL을 DB 안에서 바로 만들 수 있도록 URL 인코딩 함수를 추가합니다.
+-- 결과는 Python의 urllib.parse.quote(값)과 같습니다. (영문/숫자와 _ . - ~ / 는 그대로, 나머지는 UTF-8 바이트별 %XX)
+
+CREATE OR REPLACE FUNCTION url_encode_bytes(value TEXT) RETURNS TEXT
+LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE AS $$
+    SELECT COALESCE(string_agg(
+        CASE WHEN b BETWEEN 48 AND 57 OR b BETWEEN 65 AND 90 OR b BETWEEN 97 AND 122 OR b IN (45, 46, 47, 95, 126)
+             THEN chr(b) ELSE '%' || upper(lpad(to_hex(b), 2, '0')) END, '' ORDER BY i), '')
+    FROM (SELECT i, get_byte(convert_to(value, 'UTF8'), i) AS b
+          FROM generate_series(0, octet_length(convert_to(value, 'UTF8')) - 1) AS i) bytes;
+$$;
+
+-- 대부분의 이메일 주소는 @와 +만 바꾸면 되므로 바이트 단위로 나누지 않습니다.
+-- 하위 쿼리 없는 식 하나라서 호출하는 쿼리 안으로 인라인됩니다. (그래서 STRICT를 붙이지 않습니다)
+CREATE OR REPLACE FUNCTION url_encode(value TEXT) RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT CASE
+        WHEN value ~ '^[A-Za-z0-9_.~/@+-]*$' THEN replace(replace(value, '@', '%40'), '+', '%2B')
+        ELSE url_encode_bytes(value)
+    END;
+$$;
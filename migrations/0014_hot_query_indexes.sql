@@ -0,0 +1,20 @@
+-- 자주 실행되는 조회에 필요한 인덱스 중 아직 마이그레이션에 없던 것을 추가합니다.
+-- bench/explain_check.py로 이 조회들이 큰 테이블을 순차 스캔하지 않는지 확인할 수 있습니다.
+
+-- 중복 응답 확인(send_id, email)과 발송 현황/미응답자 조회(send_id). send_id만 쓰는 조회도 이 인덱스의 앞부분을 사용합니다.
+CREATE INDEX survey_results_send_email_idx ON survey_results (send_id, email);
+DROP INDEX survey_results_send_id_idx;
+
+-- 설문 버전 삭제 시 ON DELETE CASCADE와 문항을 처음 저장한 버전 조회
+CREATE INDEX IF NOT EXISTS survey_items_survey_id_idx ON survey_items (survey_id);
+
+-- 문항 구조/응답 화면에서 문항별 선택지 조회와 문항 삭제 시 CASCADE
+CREATE INDEX IF NOT EXISTS item_options_item_id_idx ON item_options (item_id);
+
+-- 그룹의 버전 목록과 (그룹, 버전)으로 설문 찾기
+CREATE INDEX IF NOT EXISTS surveys_group_version_idx ON surveys (survey_group_id, version);
+
+ANALYZE survey_results;
+ANALYZE survey_items;
+ANALYZE item_options;
+ANALYZE surveys;
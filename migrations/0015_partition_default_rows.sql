@@ -0,0 +1,53 @@
+-- create_response_partitions가 기본 파티션에 이미 들어간 달의 파티션도 만들 수 있게 합니다.
+-- 파티션이 없을 때 들어온 행은 *_default에 쌓이고, 그 상태로 CREATE TABLE ... PARTITION OF를 하면
+-- "updated partition constraint for default partition would be violated"로 실패합니다.
+-- 그 달의 행을 임시 테이블로 옮겨 기본 파티션에서 지운 뒤 파티션을 만들고 다시 넣습니다. 모두 호출한 트랜잭션 안에서 일어납니다.
+
+CREATE OR REPLACE FUNCTION create_response_partitions(from_month DATE, to_month DATE) RETURNS INTEGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    month_start DATE := date_trunc('month', from_month);
+    month_end DATE;
+    suffix TEXT;
+    moved BIGINT;
+    created INTEGER := 0;
+BEGIN
+    WHILE month_start <= to_month LOOP
+        suffix := to_char(month_start, 'YYYY_MM');
+        month_end := (month_start + interval '1 month')::date;
+        IF to_regclass('survey_results_' || suffix) IS NULL THEN
+            -- 아직 그 달의 파티션이 없으므로 부모 테이블 조회는 기본 파티션만 읽습니다.
+            CREATE TEMP TABLE moving_survey_results ON COMMIT DROP AS
+                SELECT * FROM survey_results WHERE completed_at >= month_start AND completed_at < month_end;
+            CREATE TEMP TABLE moving_user_responses ON COMMIT DROP AS
+                SELECT * FROM user_responses WHERE completed_at >= month_start AND completed_at < month_end;
+            CREATE TEMP TABLE moving_sentiment_analysis ON COMMIT DROP AS
+                SELECT * FROM sentiment_analysis WHERE completed_at >= month_start AND completed_at < month_end;
+
+            DELETE FROM sentiment_analysis_default WHERE completed_at >= month_start AND completed_at < month_end;
+            DELETE FROM user_responses_default WHERE completed_at >= month_start AND completed_at < month_end;
+            DELETE FROM survey_results_default WHERE completed_at >= month_start AND completed_at < month_end;
+
+            EXECUTE format('CREATE TABLE %I PARTITION OF survey_results FOR VALUES FROM (%L) TO (%L)',
+                           'survey_results_' || suffix, month_start, month_end);
+            EXECUTE format('CREATE TABLE %I PARTITION OF user_responses FOR VALUES FROM (%L) TO (%L)',
+                           'user_responses_' || suffix, month_start, month_end);
+            EXECUTE format('CREATE TABLE %I PARTITION OF sentiment_analysis FOR VALUES FROM (%L) TO (%L)',
+                           'sentiment_analysis_' || suffix, month_start, month_end);
+
+            INSERT INTO survey_results SELECT * FROM moving_survey_results;
+            GET DIAGNOSTICS moved = ROW_COUNT;
+            INSERT INTO user_responses SELECT * FROM moving_user_responses;
+            INSERT INTO sentiment_analysis SELECT * FROM moving_sentiment_analysis;
+            IF moved > 0 THEN
+                RAISE NOTICE 'moved % survey_results rows for % out of the default partition', moved, suffix;
+            END IF;
+
+            DROP TABLE moving_survey_results, moving_user_responses, moving_sentiment_analysis;
+            created := created + 1;
+        END IF;
+        month_start := month_end;
+    END LOOP;
+    RETURN created;
+END;
+$$;
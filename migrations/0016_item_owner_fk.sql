@@ -0,0 +1,23 @@
+-- survey_items.survey_id는 문항을 처음 저장한 버전일 뿐인데 ON DELETE CASCADE로 걸려 있어,
+-- 그 버전 행을 지우면 문항을 재사용하는 이후 버전의 survey_version_items와 응답까지 함께 지워집니다.
+-- 버전의 문항 구성은 survey_version_items만 가지므로, 처음 저장한 버전이 지워지면 기록만 비웁니다.
+-- 설문 그룹을 지울 때 남는 문항은 purger.py의 items 단계가 정리합니다.
+
+ALTER TABLE survey_items ALTER COLUMN survey_id DROP NOT NULL;
+
+ALTER TABLE survey_items
+    DROP CONSTRAINT survey_items_survey_id_fkey,
+    ADD CONSTRAINT survey_items_survey_id_fkey FOREIGN KEY (survey_id) REFERENCES surveys (survey_id) ON DELETE SET NULL;
+
+-- 0003의 백필은 인풋박스 문항에 남아 있던 옵션까지 해시에 넣었지만 survey_store.item_content_hash()는
+-- 선택형(라디오버튼, 체크박스)만 옵션을 넣습니다. 같은 정의로 다시 계산해 재사용 매칭이 어긋나지 않게 합니다.
+UPDATE survey_items si SET content_hash = h.content_hash
+FROM (
+    SELECT si.item_id,
+           md5(array_to_string(ARRAY[si.item_type, si.item_title]
+                               || array_agg(io.option_content ORDER BY io.option_id)
+                                  FILTER (WHERE si.item_type IN ('라디오버튼', '체크박스')), E'\x1f')) AS content_hash
+    FROM survey_items si LEFT JOIN item_options io ON io.item_id = si.item_id
+    GROUP BY si.item_id
+) h
+WHERE h.item_id = si.item_id AND h.content_hash IS DISTINCT FROM si.content_hash;
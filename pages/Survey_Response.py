@@ -1,9 +1,13 @@
 import streamlit as st
-from sqlalchemy import text
-from azure.core.credentials import AzureKeyCredential
-from azure.ai.textanalytics import TextAnalyticsClient
+import json
 import os
+import time
 from dotenv import load_dotenv
+from tracing import trace_page
+from text_analysis import CachedLanguageBackend, get_language_backend
+from response_store import save_responses as save_responses_to_db
+from response_store import SUBMIT_GROUP_COMMIT, get_submission_buffer, prepare_submission
+from response_store import DRAFT_SAVE_INTERVAL_SECONDS, answers_digest, decode_answers, encode_answers, find_draft, save_draft
 
 load_dotenv()  # 환경변수 불러오기
 st.set_page_config(page_title="설문 응답", layout="centered", initial_sidebar_state="collapsed")
@@ -18,18 +22,10 @@ db_name = os.getenv("DB_NAME")
 db_uri = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
 
 conn = st.connection("postgres", type="sql", url=db_uri)
+trace_page("respondent", conn)
 
-# Get environment variables
-language_endpoint = os.getenv("AZURE_LNG_ENDPOINT")
-language_api_key = os.getenv("AZURE_LNG_API_KEY")
-
-lang_credential = AzureKeyCredential(language_api_key)
-
-# OpenAI client setting
-text_client = TextAnalyticsClient(
-        endpoint=language_endpoint,
-        credential=lang_credential
-)
+# LANGUAGE_BACKEND 환경변수로 Azure Language 또는 로컬 분석기를 선택합니다. 이미 분석한 적 있는 답변은 캐시에서 읽습니다.
+language_backend = CachedLanguageBackend(get_language_backend(), lambda: conn.session)
 
 st.markdown("""
 <style>
@@ -41,17 +37,18 @@ st.markdown("""
 @st.cache_data(ttl=60)
 def get_survey_data(_conn, survey_id):
     try:
-        survey_info = _conn.query(f"SELECT survey_title, survey_content, page FROM surveys WHERE survey_id={survey_id}", ttl=60)
+        survey_info = _conn.query(f"SELECT s.survey_title, s.survey_content, s.page FROM surveys s JOIN survey_groups g ON g.survey_group_id = s.survey_group_id WHERE s.survey_id={survey_id} AND g.deleted_at IS NULL", ttl=60)
         if survey_info.empty:
             return None, None
         
         items_query = """
             SELECT si.item_id, si.item_title, si.item_type, array_agg(io.option_content ORDER BY io.option_id) as options, array_agg(io.option_id ORDER BY io.option_id) as option_ids
-            FROM survey_items si
+            FROM survey_version_items svi
+            JOIN survey_items si ON si.item_id = svi.item_id
             LEFT JOIN item_options io ON si.item_id = io.item_id
-            WHERE si.survey_id = :sid
-            GROUP BY si.item_id, si.item_title, si.item_type
-            ORDER BY si.item_id;
+            WHERE svi.survey_id = :sid
+            GROUP BY svi.position, si.item_id, si.item_title, si.item_type
+            ORDER BY svi.position;
         """
         items_df = _conn.query(sql=items_query, params={"sid": survey_id})
         
@@ -61,63 +58,112 @@ def get_survey_data(_conn, survey_id):
         return None, None
 
 def save_responses(survey_id, send_id, user_email, responses):
+    analyze = lambda text_document: analyze_sentiment(language_backend, text_document)  # noqa: E731
     try:
+        if SUBMIT_GROUP_COMMIT:
+            # 다른 응답자의 제출과 묶여 커밋될 때까지 기다립니다.
+            get_submission_buffer(db_uri).submit(prepare_submission(survey_id, send_id, user_email, responses, analyze_sentiment=analyze))
+            return True
         with conn.session as s:
-            result = s.execute(
-                text("INSERT INTO survey_results (survey_id, send_id, email, status, completed_at) VALUES (:sid, :send_id, :email, 'completed', CURRENT_TIMESTAMP) RETURNING result_id;"),
-                params={"sid": survey_id, "send_id": send_id, "email": user_email}
-            )
-            result_id = result.scalar_one()
-
-            for item_id, answer in responses.items():
-                if not answer: continue
-                
-                if isinstance(answer, list):
-                    for option_id in answer:
-                        s.execute(
-                            text("INSERT INTO user_responses (result_id,  item_id, option_id) VALUES (:rid, :iid, :oid);"),
-                            params={"rid": result_id, "iid": item_id, "oid": option_id}
-                        )
-                elif "option_id" in answer:
-                     s.execute(
-                        text("INSERT INTO user_responses (result_id,  item_id, option_id) VALUES (:rid, :iid, :oid);"),
-                        params={"rid": result_id, "iid": item_id, "oid": answer["option_id"]}
-                    )
-                elif "text" in answer and answer['text'].strip():
-                    response_text_to_save = answer['text'].strip()
-                    res = s.execute(
-                        text("INSERT INTO user_responses (result_id, item_id, response_text) VALUES (:rid, :iid, :text) RETURNING response_id;"),
-                        params={"rid": result_id, "iid": item_id, "text": response_text_to_save}
-                    )
-                    response_id = res.scalar_one()
-
-                    sentiment_label, sentiment_score = analyze_sentiment(text_client, response_text_to_save)
-                    if sentiment_label and sentiment_score is not None:
-                        s.execute(
-                            text("INSERT INTO sentiment_analysis (response_id, sentiment_label, sentiment_score) VALUES (:rid, :label, :score);"),
-                            params={"rid": response_id, "label": sentiment_label, "score": sentiment_score}
-                        )
+            save_responses_to_db(s, survey_id, send_id, user_email, responses, analyze_sentiment=analyze)
             s.commit()
         return True
     except Exception as e:
         st.error(f"저장 중 오류가 발생했습니다: {e}")
         return False
 
-def analyze_sentiment(client, text_document):
+def autosave_draft(draft_key, responses):
+    """작성 중인 답변을 DB에 임시 저장합니다. 바뀌지 않았으면 건너뜁니다.
+
+    마지막 저장 후 DRAFT_SAVE_INTERVAL_SECONDS가 지나지 않았으면 pending에 남겨 두고, flush_pending_draft가 간격이 지난 뒤 저장합니다.
+    """
+    draft = st.session_state[draft_key]
+    encoded = encode_answers(responses)
+    digest = answers_digest(encoded)
+    if digest == draft["digest"]:
+        draft.pop("pending", None)
+        return
+    if time.monotonic() - draft["saved_at"] < DRAFT_SAVE_INTERVAL_SECONDS:
+        draft["pending"] = encoded
+        return
+    write_draft(draft, encoded, digest)
+
+def write_draft(draft, encoded, digest):
+    try:
+        with conn.session as s:
+            draft["id"] = save_draft(s, draft["id"], survey_id, send_id, email, encoded)
+            s.commit()
+        draft["digest"], draft["saved_at"] = digest, time.monotonic()
+        draft.pop("pending", None)
+    except Exception:
+        # 임시 저장에 실패해도 응답 작성과 제출은 계속할 수 있어야 합니다.
+        st.caption("작성 중인 답변을 임시 저장하지 못했습니다. 제출은 그대로 진행할 수 있습니다.")
+
+@st.fragment(run_every=DRAFT_SAVE_INTERVAL_SECONDS)
+def flush_pending_draft(draft_key):
+    """저장 간격 때문에 미뤄 둔 마지막 변경을 저장합니다. 응답자가 더 조작하지 않고 창을 닫아도 남도록 주기적으로 실행됩니다."""
+    draft = st.session_state.get(draft_key)
+    if draft and draft.get("pending") and time.monotonic() - draft["saved_at"] >= DRAFT_SAVE_INTERVAL_SECONDS:
+        write_draft(draft, draft["pending"], answers_digest(draft["pending"]))
+
+def restore_item(item, answer):
+    """저장된 답변으로 문항 위젯 값을 채웁니다. 이미 화면에 있는 위젯(세션에 키가 있는 경우)은 건드리지 않습니다."""
+    item_id = item['item_id']
+    if not answer:
+        return
+    if item['item_type'] == '라디오버튼' and "option_id" in answer and answer["option_id"] in item['option_ids']:
+        st.session_state.setdefault(f"item_{item_id}", item['options'][item['option_ids'].index(answer["option_id"])])
+    elif item['item_type'] == '체크박스' and isinstance(answer, list):
+        for option_id in answer:
+            st.session_state.setdefault(f"item_{item_id}_{option_id}", True)
+    elif item['item_type'] == '인풋박스' and "text" in answer:
+        st.session_state.setdefault(f"item_{item_id}", answer["text"])
+
+def render_item(item):
+    """문항 하나의 위젯을 그리고 (답변, 옵션이 올바른지 여부)를 반환합니다."""
+    item_id = item['item_id']
+    st.subheader(f"Q. {item['item_title']}")
+
+    if item['item_type'] in ('라디오버튼', '체크박스'):
+        if not isinstance(item['options'], list) or (len(item['options']) > 0 and item['options'][0] is None):
+            st.warning("옵션이 올바르게 설정되지 않았습니다.")
+            return None, False
+        option_map = {opt: opt_id for opt, opt_id in zip(item['options'], item['option_ids'])}
+
+    answer = None
+    if item['item_type'] == '라디오버튼':
+        selected_option = st.radio("하나를 선택해주세요.", item['options'], key=f"item_{item_id}", index=None, label_visibility="collapsed")
+        if selected_option:
+            answer = {"option_id": option_map[selected_option]}
+    elif item['item_type'] == '체크박스':
+        answer = [option_map[option] for option in item['options'] if st.checkbox(option, key=f"item_{item_id}_{option_map[option]}")]
+    elif item['item_type'] == '인풋박스':
+        answer = {"text": st.text_area("답변을 입력해주세요.", key=f"item_{item_id}", height=150, label_visibility="collapsed")}
+    st.markdown("---")
+    return answer, True
+
+def is_answered(item, answer):
+    if answer is None:
+        return False
+    if item['item_type'] == '체크박스':
+        return bool(answer)
+    if item['item_type'] == '인풋박스':
+        return bool(answer.get('text', '').strip())
+    return True
+
+def submit(responses):
+    if not email:
+        st.error("응답자를 식별할 수 없습니다. 전달받은 링크를 통해 다시 접속해주세요.")
+        return
+    if save_responses(survey_id, send_id, email, responses):
+        st.session_state[f"submitted_{survey_id}_{email}"] = True
+        st.session_state.pop(draft_key, None)
+        st.rerun()
+
+def analyze_sentiment(backend, text_document):
     """주어진 텍스트의 감정을 분석하고, 레이블과 점수를 반환합니다."""
     try:
-        result = client.analyze_sentiment(documents=[text_document])
-        doc_result = [doc for doc in result if not doc.is_error][0]
-
-        sentiment = doc_result.sentiment
-        if sentiment == 'positive':
-            score = doc_result.confidence_scores.positive
-        elif sentiment == 'neutral':
-            score = doc_result.confidence_scores.neutral
-        else: # negative
-            score = doc_result.confidence_scores.negative
-            
-        return sentiment, score
+        return backend.analyze_sentiment([text_document])[0]
     except Exception as e:
         st.warning(f"감정 분석 API 호출 중 오류가 발생했습니다: {e}")
         return None, None
@@ -142,6 +188,7 @@ if f"submitted_{survey_id}_{email}" in st.session_state:
     st.balloons()
     st.stop()
 
+# 중복 응답 확인은 복제 지연의 영향을 받지 않도록 항상 주 DB(conn)에서 합니다.
 try:
     query = """
         SELECT status FROM survey_results
@@ -149,7 +196,7 @@ try:
     """
     result_df = conn.query(sql=query, params={"send_id": send_id, "email": email}, ttl=0)
     
-    if not result_df.empty and result_df.iloc[0]['status'] == 'completed':
+    if not result_df.empty and (result_df['status'] == 'completed').any():
         st.warning("이미 설문에 참여하셨습니다. 감사합니다.")
         st.stop() # 페이지 실행 중지
 
@@ -162,69 +209,80 @@ st.title(survey_info['survey_title'])
 st.markdown(survey_info['survey_content'])
 st.markdown("---")
 
-if "user_answers" not in st.session_state:
-    st.session_state.user_answers = {}
+# 세션에는 임시 저장 id와 마지막으로 저장한 답변의 해시만 둡니다. 답변은 DB에 있으므로 서버가 재시작돼도 이어서 작성할 수 있습니다.
+# 페이지 모드에서는 지나온 페이지의 답변을 encode_answers 형식의 작은 dict(answers)로 함께 둡니다.
+draft_key = f"draft_{send_id}_{email}"
+if draft_key not in st.session_state:
+    with conn.session as s:
+        saved_draft = find_draft(s, survey_id, send_id, email)
+    st.session_state[draft_key] = {"id": None, "digest": None, "saved_at": 0.0, "answers": {}, "page": 0}
+    if saved_draft is not None:
+        draft_id, draft_responses = saved_draft
+        encoded = encode_answers(draft_responses)
+        st.session_state[draft_key].update(id=draft_id, digest=answers_digest(encoded), answers=json.loads(encoded))
+        st.info("이전에 작성하던 답변을 불러왔습니다.")
+draft = st.session_state[draft_key]
 
-all_questions_valid = True
 if items_df.empty:
     st.warning("이 설문에는 등록된 문항이 없습니다.")
-    all_questions_valid = False
+    st.stop()
 
-for _, item in items_df.iterrows():
-    item_id = item['item_id']
-    st.subheader(f"Q. {item['item_title']}")
+if survey_info['page']:
+    # 현재 페이지(문항 하나)의 위젯만 만들므로, 재실행 비용이 문항 수와 상관없이 한 페이지 분량입니다.
+    page = min(draft["page"], len(items_df) - 1)
+    item = items_df.iloc[page]
+    item_id = int(item['item_id'])
+    saved_answers = decode_answers(draft["answers"])
+    restore_item(item, saved_answers.get(item_id))
 
-    if item['item_type'] == '라디오버튼':
-        if not isinstance(item['options'], list) or (len(item['options']) > 0 and item['options'][0] is None): 
-            st.warning("옵션이 올바르게 설정되지 않았습니다."); all_questions_valid = False; continue
-        option_map = {opt: opt_id for opt, opt_id in zip(item['options'], item['option_ids'])}
-        selected_option = st.radio("하나를 선택해주세요.", item['options'], key=f"item_{item_id}", index=None, label_visibility="collapsed")
-        if selected_option:
-            st.session_state.user_answers[item_id] = {"option_id": option_map[selected_option]}
-    
-    elif item['item_type'] == '체크박스':
-        if not isinstance(item['options'], list) or (len(item['options']) > 0 and item['options'][0] is None):
-            st.warning("옵션이 올바르게 설정되지 않았습니다."); all_questions_valid = False; continue
-        selected_options = []
-        option_map = {opt: opt_id for opt, opt_id in zip(item['options'], item['option_ids'])}
-        for option in item['options']:
-            if st.checkbox(option, key=f"item_{item_id}_{option_map[option]}"):
-                selected_options.append(option_map[option])
-        st.session_state.user_answers[item_id] = selected_options
+    st.progress((page + 1) / len(items_df), text=f"{page + 1} / {len(items_df)}")
+    answer, options_valid = render_item(item)
+    if is_answered(item, answer):
+        saved_answers[item_id] = answer
+    else:
+        saved_answers.pop(item_id, None)
+    draft["answers"] = json.loads(encode_answers(saved_answers))
+    autosave_draft(draft_key, saved_answers)
+    flush_pending_draft(draft_key)
 
-    elif item['item_type'] == '인풋박스':
-        text_input = st.text_area("답변을 입력해주세요.", key=f"item_{item_id}", height=150, label_visibility="collapsed")
-        st.session_state.user_answers[item_id] = {"text": text_input}
-        
-    st.markdown("---")
+    is_last = page == len(items_df) - 1
+    c1, c2 = st.columns(2)
+    if c1.button("이전", use_container_width=True, disabled=page == 0):
+        draft["page"] = page - 1
+        st.rerun()
+    if c2.button("제출하기" if is_last else "다음", use_container_width=True, type="primary", disabled=not options_valid):
+        if not is_answered(item, answer):
+            st.warning("⚠️ 이 문항에 응답해주세요!")
+        elif not is_last:
+            draft["page"] = page + 1
+            st.rerun()
+        else:
+            unanswered = [i for i, (_, row) in enumerate(items_df.iterrows()) if not is_answered(row, saved_answers.get(int(row['item_id'])))]
+            if unanswered:
+                draft["page"] = unanswered[0]
+                st.toast(f"⚠️ {unanswered[0] + 1}번 문항에 응답해주세요!")
+                st.rerun()
+            else:
+                submit(saved_answers)
+else:
+    if draft["answers"]:
+        for _, item in items_df.iterrows():
+            restore_item(item, decode_answers(draft["answers"]).get(int(item['item_id'])))
+        draft["answers"] = {}
 
-if all_questions_valid and st.button("제출하기", use_container_width=True, type="primary"):
-    
-    is_fully_answered = True
+    user_answers = {}
+    all_questions_valid = True
     for _, item in items_df.iterrows():
-        item_id = item['item_id']
-        answer = st.session_state.user_answers.get(item_id)
-        
-        if answer is None:
-            is_fully_answered = False
-            break
-        
-        if item['item_type'] == '체크박스' and not answer:
-            is_fully_answered = False
-            break
-        if item['item_type'] == '인풋박스' and not answer.get('text', '').strip():
-            is_fully_answered = False
-            break
-            
-    if not is_fully_answered:
-        st.warning("⚠️ 모든 문항에 응답해주세요!")
-    else:
-        if email:
-            success = save_responses(survey_id, send_id, email, st.session_state.user_answers)
-            if success:
-                st.session_state[f"submitted_{survey_id}_{email}"] = True
-                if "user_answers" in st.session_state:
-                    del st.session_state.user_answers
-                st.rerun()
+        answer, options_valid = render_item(item)
+        all_questions_valid &= options_valid
+        if answer is not None:
+            user_answers[item['item_id']] = answer
+
+    autosave_draft(draft_key, user_answers)
+    flush_pending_draft(draft_key)
+
+    if all_questions_valid and st.button("제출하기", use_container_width=True, type="primary"):
+        if not all(is_answered(item, user_answers.get(item['item_id'])) for _, item in items_df.iterrows()):
+            st.warning("⚠️ 모든 문항에 응답해주세요!")
         else:
-            st.error("응답자를 식별할 수 없습니다. 전달받은 링크를 통해 다시 접속해주세요.")
\ No newline at end of file
+            submit(user_answers)
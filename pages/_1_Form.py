@@ -2,10 +2,12 @@ import streamlit as st
 import time
 from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
-import openai
-from openai import AzureOpenAI
 import os
 from dotenv import load_dotenv
+from tracing import trace_page
+from clients import get_openai_client
+from survey_store import save_survey_version
+from question_refiner import refine_question, refine_questions
 
 load_dotenv()
 st.set_page_config(page_title="설문 수정", layout="wide", initial_sidebar_state="collapsed")
@@ -15,20 +17,14 @@ db_password = os.getenv("DB_PASSWORD")
 db_host = os.getenv("DB_HOST")
 db_port = os.getenv("DB_PORT")
 db_name = os.getenv("DB_NAME")
-openai_endpoint = os.getenv("AZURE_ENDPOINT")
-openai_api_key = os.getenv("OPENAI_API_KEY")
-openai_api_version = os.getenv("OPENAI_API_VERSION")
 openai_deployment = os.getenv("GPT_DEPLOYMENT_NAME")
 
 db_uri = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
 conn = st.connection("postgres", type="sql", url=db_uri)
+trace_page("edit", conn)
 
 try:
-    ai_client = AzureOpenAI(
-        api_version=openai_api_version,
-        azure_endpoint=openai_endpoint,
-        api_key=openai_api_key,
-    )
+    ai_client = get_openai_client()
 except Exception as e:
     st.error(f"AI 클라이언트 초기화 중 오류 발생: {e}")
     ai_client = None
@@ -52,9 +48,11 @@ def initialize_edit_state():
                 survey_info = s.execute(survey_info_q, {"id": survey_id_to_edit}).mappings().fetchone()
                 
                 items_q = text("""
-                    SELECT si.item_id, si.item_title, si.item_type, array_agg(io.option_content ORDER BY io.option_id) as options
-                    FROM survey_items si LEFT JOIN item_options io ON si.item_id = io.item_id
-                    WHERE si.survey_id = :sid GROUP BY si.item_id ORDER BY si.item_id;
+                    SELECT si.item_id, CAST(si.item_key AS text) AS item_key, si.item_title, si.item_type, array_agg(io.option_content ORDER BY io.option_id) as options
+                    FROM survey_version_items svi
+                    JOIN survey_items si ON si.item_id = svi.item_id
+                    LEFT JOIN item_options io ON si.item_id = io.item_id
+                    WHERE svi.survey_id = :sid GROUP BY svi.position, si.item_id ORDER BY svi.position;
                 """)
                 items_data = s.execute(items_q, {"sid": survey_id_to_edit}).mappings().fetchall()
             
@@ -67,7 +65,8 @@ def initialize_edit_state():
             for item in items_data:
                 questions.append({
                     "title": item['item_title'], "type": item['item_type'],
-                    "options": [opt for opt in item['options'] if opt is not None]
+                    "options": [opt for opt in item['options'] if opt is not None],
+                    "item_key": item['item_key']
                 })
             st.session_state.edit_questions = questions
             st.session_state.current_page = 0
@@ -80,41 +79,31 @@ def refine_question_text(client, original_text):
     if not client:
         st.error("AI 클라이언트가 초기화되지 않았습니다.")
         return original_text
-        
-    system_prompt = "당신은 설문조사 문항 작성에 특화된 전문 카피라이터입니다. 사용자가 입력한 질문을 응답자가 더 이해하기 쉽고, 명확하며, 중립적인 표현으로 다듬어주세요. 다른 설명 없이, 다듬어진 최종 질문 문구만 출력해야 합니다."
-    
-    try:
-        response = client.chat.completions.create(
-            model=openai_deployment,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": original_text}
-            ],
-            temperature=0.7,
-            max_tokens=200
-        )
-        choice = response.choices[0]
-
-        if choice.finish_reason == "content_filter":
-            st.error("AI가 생성한 추천 문구가 콘텐츠 정책에 위배되어 차단되었습니다.")
-            return original_text
-        
-        if choice.message.content is None:
-            st.error("AI가 추천 문구를 생성하지 못했습니다.")
-            return original_text
-
-        return choice.message.content.strip()
-
-    except openai.BadRequestError as e:
-        if "content_filter" in str(e.response.json()):
-            st.error("입력하신 문구가 콘텐츠 정책에 위배되어 AI 추천을 받을 수 없습니다.")
-        else:
-            st.error(f"API 요청 오류가 발생했습니다: {e}")
-        return original_text
-    
-    except Exception as e:
-        st.error(f"AI 추천 생성 중 알 수 없는 오류가 발생했습니다: {e}")
+
+    result = refine_question(client, openai_deployment, original_text)
+    if result["status"] != "ok":
+        st.error(result["message"])
         return original_text
+    return result["title"]
+
+def refine_all_questions(client, include_options):
+    if not client:
+        st.error("AI 클라이언트가 초기화되지 않았습니다.")
+        return
+
+    results = refine_questions(client, openai_deployment, st.session_state.edit_questions, include_options)
+    report = []
+    for i, (question, result) in enumerate(zip(st.session_state.edit_questions, results)):
+        if result["status"] != "ok":
+            report.append(f"문항 {i+1}: {result['message']} (기존 문구를 유지합니다.)")
+            continue
+        # 위젯에 남아 있는 이전 입력값 대신 추천 문구가 보이도록 위젯 상태를 지웁니다.
+        question['title'] = result["title"]
+        st.session_state.pop(f"edit_q_title_{i}", None)
+        if result["options"] is not None:
+            question['options'] = result["options"]
+            for j in range(len(question['options'])): st.session_state.pop(f"edit_opt_{i}_{j}", None)
+    st.session_state.refine_report = report
 
 if 'edit_survey_id' not in st.session_state:
     st.warning("잘못된 접근입니다. 설문 관리 페이지에서 수정할 항목을 선택해주세요.")
@@ -145,6 +134,15 @@ with edit_col:
         st.text_area("설문 설명", key="edit_desc")
         st.markdown("---"); st.subheader("설문 문항 편집")
 
+        batch_cols = st.columns([3, 1])
+        with batch_cols[0]: include_options = st.checkbox("선택지도 함께 다듬기", key="refine_include_options")
+        with batch_cols[1]:
+            if st.button("✨ 전체 AI 추천", use_container_width=True, disabled=not st.session_state.edit_questions):
+                with st.spinner("AI가 모든 문항을 다듬고 있습니다..."):
+                    refine_all_questions(ai_client, include_options)
+                st.rerun()
+        for message in st.session_state.pop('refine_report', []): st.warning(message)
+
         for i in range(len(st.session_state.edit_questions)):
             with st.container(border=True):
                 current_question = st.session_state.edit_questions[i]
@@ -202,7 +200,7 @@ with preview_col:
 
 _, left_col, center_col, _ = st.columns([1, 1.5, 1.5, 1])
 def cleanup_state():
-    keys = ['edit_survey_id', 'data_loaded', 'edit_title', 'edit_desc', 'edit_questions', 'is_paginated', 'current_page', 'edit_survey_group_id']
+    keys = ['edit_survey_id', 'data_loaded', 'edit_title', 'edit_desc', 'edit_questions', 'is_paginated', 'current_page', 'edit_survey_group_id', 'refine_report']
     for key in keys:
         if key in st.session_state: del st.session_state[key]
 with left_col:
@@ -212,30 +210,13 @@ with left_col:
 with center_col:
     if st.button("💾 수정 완료", use_container_width=True, type="primary"):
         try:
-            with conn.session as s:
-                group_id = st.session_state.edit_survey_group_id
-                latest_version_q = text("SELECT MAX(version) FROM surveys WHERE survey_group_id = :gid")
-                latest_version = s.execute(latest_version_q, {"gid": group_id}).scalar_one()
-                new_version = latest_version + 1
-
-                insert_survey_q = text("""
-                    INSERT INTO surveys (survey_group_id, version, survey_title, survey_content, page)
-                    VALUES (:gid, :ver, :title, :content, :page) RETURNING survey_id;
-                """)
-                new_survey_id = s.execute(insert_survey_q, {
-                    "gid": group_id, "ver": new_version, "title": st.session_state.edit_title,
-                    "content": st.session_state.edit_desc, "page": st.session_state.is_paginated
-                }).scalar_one()
-
-                for q_item in st.session_state.edit_questions:
-                    item_result = s.execute(text('INSERT INTO survey_items (survey_id, item_title, item_type) VALUES (:sid, :title, :type) RETURNING item_id;'),
-                                            params=dict(sid=new_survey_id, title=q_item['title'], type=q_item['type']))
-                    item_id = item_result.scalar_one()
-                    if q_item['type'] in ["라디오버튼", "체크박스"]:
-                        for option_content in q_item['options']:
-                            s.execute(text('INSERT INTO item_options (item_id, option_content) VALUES (:iid, :content);'),
-                                      params=dict(iid=item_id, content=option_content))
-                s.commit()
+            _, new_version = save_survey_version(conn, {
+                "survey_group_id": st.session_state.edit_survey_group_id,
+                "survey_title": st.session_state.edit_title,
+                "survey_content": st.session_state.edit_desc,
+                "page": st.session_state.is_paginated,
+                "questions": st.session_state.edit_questions,
+            })
             st.success(f"설문이 새로운 버전(v{new_version})으로 저장되었습니다!")
             cleanup_state()
             time.sleep(1)
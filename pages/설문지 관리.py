@@ -4,6 +4,12 @@ from sqlalchemy.exc import SQLAlchemyError
 import pandas as pd
 import os
 from dotenv import load_dotenv
+from tracing import trace_page
+from paging import LIST_PAGE_SIZE, current_cursor, is_past_first_page, render_pager
+from survey_store import list_survey_groups
+from query_cache import cached_query, invalidate, start_invalidation_listener
+from db_routing import read_connection
+from purger import get_purge_status, request_group_deletion, start_background_purger
 
 load_dotenv()
 st.set_page_config(page_title="설문지 관리", layout="wide")
@@ -17,6 +23,10 @@ db_name = os.getenv("DB_NAME")
 db_uri = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
 
 conn = st.connection("postgres", type="sql", url=db_uri)
+trace_page("manage", conn)
+start_invalidation_listener(db_uri)
+# 삭제된 설문 그룹의 응답/발송 데이터는 백그라운드에서 조금씩 지웁니다.
+start_background_purger(db_uri)
 
 if "confirming_delete" not in st.session_state:
     st.session_state.confirming_delete = None
@@ -30,19 +40,17 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def get_surveys():
+@cached_query("surveys")
+def load_surveys(search, after):
+    with read_connection(conn).session as s:
+        return list_survey_groups(s, search=search, after=after, limit=LIST_PAGE_SIZE)
+
+def get_surveys(search, after):
     try:
-        query = """
-            SELECT DISTINCT ON (s.survey_group_id)
-                s.survey_id, s.survey_group_id, s.survey_title, s.survey_content, s.version, s.page, s.created_at
-            FROM surveys s
-            ORDER BY s.survey_group_id, s.version DESC;
-        """
-        df = conn.query(sql=query, ttl=0)
-        return df
+        return load_surveys(search, after)
     except Exception as e:
         st.error(f"설문 목록을 불러오는 중 오류가 발생했습니다: {e}")
-        return pd.DataFrame()
+        return pd.DataFrame(), None
 
 @st.dialog("설문 미리보기", width="large")
 def show_preview_dialog(sid, is_paginated):
@@ -56,7 +64,10 @@ def show_preview_dialog(sid, is_paginated):
 
     try:
         s_info_q = text("SELECT * FROM surveys WHERE survey_id = :id")
-        i_info_q = text("SELECT * FROM survey_items WHERE survey_id = :id ORDER BY item_id ASC")
+        i_info_q = text("""
+            SELECT si.* FROM survey_version_items svi JOIN survey_items si ON si.item_id = svi.item_id
+            WHERE svi.survey_id = :id ORDER BY svi.position ASC
+        """)
         
         with conn.session as s:
             s_info = s.execute(s_info_q, {"id": sid}).mappings().fetchone()
@@ -117,7 +128,8 @@ st.markdown("""
 """, unsafe_allow_html=True)
 st.markdown("---")
 
-survey_df = get_surveys()
+search = st.text_input("설문 검색", placeholder="제목 또는 내용으로 검색", label_visibility="collapsed").strip()
+survey_df, next_cursor = get_surveys(search, current_cursor("manage", search))
 
 if not survey_df.empty:
     with st.container(border=True):
@@ -161,10 +173,11 @@ if not survey_df.empty:
                 if st.button("✔️ 예, 삭제합니다", key=f"confirm_delete_{survey_group_id}", type="primary", use_container_width=True):
                     try:
                         with conn.session as s:
-                            # survey_id 대신 survey_group_id로 모든 관련 버전을 삭제합니다.
-                            s.execute(text('DELETE FROM surveys WHERE survey_group_id = :gid;'), params={'gid': survey_group_id})
+                            # 목록에서는 바로 숨기고, 모든 버전과 응답 데이터는 정리 작업이 배치로 나눠 삭제합니다.
+                            request_group_deletion(s, survey_group_id)
                             s.commit()
-                        st.success(f"설문 그룹 (ID: {survey_group_id})이(가) 성공적으로 삭제되었습니다.")
+                        invalidate("surveys", group_id=survey_group_id)
+                        st.success(f"설문 그룹 (ID: {survey_group_id})이(가) 삭제되었습니다. 관련 데이터는 백그라운드에서 정리됩니다.")
                         st.session_state.confirming_delete = None
                         st.rerun()
                     except Exception as e:
@@ -174,5 +187,21 @@ if not survey_df.empty:
                 if st.button("✖️ 아니요", key=f"cancel_delete_{survey_group_id}", use_container_width=True):
                     st.session_state.confirming_delete = None
     
+    render_pager("manage", next_cursor)
+elif is_past_first_page("manage"):
+    st.info("이 페이지에 표시할 설문지가 없습니다. 이전 페이지로 돌아가주세요.")
+    render_pager("manage", None)
+elif search:
+    st.info(f"'{search}'에 해당하는 설문지가 없습니다.")
 else:
-    st.info("현재 등록된 설문지가 없습니다. 새 설문지를 만들어주세요.")
\ No newline at end of file
+    st.info("현재 등록된 설문지가 없습니다. 새 설문지를 만들어주세요.")
+
+with conn.session as s:
+    purge_jobs = get_purge_status(s)
+if purge_jobs:
+    with st.expander(f"삭제 정리 작업 ({sum(job['finished_at'] is None for job in purge_jobs)}건 진행 중)"):
+        for job in purge_jobs:
+            status = "완료" if job['finished_at'] else f"진행 중 ({job['phase']})"
+            st.write(f"**{job['survey_title']}** — {status}, 삭제한 행 {job['deleted_rows']:,}개")
+            if job['last_error']:
+                st.caption(f"마지막 오류: {job['last_error']}")
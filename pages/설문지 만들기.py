@@ -1,11 +1,13 @@
 import streamlit as st
-from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
-from openai import AzureOpenAI
-import json
-import openai
 import os
 from dotenv import load_dotenv
+from tracing import trace_page
+from clients import get_openai_client
+from survey_store import save_survey_version
+from survey_draft import stream_survey_draft
+from llm_gateway import ContentFilterError, LLMGatewayError, LLMTimeoutError
+from draft_cache import find_cached_draft, get_cache_hit_rate, mark_cached_draft_used, store_draft
 
 load_dotenv()
 st.set_page_config(page_title="설문 생성 AI", layout="wide")
@@ -19,17 +21,14 @@ db_name = os.getenv("DB_NAME")
 db_uri = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
 
 conn = st.connection("postgres", type="sql", url=db_uri)
+trace_page("create", conn)
 
-openai_endpoint = os.getenv("AZURE_ENDPOINT")
-openai_api_key = os.getenv("OPENAI_API_KEY")
-openai_api_version = os.getenv("OPENAI_API_VERSION")
 openai_deployment = os.getenv("GPT_DEPLOYMENT_NAME")
 
-client = AzureOpenAI(
-        api_version=openai_api_version,
-        azure_endpoint=openai_endpoint,
-        api_key=openai_api_key,
-)
+client = get_openai_client()
+
+# 프롬프트를 바꾸면 버전을 올려 이전 프롬프트로 만든 캐시 초안이 재사용되지 않도록 합니다.
+DRAFT_PROMPT_VERSION = "v1"
 
 system_message = {
     "role": "system",
@@ -107,6 +106,11 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
+@st.cache_data(ttl=60)
+def get_draft_cache_hit_rate():
+    try: return get_cache_hit_rate(conn, DRAFT_PROMPT_VERSION)
+    except SQLAlchemyError: return 0, None
+
 def initialize_state():
     if "questions" not in st.session_state:
         st.session_state.questions = []
@@ -122,6 +126,10 @@ def initialize_state():
         st.session_state.generating = False
     if "saving" not in st.session_state:
         st.session_state.saving = False
+    if "generation_notice" not in st.session_state:
+        st.session_state.generation_notice = None
+    if "cached_draft" not in st.session_state:
+        st.session_state.cached_draft = None
 
 initialize_state()
 
@@ -138,6 +146,20 @@ def go_to_prev_page():
     if st.session_state.current_page > 0:
         st.session_state.current_page -= 1
 
+def render_draft_progress(editor_placeholder, preview_placeholder, draft):
+    with editor_placeholder.container(border=True):
+        st.markdown(f"**{draft['survey_title'] or '제목 생성 중...'}**")
+        for i, q in enumerate(draft["questions"]):
+            st.caption(f"문항 {i+1}. {q['title']} ({q['type']})")
+    with preview_placeholder.container(border=True):
+        st.markdown(f"<h3 style='text-align: center;'>{draft['survey_title']}</h3>", unsafe_allow_html=True)
+        st.markdown(f"<p style='text-align: center;'>{draft['survey_desc']}</p>", unsafe_allow_html=True)
+        st.markdown("---")
+        for i, q in enumerate(draft["questions"]):
+            st.markdown(f"**Q{i + 1}. {q['title']}**")
+            for opt in q["options"]: st.markdown(f"- {opt}")
+            st.markdown("---")
+
 st.markdown("""
 <div style='background:linear-gradient(90deg,#5359ff 0,#6a82fb 100%);padding:24px 0 12px 0;text-align:center;color:white;border-radius:8px;'>
     <h1 style='margin-bottom:0;'>설문 생성 AI</h1>
@@ -157,31 +179,69 @@ with edit_col:
             if not survey_topic.strip():
                 st.warning("설문 주제를 입력해 주세요.")
             else:
+                try: cached_draft = find_cached_draft(conn, survey_topic, DRAFT_PROMPT_VERSION)
+                except SQLAlchemyError: cached_draft = None
+                if cached_draft: st.session_state.cached_draft = cached_draft
+                else: st.session_state.generating = True
+                st.rerun()
+
+        lookups, hit_rate = get_draft_cache_hit_rate()
+        if lookups: st.caption(f"초안 캐시 적중률: {hit_rate:.0%} (조회 {lookups}회)")
+
+        if st.session_state.cached_draft and not is_busy:
+            cached_draft = st.session_state.cached_draft
+            st.info(f"'{cached_draft['topic']}' 주제로 이전에 생성된 초안이 있습니다. (유사도 {cached_draft['similarity']:.0%})")
+            use_col, regen_col = st.columns(2)
+            if use_col.button("이 초안 사용", use_container_width=True):
+                st.session_state.survey_title = cached_draft["draft"]["survey_title"]
+                st.session_state.survey_desc = cached_draft["draft"]["survey_desc"]
+                st.session_state.questions = cached_draft["draft"]["questions"]
+                st.session_state.current_page = 0
+                st.session_state.cached_draft = None
+                mark_cached_draft_used(conn, cached_draft["cache_id"], DRAFT_PROMPT_VERSION)
+                st.rerun()
+            if regen_col.button("🔄 새로 생성", use_container_width=True):
+                st.session_state.cached_draft = None
                 st.session_state.generating = True
                 st.rerun()
 
+        if st.session_state.generation_notice:
+            level, message = st.session_state.generation_notice
+            getattr(st, level)(message)
+            st.session_state.generation_notice = None
+
         if st.session_state.generating:
             with st.spinner("AI가 설문 초안을 생성 중입니다... 잠시만 기다려주세요."):
+                draft = {"survey_title": "", "survey_desc": "", "questions": []}
+                editor_progress = st.empty()
+                preview_progress = preview_col.empty()
                 try:
                     prompt_messages = [system_message, create_user_prompt(survey_topic)]
-                    response = client.chat.completions.create(
-                        model=openai_deployment,
-                        temperature=0.9, max_tokens=500, messages=prompt_messages
-                    )
-                    if response.choices:
-                        choice = response.choices[0]
-                        if choice.finish_reason == "content_filter":
-                            st.error("🚨 AI가 생성한 답변이 콘텐츠 정책에 위배되어 차단되었습니다.")
-                        elif choice.message.content is None:
-                            st.error("AI가 답변을 생성하지 못했습니다.")
+                    is_complete = False
+                    for key, value in stream_survey_draft(client, openai_deployment, prompt_messages, temperature=0.9, max_tokens=500):
+                        if key == "question": draft["questions"].append(value)
+                        elif key in ("survey_title", "survey_desc"): draft[key] = str(value)
+                        elif key == "complete": is_complete = value
+                        render_draft_progress(editor_progress, preview_progress, draft)
+
+                    if not draft["questions"]:
+                        st.session_state.generation_notice = ("error", "AI로부터 유효한 응답을 받지 못했습니다.")
+                    else:
+                        st.session_state.survey_title = draft["survey_title"]
+                        st.session_state.survey_desc = draft["survey_desc"]
+                        st.session_state.questions = draft["questions"]
+                        st.session_state.current_page = 0
+                        if not is_complete:
+                            st.session_state.generation_notice = ("warning", f"AI 응답이 중간에 끊겨 완성된 {len(draft['questions'])}개 문항만 불러왔습니다.")
                         else:
-                            survey_data = json.loads(choice.message.content)
-                            st.session_state.survey_title = survey_data['survey_title']
-                            st.session_state.survey_desc = survey_data['survey_desc']
-                            st.session_state.questions = survey_data['questions']
-                            st.session_state.current_page = 0
-                    else: st.error("AI로부터 유효한 응답을 받지 못했습니다.")
-                except Exception as e: st.error(f"알 수 없는 오류가 발생했습니다: {e}")
+                            try: store_draft(conn, survey_topic, DRAFT_PROMPT_VERSION, draft)
+                            except SQLAlchemyError as e: st.session_state.generation_notice = ("warning", f"생성된 초안을 캐시에 저장하지 못했습니다: {e}")
+                except ContentFilterError as e:
+                    if e.source == "prompt": st.session_state.generation_notice = ("error", "🚨 입력하신 주제가 콘텐츠 정책에 위배되어 초안을 생성할 수 없습니다.")
+                    else: st.session_state.generation_notice = ("error", "🚨 AI가 생성한 답변이 콘텐츠 정책에 위배되어 차단되었습니다.")
+                except LLMTimeoutError: st.session_state.generation_notice = ("error", "AI 응답이 지연되어 초안 생성을 중단했습니다. 잠시 후 다시 시도해주세요.")
+                except LLMGatewayError as e: st.session_state.generation_notice = ("error", str(e))
+                except Exception as e: st.session_state.generation_notice = ("error", f"알 수 없는 오류가 발생했습니다: {e}")
                 finally:
                     st.session_state.generating = False
                     st.rerun()
@@ -271,24 +331,12 @@ if st.session_state.questions:
 if st.session_state.saving:
     with st.spinner("설문지를 저장 중입니다..."):
         try:
-            with conn.session as s:
-                next_id_q = text("SELECT nextval('surveys_survey_id_seq')")
-                new_survey_id = s.execute(next_id_q).scalar_one()
-                insert_survey_q = text("""
-                    INSERT INTO surveys (survey_id, survey_group_id, survey_title, survey_content, page, version)
-                    VALUES (:id, :gid, :title, :content, :page, 1);
-                """)
-                s.execute(insert_survey_q, params=dict(id=new_survey_id, gid=new_survey_id, title=st.session_state.survey_title, content=st.session_state.survey_desc, page=st.session_state.is_paginated))
-                for q_item in st.session_state.questions:
-                    item_result = s.execute(
-                        text('INSERT INTO survey_items (survey_id, item_title, item_type) VALUES (:sid, :title, :type) RETURNING item_id;'),
-                        params=dict(sid=new_survey_id, title=q_item['title'], type=q_item['type'])
-                    )
-                    item_id = item_result.scalar_one()
-                    if q_item['type'] in ["라디오버튼", "체크박스"]:
-                        for option_content in q_item['options']:
-                            s.execute(text('INSERT INTO item_options (item_id, option_content) VALUES (:iid, :content);'), params=dict(iid=item_id, content=option_content))
-                s.commit()
+            save_survey_version(conn, {
+                "survey_title": st.session_state.survey_title,
+                "survey_content": st.session_state.survey_desc,
+                "page": st.session_state.is_paginated,
+                "questions": st.session_state.questions,
+            })
             for key in ['survey_title', 'survey_desc', 'questions', 'is_paginated', 'current_page', 'saving']:
                 if key in st.session_state: del st.session_state[key]
             st.switch_page("pages/설문지 관리.py")
@@ -7,6 +7,12 @@ from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 import os
 from dotenv import load_dotenv
+from tracing import trace_page
+from query_cache import cached_query, invalidate, start_invalidation_listener
+from db_routing import read_connection
+from send_store import count_non_responders, count_sends, create_reminder_send, list_completed_users, list_sends
+from survey_store import list_survey_groups
+from paging import LIST_PAGE_SIZE, current_cursor, is_past_first_page, render_pager
 
 load_dotenv()
 st.set_page_config(page_title="설문지 보내기", layout="wide")
@@ -19,7 +25,11 @@ db_name = os.getenv("DB_NAME")
 
 db_uri = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
 
+SURVEY_BASE_URL = "https://user25-webbapp.azurewebsites.net//Survey_Response"
+
 conn = st.connection("postgres", type="sql", url=db_uri)
+trace_page("send", conn)
+start_invalidation_listener(db_uri)
 
 st.markdown("""
 <style>
@@ -40,37 +50,68 @@ if not st.session_state.get("dialog_just_opened"):
 st.session_state.dialog_just_opened = False
 
 
-def get_surveys_from_db():
-    query = """
-        SELECT DISTINCT ON (s.survey_group_id)
-            s.survey_id, s.survey_group_id, s.survey_title, s.survey_content, s.version
-        FROM surveys s
-        ORDER BY s.survey_group_id, s.version DESC;
-    """
-    return conn.query(query, ttl=0)
+@cached_query("surveys")
+def get_surveys_from_db(search, after):
+    with read_connection(conn).session as s:
+        return list_survey_groups(s, search=search, after=after, limit=LIST_PAGE_SIZE)
+
+@cached_query("survey_sends", "surveys")
+def get_send_counts(survey_group_ids):
+    with read_connection(conn).session as s:
+        return count_sends(s, list(survey_group_ids))
 
+@cached_query("survey_sends:group:{survey_group_id}", "surveys:group:{survey_group_id}")
 def get_sends_from_db(survey_group_id):
-    query = """
-        SELECT s.*, sv.version FROM survey_sends s
-        JOIN surveys sv ON s.survey_id = sv.survey_id
-        WHERE sv.survey_group_id = :gid ORDER BY s.scheduled_at DESC;
-    """
-    return conn.query(sql=query, params={"gid": survey_group_id}, ttl=0)
-
-def get_completed_users(_conn, send_id):
-    query = """
-        SELECT email, completed_at
-        FROM survey_results
-        WHERE send_id = :send_id AND status = 'completed';
-    """
-    try:
-        uuid_obj = uuid.UUID(str(send_id))
-        df = _conn.query(sql=query,params={"send_id": uuid_obj}, ttl=0)
-        if not df.empty:
-            df = df.rename(columns={"email": "이메일"})
-        return df
-    except (ValueError, TypeError):
-        return pd.DataFrame()
+    with read_connection(conn).session as s:
+        return list_sends(s, survey_group_id)
+
+@cached_query("survey_results:group:{survey_group_id}")
+def get_completed_users(_conn, send_id, survey_group_id):
+    with _conn.session as s:
+        df = list_completed_users(s, send_id)
+    if not df.empty:
+        df = df.rename(columns={"email": "이메일"})
+    return df
+
+def render_reminder_form(survey_group_id, send_history_df):
+    """이미 발송된 건(들)의 미응답자에게 리마인드 발송을 예약합니다. 대상자 계산과 발송 생성은 모두 DB 안에서 합니다."""
+    sent_df = send_history_df[(send_history_df['status'] != '예약 취소') & (pd.to_datetime(send_history_df['scheduled_at']) < datetime.now())]
+    if sent_df.empty:
+        return
+    with st.expander("🔔 미응답자에게 다시 보내기"):
+        labels = {row.send_id: f"v{row.version} · {pd.to_datetime(row.scheduled_at):%Y-%m-%d %H:%M} 발송" for row in sent_df.itertuples()}
+        chosen = st.multiselect("대상 발송 (여러 건을 고르면 어느 발송으로도 응답하지 않은 사람에게 보냅니다)", list(labels), format_func=labels.get, key=f"remind_sends_{survey_group_id}")
+        if not chosen:
+            return
+        with read_connection(conn).session as s:
+            pending = count_non_responders(s, chosen)
+        st.caption(f"미응답자 {pending}명")
+
+        default_dt = datetime.now() + timedelta(minutes=10)
+        remind_cols = st.columns([1, 1, 1])
+        with remind_cols[0]: d = st.date_input("발송 날짜", value=default_dt.date(), key=f"remind_date_{survey_group_id}")
+        with remind_cols[1]: t = st.time_input("발송 시간", value=default_dt.time(), key=f"remind_time_{survey_group_id}")
+        scheduled_dt = datetime.combine(d, t)
+        with remind_cols[2]:
+            if st.button("리마인드 예약", key=f"remind_{survey_group_id}", use_container_width=True, type="primary", disabled=pending == 0):
+                if scheduled_dt < datetime.now():
+                    st.error("발송 시간은 현재 시간보다 미래여야 합니다.")
+                    return
+                # 가장 최근에 보낸 발송의 설문 버전으로 다시 보냅니다.
+                target_survey_id = int(sent_df[sent_df['send_id'].isin(chosen)].iloc[0]['survey_id'])
+                try:
+                    with conn.session as s:
+                        created = create_reminder_send(s, target_survey_id, chosen, scheduled_dt, f"{SURVEY_BASE_URL}?survey_id={target_survey_id}")
+                        s.commit()
+                except SQLAlchemyError as e:
+                    st.error(f"DB 작업 중 오류 발생: {e}")
+                    return
+                if created is None:
+                    st.info("응답하지 않은 대상자가 없습니다.")
+                    return
+                invalidate("survey_sends", survey_id=target_survey_id, group_id=survey_group_id)
+                st.toast(f"미응답자 {created[1]}명에게 리마인드 발송을 예약했습니다.")
+                st.rerun()
 
 @st.dialog("설문 보내기/수정", width="large")
 def show_send_edit_dialog():
@@ -151,7 +192,7 @@ def show_send_edit_dialog():
                         else:
                             send_id = uuid.uuid4()
 
-                        base_url = f"https://user25-webbapp.azurewebsites.net//Survey_Response?survey_id={survey_id}"
+                        base_url = f"{SURVEY_BASE_URL}?survey_id={survey_id}"
                         recipients_df["설문 URL"] = recipients_df["이메일"].apply(
                             lambda x: f"{base_url}&email={urllib.parse.quote(str(x))}&send_id={send_id}"
                         )
@@ -168,6 +209,7 @@ def show_send_edit_dialog():
                             st.success("새로운 설문 발송이 예약되었습니다.")
                         
                         s.commit()
+                    invalidate("survey_sends", survey_id=survey_id, group_id=dialog_info.get('survey_group_id'))
                     st.session_state.active_dialog = None
                     st.session_state.show_status_survey_id = dialog_info.get('survey_group_id', survey_id)
                     if dialog_state_key in st.session_state: del st.session_state[dialog_state_key]
@@ -193,41 +235,45 @@ st.markdown("")
 if st.session_state.active_dialog:
     show_send_edit_dialog()
 
-survey_df = get_surveys_from_db()
+search = st.text_input("설문 검색", placeholder="제목 또는 내용으로 검색", label_visibility="collapsed").strip()
+survey_df, next_cursor = get_surveys_from_db(search, current_cursor("send", search))
+send_counts = get_send_counts(tuple(int(gid) for gid in survey_df["survey_group_id"])) if not survey_df.empty else {}
 
 if not survey_df.empty:
     for _, survey in survey_df.iterrows():
         survey_group_id = survey["survey_group_id"]
         latest_survey_id = survey["survey_id"]
         
-        send_history_df = get_sends_from_db(survey_group_id)
+        send_count = send_counts.get(int(survey_group_id), 0)
         with st.container(border=True):
             col1, col2, col3, col4 = st.columns([4, 2, 1.5, 1.5])
             with col1:
                 st.markdown(f"**{survey['survey_title']}** (최신 v{survey['version']})")
                 st.caption(survey.get("survey_content", ""))
             with col2:
-                st.metric(label="총 발송 횟수", value=f"{len(send_history_df)} 회")
+                st.metric(label="총 발송 횟수", value=f"{send_count} 회")
             with col3:
                 if st.button("새로 보내기", key=f"send_{survey_group_id}", use_container_width=True):
                     st.session_state.active_dialog = {"mode": "new", "survey_id": latest_survey_id, "survey_group_id": survey_group_id, "key": f"new_{survey_group_id}"}
                     st.session_state.dialog_just_opened = True
                     st.rerun()
             with col4:
-                if st.button("발송 현황 보기", key=f"status_{survey_group_id}", use_container_width=True, disabled=send_history_df.empty):
+                if st.button("발송 현황 보기", key=f"status_{survey_group_id}", use_container_width=True, disabled=send_count == 0):
                     st.session_state.show_status_survey_id = None if st.session_state.show_status_survey_id == survey_group_id else survey_group_id
                     st.rerun()
 
         if st.session_state.show_status_survey_id == survey_group_id:
             st.write("---")
             st.subheader(f"'{survey['survey_title']}' 발송 기록")
+            # 발송 기록은 펼친 설문 하나에 대해서만 읽습니다.
+            send_history_df = get_sends_from_db(survey_group_id)
             for _, send_item in send_history_df.iterrows():
                 with st.container(border=True):
                     send_id = send_item['send_id']
                     scheduled_time = pd.to_datetime(send_item['scheduled_at'])
                     recipients_df = pd.DataFrame(send_item.get('recipients', []))
                     total = len(recipients_df)
-                    completed_users_df = get_completed_users(conn, send_id)
+                    completed_users_df = get_completed_users(read_connection(conn), send_id, survey_group_id)
                     completed_emails = completed_users_df['이메일'].tolist() if not completed_users_df.empty else []
                     responded = recipients_df['이메일'].isin(completed_emails).sum() if not recipients_df.empty else 0
                     current_status = send_item.get("status", "N/A")
@@ -251,6 +297,7 @@ if not survey_df.empty:
                                 with conn.session as s:
                                     s.execute(text("UPDATE survey_sends SET status = '예약 취소' WHERE send_id = :id;"), params={"id": send_id})
                                     s.commit()
+                                invalidate("survey_sends", group_id=survey_group_id)
                                 st.success("발송 예약을 취소했습니다.")
                                 st.rerun()
                             except Exception as e:
@@ -267,6 +314,13 @@ if not survey_df.empty:
                             display_df['응답 여부'] = display_df['completed_at'].apply(lambda x: '완료' if pd.notna(x) else '미완료')
                             display_df['응답 시간'] = pd.to_datetime(display_df['completed_at']).dt.strftime('%Y-%m-%d %H:%M').fillna('')
                             st.dataframe(display_df[['이메일', '설문 URL', '응답 여부', '응답 시간']], hide_index=True, use_container_width=True)
+            render_reminder_form(survey_group_id, send_history_df)
             st.write("")
+    render_pager("send", next_cursor)
+elif is_past_first_page("send"):
+    st.info("이 페이지에 표시할 설문지가 없습니다. 이전 페이지로 돌아가주세요.")
+    render_pager("send", None)
+elif search:
+    st.info(f"'{search}'에 해당하는 설문지가 없습니다.")
 else:
     st.info("먼저 '설문지 만들기'에서 설문을 생성해주세요.")
\ No newline at end of file
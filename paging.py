@@ -0,0 +1,36 @@
+import os
+import streamlit as st
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", "20"))
+
+
+def current_cursor(key, search):
+    """목록 key의 현재 페이지 커서를 반환합니다. 검색어가 바뀌면 첫 페이지로 돌아갑니다."""
+    state = st.session_state.setdefault(f"{key}_paging", {"search": search, "cursors": [None]})
+    if state["search"] != search:
+        state.update(search=search, cursors=[None])
+    return state["cursors"][-1]
+
+
+def is_past_first_page(key):
+    """첫 페이지가 아니면 True입니다. 삭제 등으로 지금 페이지가 비었을 때도 이전 버튼을 그려야 하는지 판단합니다."""
+    return len(st.session_state[f"{key}_paging"]["cursors"]) > 1
+
+
+def render_pager(key, next_cursor):
+    """이전/다음 버튼을 그립니다. 지나온 페이지의 커서를 쌓아 두고 이전 버튼에서 하나씩 꺼냅니다."""
+    state = st.session_state[f"{key}_paging"]
+    prev_col, info_col, next_col = st.columns([1, 4, 1])
+    with prev_col:
+        if st.button("◀ 이전", key=f"{key}_prev", use_container_width=True, disabled=len(state["cursors"]) == 1):
+            state["cursors"].pop()
+            st.rerun()
+    with info_col:
+        st.caption(f"{len(state['cursors'])} 페이지")
+    with next_col:
+        if st.button("다음 ▶", key=f"{key}_next", use_container_width=True, disabled=next_cursor is None):
+            state["cursors"].append(next_cursor)
+            st.rerun()
@@ -0,0 +1,196 @@
+import logging
+import os
+import threading
+import time
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from sqlalchemy.orm import Session
+from archive import remove_archive_files
+
+load_dotenv()
+
+db_user = os.getenv("DB_USER")
+db_password = os.getenv("DB_PASSWORD")
+db_host = os.getenv("DB_HOST")
+db_port = os.getenv("DB_PORT")
+db_name = os.getenv("DB_NAME")
+
+db_uri = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
+
+# 한 배치에서 지우는 응답자 수. 응답자 한 명의 응답/감성 행은 CASCADE로 함께 지워집니다.
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "500"))
+# 배치 사이 대기 시간. 응답 제출 같은 실시간 쓰기에 I/O와 WAL 여유를 남겨 둡니다.
+PURGE_SLEEP_SECONDS = float(os.getenv("PURGE_SLEEP_SECONDS", "0.2"))
+# 다른 트랜잭션이 잡은 락을 오래 기다리지 않고 이번 배치를 포기한 뒤 나중에 다시 시도합니다.
+PURGE_LOCK_TIMEOUT = os.getenv("PURGE_LOCK_TIMEOUT", "2s")
+PURGE_IDLE_SECONDS = float(os.getenv("PURGE_IDLE_SECONDS", "30"))
+
+logger = logging.getLogger("survey.purger")
+
+MARK_GROUP_DELETED = text("""
+    UPDATE survey_groups SET deleted_at = CURRENT_TIMESTAMP
+    WHERE survey_group_id = :gid AND deleted_at IS NULL
+    RETURNING survey_title;
+""")
+
+ENQUEUE_PURGE = text("""
+    INSERT INTO survey_purge_jobs (survey_group_id, survey_title) VALUES (:gid, :title)
+    ON CONFLICT (survey_group_id) DO NOTHING;
+""")
+
+# survey_groups 변경은 알림 트리거가 없으므로 목록 캐시를 비우도록 직접 알립니다. (커밋 시점에 전달)
+NOTIFY_GROUP_DELETED = text("""
+    SELECT pg_notify('survey_cache', json_build_object('table', 'surveys', 'group_id', CAST(:gid AS integer))::text);
+""")
+
+CLAIM_JOB = text("""
+    SELECT survey_group_id, phase FROM survey_purge_jobs
+    WHERE finished_at IS NULL
+    ORDER BY requested_at
+    FOR UPDATE SKIP LOCKED
+    LIMIT 1;
+""")
+
+# 의존 관계 순서대로 지웁니다: 응답자(→응답, 감성) → 발송 → 문항(→옵션) → 설문 버전(→문항 구성, 최신 포인터)
+PURGE_RESULTS = text("""
+    DELETE FROM survey_results WHERE result_id IN (
+        SELECT sr.result_id FROM survey_results sr JOIN surveys s ON s.survey_id = sr.survey_id
+        WHERE s.survey_group_id = :gid LIMIT :batch
+    );
+""")
+
+PURGE_SENDS = text("""
+    DELETE FROM survey_sends WHERE send_id IN (
+        SELECT ss.send_id FROM survey_sends ss JOIN surveys s ON s.survey_id = ss.survey_id
+        WHERE s.survey_group_id = :gid LIMIT :batch
+    );
+""")
+
+# 문항은 처음 저장한 버전이 지워져도 남으므로(ON DELETE SET NULL) 그룹의 버전만 쓰는 문항을 직접 지웁니다.
+PURGE_ITEMS = text("""
+    DELETE FROM survey_items WHERE item_id IN (
+        SELECT DISTINCT svi.item_id FROM survey_version_items svi JOIN surveys s ON s.survey_id = svi.survey_id
+        WHERE s.survey_group_id = :gid
+          AND NOT EXISTS (
+              SELECT 1 FROM survey_version_items o JOIN surveys os ON os.survey_id = o.survey_id
+              WHERE o.item_id = svi.item_id AND os.survey_group_id <> :gid
+          )
+        LIMIT :batch
+    );
+""")
+
+PURGE_SURVEYS = text("DELETE FROM surveys WHERE survey_group_id = :gid;")
+
+ARCHIVE_PATHS = text("""
+    SELECT a.path FROM survey_archives a JOIN surveys s ON s.survey_id = a.survey_id WHERE s.survey_group_id = :gid;
+""")
+
+PHASES = (("results", PURGE_RESULTS), ("sends", PURGE_SENDS), ("items", PURGE_ITEMS), ("surveys", PURGE_SURVEYS))
+
+UPDATE_PROGRESS = text("""
+    UPDATE survey_purge_jobs
+    SET phase = :phase, deleted_rows = deleted_rows + :deleted, started_at = COALESCE(started_at, CURRENT_TIMESTAMP),
+        finished_at = CASE WHEN :done THEN CURRENT_TIMESTAMP END, last_error = NULL
+    WHERE survey_group_id = :gid;
+""")
+
+RECORD_ERROR = text("UPDATE survey_purge_jobs SET last_error = :error WHERE survey_group_id = :gid;")
+
+PURGE_STATUS = text("""
+    SELECT survey_group_id, survey_title, phase, deleted_rows, requested_at, started_at, finished_at, last_error
+    FROM survey_purge_jobs
+    WHERE finished_at IS NULL OR finished_at > CURRENT_TIMESTAMP - interval '1 day'
+    ORDER BY requested_at DESC;
+""")
+
+
+def request_group_deletion(s, survey_group_id):
+    """설문 그룹을 즉시 목록에서 숨기고 정리 작업을 예약합니다. 커밋은 호출하는 쪽에서 합니다."""
+    title = s.execute(MARK_GROUP_DELETED, {"gid": survey_group_id}).scalar_one_or_none()
+    if title is None:
+        return False
+    s.execute(ENQUEUE_PURGE, {"gid": survey_group_id, "title": title})
+    s.execute(NOTIFY_GROUP_DELETED, {"gid": survey_group_id})
+    return True
+
+
+def purge_one_batch(engine, batch_size=PURGE_BATCH_SIZE):
+    """대기 중인 작업 하나를 골라 한 배치만 지우고 (survey_group_id, 지운 행 수)를 반환합니다. 작업이 없으면 None입니다.
+
+    작업 행을 FOR UPDATE SKIP LOCKED로 잡으므로 여러 프로세스가 동시에 돌아도 같은 작업을 중복 처리하지 않습니다.
+    """
+    with Session(engine) as s:
+        s.execute(text(f"SET LOCAL lock_timeout = '{PURGE_LOCK_TIMEOUT}';"))
+        job = s.execute(CLAIM_JOB).one_or_none()
+        if job is None:
+            return None
+        survey_group_id, phase = job
+        names = [name for name, _ in PHASES]
+        start = names.index(phase) if phase in names else 0
+        try:
+            # 보관 기록은 설문 버전과 함께 CASCADE로 지워지므로 Parquet 파일 경로를 먼저 받아 둡니다.
+            archive_paths = s.execute(ARCHIVE_PATHS, {"gid": survey_group_id}).scalars().all()
+            for name, statement in PHASES[start:]:
+                deleted = s.execute(statement, {"gid": survey_group_id, "batch": batch_size}).rowcount
+                # 이번 배치가 꽉 찼으면 같은 단계가 더 남았을 수 있으므로 다음 배치로 넘깁니다.
+                if deleted >= batch_size and name != "surveys":
+                    s.execute(UPDATE_PROGRESS, {"gid": survey_group_id, "phase": name, "deleted": deleted, "done": False})
+                    s.commit()
+                    return survey_group_id, deleted
+                if deleted:
+                    s.execute(UPDATE_PROGRESS, {"gid": survey_group_id, "phase": name, "deleted": deleted, "done": False})
+            s.execute(UPDATE_PROGRESS, {"gid": survey_group_id, "phase": "done", "deleted": 0, "done": True})
+            s.commit()
+            remove_archive_files(archive_paths)
+            return survey_group_id, 0
+        except OperationalError as e:
+            s.rollback()
+            with Session(engine) as err_s:
+                err_s.execute(RECORD_ERROR, {"gid": survey_group_id, "error": str(e.orig)[:500]})
+                err_s.commit()
+            raise
+
+
+def run_purger(engine, stop_when_idle=False):
+    """정리 작업이 남아 있는 동안 배치를 반복합니다. 락 대기 시간 초과 등은 잠시 쉬었다가 다시 시도합니다."""
+    backoff = PURGE_SLEEP_SECONDS
+    while True:
+        try:
+            progressed = purge_one_batch(engine)
+            backoff = PURGE_SLEEP_SECONDS
+        except SQLAlchemyError as e:
+            logger.warning("purge batch failed, retrying: %s", e)
+            backoff = min(max(backoff * 2, 1), 60)
+            time.sleep(backoff)
+            continue
+        if progressed is None:
+            if stop_when_idle:
+                return
+            time.sleep(PURGE_IDLE_SECONDS)
+            continue
+        time.sleep(PURGE_SLEEP_SECONDS)
+
+
+def get_purge_status(s):
+    """진행 중이거나 최근 하루 안에 끝난 정리 작업 목록을 반환합니다."""
+    return s.execute(PURGE_STATUS).mappings().all()
+
+
+_purger_thread = None
+_purger_lock = threading.Lock()
+
+
+def start_background_purger(dsn):
+    """프로세스마다 한 번만 정리 스레드를 시작합니다."""
+    global _purger_thread
+    with _purger_lock:
+        if _purger_thread is None:
+            _purger_thread = threading.Thread(target=run_purger, args=(create_engine(dsn, pool_size=1, max_overflow=1),), name="survey-purger", daemon=True)
+            _purger_thread.start()
+        return _purger_thread
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run_purger(create_engine(db_uri), stop_when_idle=True)
@@ -0,0 +1,227 @@
+import copy
+import functools
+import inspect
+import json
+import logging
+import os
+import select
+import threading
+import time
+from collections import OrderedDict, defaultdict
+import psycopg2
+from dotenv import load_dotenv
+from db_routing import REPLICA_MAX_LAG_SECONDS, note_primary_write, replica_uri
+
+load_dotenv()
+
+# 무효화 알림을 받고 있으면 캐시를 오래 유지하고, 리스너가 끊겨 있으면 예전처럼 짧은 TTL로 동작합니다.
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "21600"))
+CACHE_FALLBACK_TTL_SECONDS = float(os.getenv("CACHE_FALLBACK_TTL_SECONDS", "10"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "512"))
+# 복제본에서 읽는 경우, 무효화 직후의 결과는 복제 지연 때문에 변경 전 값일 수 있어 이 시간 동안은 저장하지 않습니다.
+CACHE_SETTLE_SECONDS = REPLICA_MAX_LAG_SECONDS if replica_uri else 0
+CHANNEL = "survey_cache"
+
+logger = logging.getLogger("survey.cache")
+
+
+def tags_for(table, survey_id=None, group_id=None):
+    """0005_cache_invalidation_notify.sql 트리거가 보내는 알림과 같은 규칙으로 무효화 태그를 만듭니다."""
+    tags = {table}
+    if survey_id is not None:
+        tags.add(f"{table}:survey:{survey_id}")
+    if group_id is not None:
+        tags.add(f"{table}:group:{group_id}")
+    return tags
+
+
+class TaggedCache:
+    """태그로 항목을 골라 지울 수 있는 프로세스 내 LRU 캐시입니다.
+
+    계산 도중에 같은 태그의 무효화가 들어오면 결과를 저장하지 않아, 변경 전 데이터가 오래 남지 않도록 합니다.
+    무효화 후 settle_seconds가 지나기 전에 계산된 결과도 저장하지 않습니다. (복제본 지연 대비)
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, settle_seconds=CACHE_SETTLE_SECONDS):
+        self.max_entries = max_entries
+        self.settle_seconds = settle_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._keys_by_tag = defaultdict(set)
+        self._invalidated_at = {}
+        self._invalidated_time = {}
+        self._cleared_at = 0
+        self._cleared_time = float("-inf")
+        self._seq = 0
+
+    def get(self, key, max_age):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry["stored_at"] > max_age:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def begin(self):
+        with self._lock:
+            return self._seq
+
+    def put(self, key, value, tags, started_seq):
+        with self._lock:
+            if self._cleared_at > started_seq or any(self._invalidated_at.get(tag, 0) > started_seq for tag in tags):
+                return
+            if self.settle_seconds and self._settling(tags):
+                return
+            self._remove(key)
+            self._entries[key] = {"value": value, "tags": tags, "stored_at": time.monotonic()}
+            for tag in tags:
+                self._keys_by_tag[tag].add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, tags):
+        with self._lock:
+            self._seq += 1
+            evicted = 0
+            for tag in tags:
+                self._invalidated_at[tag] = self._seq
+                self._invalidated_time[tag] = time.monotonic()
+                for key in list(self._keys_by_tag.pop(tag, ())):
+                    evicted += self._remove(key)
+            return evicted
+
+    def clear(self):
+        with self._lock:
+            self._seq += 1
+            self._cleared_at = self._seq
+            self._cleared_time = time.monotonic()
+            self._invalidated_at.clear()
+            self._invalidated_time.clear()
+            self._entries.clear()
+            self._keys_by_tag.clear()
+
+    def _settling(self, tags):
+        since = time.monotonic() - self.settle_seconds
+        return self._cleared_time > since or any(self._invalidated_time.get(tag, float("-inf")) > since for tag in tags)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return 0
+        for tag in entry["tags"]:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+        return 1
+
+
+cache = TaggedCache()
+
+
+class InvalidationListener(threading.Thread):
+    """survey_cache 채널을 LISTEN 하면서 알림이 오면 해당 태그의 캐시 항목을 지우는 백그라운드 스레드입니다."""
+
+    def __init__(self, dsn, target):
+        super().__init__(name="survey-cache-listener", daemon=True)
+        self.dsn = dsn
+        self.target = target
+        self.connected = threading.Event()
+
+    def run(self):
+        backoff = 1
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.autocommit = True
+                cursor = conn.cursor()
+                cursor.execute(f"LISTEN {CHANNEL};")
+                # 연결이 끊긴 동안 놓친 알림이 있을 수 있으므로 (재)연결할 때마다 전체를 비웁니다.
+                self.target.clear()
+                self.connected.set()
+                backoff = 1
+                while True:
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        cursor.execute("SELECT 1;")
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._handle(conn.notifies.pop(0).payload)
+            except (psycopg2.Error, OSError) as e:
+                logger.warning("cache invalidation listener disconnected: %s", e)
+            finally:
+                self.connected.clear()
+                if conn is not None:
+                    conn.close()
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    def _handle(self, payload):
+        try:
+            change = json.loads(payload)
+            tags = tags_for(change["table"], change.get("survey_id"), change.get("group_id"))
+        except (ValueError, KeyError, TypeError):
+            logger.warning("ignored malformed cache notification: %r", payload)
+            return
+        self.target.invalidate(tags)
+
+
+_listeners = {}
+_listeners_lock = threading.Lock()
+
+
+def start_invalidation_listener(dsn):
+    """프로세스마다 한 번만 리스너를 시작합니다. 페이지가 다시 실행될 때 호출해도 안전합니다."""
+    with _listeners_lock:
+        if dsn not in _listeners:
+            _listeners[dsn] = InvalidationListener(dsn, cache)
+            _listeners[dsn].start()
+        return _listeners[dsn]
+
+
+def _listening():
+    return any(listener.connected.is_set() for listener in _listeners.values())
+
+
+def invalidate(table, survey_id=None, group_id=None):
+    """방금 커밋한 변경을 이 프로세스의 캐시에 바로 반영합니다. (알림보다 먼저 rerun 되는 경우 대비)
+
+    복제본이 변경을 따라잡을 때까지는 이 프로세스의 조회도 주 DB로 보냅니다.
+    """
+    note_primary_write()
+    return cache.invalidate(tags_for(table, survey_id, group_id))
+
+
+def cached_query(*tag_templates, ttl=None):
+    """st.cache_data처럼 결과를 캐시하되, 태그가 무효화되면 해당 항목만 지웁니다.
+
+    태그는 "survey_results:survey:{survey_id}"처럼 함수 인자 이름으로 채우는 형식 문자열입니다.
+    st.cache_data와 마찬가지로 밑줄로 시작하는 인자(_conn 등)는 캐시 키에서 제외되며, 결과는 복사본을 반환합니다.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key_args = {k: v for k, v in bound.arguments.items() if not k.startswith("_")}
+            key = (name, repr(sorted(key_args.items())))
+            max_age = (ttl or CACHE_TTL_SECONDS) if _listening() else min(ttl or CACHE_TTL_SECONDS, CACHE_FALLBACK_TTL_SECONDS)
+
+            entry = cache.get(key, max_age)
+            if entry is not None:
+                return copy.deepcopy(entry["value"])
+            started_seq = cache.begin()
+            value = func(*args, **kwargs)
+            cache.put(key, value, {template.format(**key_args) for template in tag_templates}, started_seq)
+            return copy.deepcopy(value)
+
+        return wrapper
+    return decorator
@@ -0,0 +1,167 @@
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from llm_gateway import chat_completion, ContentFilterError, LLMGatewayError
+
+# 프롬프트를 바꾸면 버전을 올려 이전 캐시 결과를 쓰지 않도록 합니다.
+REFINE_PROMPT_VERSION = "v1"
+BATCH_SIZE = 10
+MAX_CONCURRENCY = 4
+# 프로세스 전체(모든 사용자)가 함께 쓰는 추천 결과 캐시의 최대 항목 수. 넘으면 가장 오래 안 쓴 항목부터 버립니다.
+CACHE_MAX_ENTRIES = 1000
+
+SINGLE_SYSTEM_PROMPT = "당신은 설문조사 문항 작성에 특화된 전문 카피라이터입니다. 사용자가 입력한 질문을 응답자가 더 이해하기 쉽고, 명확하며, 중립적인 표현으로 다듬어주세요. 다른 설명 없이, 다듬어진 최종 질문 문구만 출력해야 합니다."
+
+BATCH_SYSTEM_PROMPT = """
+    당신은 설문조사 문항 작성에 특화된 전문 카피라이터입니다.
+    JSON으로 여러 문항이 주어지면, 각 문항의 질문(title)을 응답자가 더 이해하기 쉽고, 명확하며, 중립적인 표현으로 다듬어주세요.
+    문항에 options가 있으면 선택지도 같은 기준으로 다듬되, 선택지의 개수와 순서는 바꾸지 마세요.
+    출력은 반드시 {"items": [{"index": 0, "title": "...", "options": ["..."]}]} 형식의 JSON이어야 하며, 입력의 index를 그대로 유지해야 합니다.
+"""
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cache_key(title, options):
+    return (REFINE_PROMPT_VERSION, title, tuple(options) if options is not None else None)
+
+
+def _cache_get(key):
+    with _cache_lock:
+        result = _cache.get(key)
+        if result is not None:
+            _cache.move_to_end(key)
+        return result
+
+
+def _cache_put(key, result):
+    with _cache_lock:
+        _cache[key] = result
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+
+def _result(status, title, options=None, message=None):
+    return {"status": status, "title": title, "options": options, "message": message}
+
+
+def refine_question(client, model, title):
+    """문항 하나의 질문 문구를 다듬습니다. 결과는 {status, title, options, message} 형태입니다."""
+    key = _cache_key(title, None)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+    try:
+        response = chat_completion(
+            "question_refine",
+            client=client,
+            model=model,
+            messages=[
+                {"role": "system", "content": SINGLE_SYSTEM_PROMPT},
+                {"role": "user", "content": title}
+            ],
+            temperature=0.7,
+            max_tokens=200
+        )
+    except ContentFilterError as e:
+        if e.source == "prompt":
+            return _result("filtered", title, message="입력하신 문구가 콘텐츠 정책에 위배되어 AI 추천을 받을 수 없습니다.")
+        return _result("filtered", title, message="AI가 생성한 추천 문구가 콘텐츠 정책에 위배되어 차단되었습니다.")
+    except LLMGatewayError as e:
+        return _result("error", title, message=str(e))
+
+    choice = response.choices[0]
+    if choice.message.content is None:
+        return _result("error", title, message="AI가 추천 문구를 생성하지 못했습니다.")
+
+    result = _result("ok", choice.message.content.strip())
+    _cache_put(key, result)
+    return result
+
+
+def _refine_chunk(client, model, chunk):
+    payload = {"items": [
+        {"index": index, "title": title, **({"options": options} if options is not None else {})}
+        for index, title, options in chunk
+    ]}
+    try:
+        response = chat_completion(
+            "question_refine_batch",
+            client=client,
+            model=model,
+            response_format={"type": "json_object"},
+            messages=[
+                {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+                {"role": "user", "content": json.dumps(payload, ensure_ascii=False)}
+            ],
+            temperature=0.7,
+            max_tokens=200 * len(chunk)
+        )
+        choice = response.choices[0]
+        filtered = False
+    except ContentFilterError:
+        filtered = True
+    except LLMGatewayError as e:
+        return {index: _result("error", title, options, str(e)) for index, title, options in chunk}
+
+    # 묶음 전체가 차단되면 어떤 문항 때문인지 알 수 있도록 문항별로 다시 요청합니다.
+    if filtered:
+        return {index: _refine_single_in_batch(client, model, title, options) for index, title, options in chunk}
+
+    try:
+        refined_items = {item["index"]: item for item in json.loads(choice.message.content or "{}").get("items", [])}
+    except (json.JSONDecodeError, AttributeError, TypeError, KeyError):
+        refined_items = {}
+
+    results = {}
+    for index, title, options in chunk:
+        item = refined_items.get(index)
+        if not item or not item.get("title"):
+            results[index] = _result("error", title, options, "AI가 추천 문구를 생성하지 못했습니다.")
+            continue
+        refined_options = item.get("options") if options is not None else None
+        if refined_options is not None and len(refined_options) != len(options):
+            refined_options = options
+        results[index] = _result("ok", str(item["title"]).strip(), [str(opt) for opt in refined_options] if refined_options is not None else None)
+        _cache_put(_cache_key(title, options), results[index])
+    return results
+
+
+def _refine_single_in_batch(client, model, title, options):
+    result = refine_question(client, model, title)
+    return {**result, "options": options}
+
+
+def refine_questions(client, model, questions, include_options=False):
+    """모든 문항을 한 번의 구조화된 요청으로 다듬고, 입력 순서대로 결과 목록을 반환합니다.
+
+    문항 수가 BATCH_SIZE를 넘으면 여러 요청으로 나누어 최대 MAX_CONCURRENCY개까지 동시에 보냅니다.
+    프로세스 전체의 동시 요청 수는 llm_gateway가 LLM_MAX_CONCURRENCY로 제한합니다.
+    콘텐츠 필터에 걸린 문항은 전체를 중단하지 않고 해당 문항의 status가 "filtered"로 표시됩니다.
+    """
+    results = [None] * len(questions)
+    pending = []
+    for index, q in enumerate(questions):
+        options = list(q["options"]) if include_options and q.get("options") else None
+        cached = _cache_get(_cache_key(q["title"], options))
+        if cached is not None:
+            results[index] = {**cached, "options": cached["options"] if options is not None else None}
+        else:
+            pending.append((index, q["title"], options))
+
+    chunks = [pending[i:i + BATCH_SIZE] for i in range(0, len(pending), BATCH_SIZE)]
+    if len(chunks) == 1:
+        chunk_results = [_refine_chunk(client, model, chunks[0])]
+    elif chunks:
+        with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENCY, len(chunks))) as executor:
+            chunk_results = list(executor.map(lambda chunk: _refine_chunk(client, model, chunk), chunks))
+    else:
+        chunk_results = []
+
+    for chunk_result in chunk_results:
+        for index, result in chunk_result.items():
+            results[index] = result
+    return results
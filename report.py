@@ -0,0 +1,383 @@
+"""대시보드와 같은 분석 결과를 한 파일짜리 HTML 보고서로 만들어 survey_reports에 저장합니다.
+
+보고서는 대시보드 요청이 아니라 별도 워커 프로세스에서 만듭니다. 발송이 끝난 지 REPORT_AFTER_SEND_HOURS가 지난 설문은
+자동으로 보고서 작업이 예약됩니다.
+
+    python report.py            # 작업을 기다리며 계속 실행
+    python report.py --once     # 쌓인 작업만 처리하고 종료
+"""
+import argparse
+import base64
+import gzip
+import hashlib
+import html
+import io
+import json
+import logging
+import os
+import time
+from datetime import datetime
+import pandas as pd
+import plotly.express as px
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from analytics import load_responses, load_survey_structure, option_counts, pivot_responses
+from llm_gateway import chat_completion, ContentFilterError, LLMGatewayError
+from send_store import count_targets
+from text_analysis import is_stop_answer
+
+load_dotenv()
+
+db_user = os.getenv("DB_USER")
+db_password = os.getenv("DB_PASSWORD")
+db_host = os.getenv("DB_HOST")
+db_port = os.getenv("DB_PORT")
+db_name = os.getenv("DB_NAME")
+
+db_uri = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
+
+openai_deployment = os.getenv("GPT_DEPLOYMENT_NAME")
+
+REPORT_POLL_SECONDS = float(os.getenv("REPORT_POLL_SECONDS", "10"))
+# 발송 예약 시각으로부터 이 시간이 지나면 응답이 마감된 것으로 보고 보고서를 예약합니다.
+REPORT_AFTER_SEND_HOURS = float(os.getenv("REPORT_AFTER_SEND_HOURS", "72"))
+# 이 시간보다 오래 running인 작업은 워커가 도중에 죽은 것으로 보고 다시 가져갑니다.
+REPORT_STALE_MINUTES = float(os.getenv("REPORT_STALE_MINUTES", "30"))
+# 보고서 구성이 바뀌면 올려서, 같은 데이터라도 예전 보고서를 다시 쓰지 않게 합니다.
+REPORT_VERSION = "1"
+
+WORD_CLOUD_FONT = "fonts/MALGUN.TTF"
+
+AI_SUMMARY_PROMPT = """
+    당신은 전문 시장 조사 분석가입니다. '질문', '답변', 그리고 사전 분석된 '감성'('Positive', 'Negative', 'Neutral')으로 구성된 일련의 사용자 설문조사 응답이 주어집니다.
+    당신의 임무는 주어진 세 가지 정보를 모두 활용하여 포괄적인 분석을 수행하는 것입니다.
+
+    1.  먼저, 주어진 모든 피드백을 종합하여, 간결하고 전문적인 한 문단의 종합 평가를 한국어로 생성해 주세요.
+
+    출력은 반드시 "summary"와 "insights"라는 두 개의 키를 가진 유효한 JSON 형식이어야 합니다.
+
+    예시:
+    {
+    "summary": "사용자들은 전반적으로 새로운 기능에 긍정적인 반응을 보였으나, 일부는 가격 정책에 대해 우려를 표했습니다. 특히 UI/UX의 직관성에 대한 높은 평가가 두드러졌습니다.",
+    }
+"""
+
+logger = logging.getLogger("survey.report")
+
+# 보고서에 쓰이는 응답 집합이 같으면 지문도 같습니다. 응답이 추가/삭제되면 개수나 마지막 result_id가 바뀝니다.
+FINGERPRINT_QUERY = text("""
+    SELECT count(*), COALESCE(max(result_id), 0), COALESCE(sum(result_id), 0)
+    FROM survey_results
+    WHERE survey_id = :sid AND status = 'completed'
+      AND completed_at >= :start AND completed_at < CAST(:end AS date) + 1;
+""")
+
+FIND_REPORT = text("""
+    SELECT report_id, status FROM survey_reports
+    WHERE survey_id = :sid AND start_date = :start AND end_date = :end
+      AND (fingerprint = :fingerprint OR status = 'pending'
+           OR (status = 'running' AND started_at >= CURRENT_TIMESTAMP - :stale_minutes * interval '1 minute'))
+    ORDER BY requested_at DESC LIMIT 1;
+""")
+
+ENQUEUE_REPORT = text("""
+    INSERT INTO survey_reports (survey_id, send_id, start_date, end_date) VALUES (:sid, :send_id, :start, :end)
+    RETURNING report_id;
+""")
+
+# 최근 일주일 안에 마감된 발송만 예약합니다. (처음 배포할 때 예전 발송 전체가 한꺼번에 예약되지 않도록)
+SCHEDULE_CLOSED_SENDS = text("""
+    INSERT INTO survey_reports (survey_id, send_id, start_date, end_date)
+    SELECT ss.survey_id, ss.send_id, ss.scheduled_at::date, CURRENT_DATE
+    FROM survey_sends ss
+    JOIN surveys sv ON sv.survey_id = ss.survey_id
+    JOIN survey_groups g ON g.survey_group_id = sv.survey_group_id
+    WHERE g.deleted_at IS NULL
+      AND ss.scheduled_at < CURRENT_TIMESTAMP - :hours * interval '1 hour'
+      AND ss.scheduled_at > CURRENT_TIMESTAMP - :hours * interval '1 hour' - interval '7 days'
+      AND NOT EXISTS (SELECT 1 FROM survey_reports r WHERE r.send_id = ss.send_id)
+    ON CONFLICT DO NOTHING;
+""")
+
+CLAIM_REPORT = text("""
+    UPDATE survey_reports SET status = 'running', started_at = CURRENT_TIMESTAMP
+    WHERE report_id = (
+        SELECT report_id FROM survey_reports
+        WHERE status = 'pending' OR (status = 'running' AND started_at < CURRENT_TIMESTAMP - :stale_minutes * interval '1 minute')
+        ORDER BY requested_at FOR UPDATE SKIP LOCKED LIMIT 1
+    )
+    RETURNING report_id, survey_id, start_date, end_date;
+""")
+
+REUSE_REPORT = text("""
+    UPDATE survey_reports r SET status = 'done', fingerprint = :fingerprint, content = prev.content, finished_at = CURRENT_TIMESTAMP
+    FROM (
+        SELECT content FROM survey_reports
+        WHERE survey_id = :sid AND start_date = :start AND end_date = :end AND fingerprint = :fingerprint AND status = 'done'
+        ORDER BY finished_at DESC LIMIT 1
+    ) prev
+    WHERE r.report_id = :rid;
+""")
+
+STORE_REPORT = text("""
+    UPDATE survey_reports SET status = 'done', fingerprint = :fingerprint, content = :content, finished_at = CURRENT_TIMESTAMP, last_error = NULL
+    WHERE report_id = :rid;
+""")
+
+FAIL_REPORT = text("""
+    UPDATE survey_reports SET status = 'failed', finished_at = CURRENT_TIMESTAMP, last_error = :error WHERE report_id = :rid;
+""")
+
+LATEST_REPORT = text("""
+    SELECT report_id, start_date, end_date, fingerprint, finished_at, content FROM survey_reports
+    WHERE survey_id = :sid AND status = 'done'
+    ORDER BY finished_at DESC LIMIT 1;
+""")
+
+PENDING_REPORTS = text("""
+    SELECT count(*) FROM survey_reports
+    WHERE survey_id = :sid
+      AND (status = 'pending' OR (status = 'running' AND started_at >= CURRENT_TIMESTAMP - :stale_minutes * interval '1 minute'));
+""")
+
+
+# --- 대시보드와 보고서가 함께 쓰는 분석 ---
+
+def text_responses(long_df):
+    """STOP_ANSWERS처럼 의미 없는 답변을 뺀 주관식 응답만 남깁니다."""
+    df = long_df[long_df['item_type'] == '인풋박스'].dropna(subset=['response_content'])
+    return df[~df['response_content'].map(is_stop_answer)]
+
+
+def kpis(responses_df, text_df, target_count, start_date, end_date):
+    """[(이름, 값)] 순서로 대시보드 상단 지표를 계산합니다."""
+    total_responses = len(responses_df)
+    with_sentiment = text_df[text_df['sentiment'].notna()]
+    positive = (with_sentiment['sentiment'] == 'positive').sum()
+    return [
+        ("총 응답 수", f"{total_responses} 건"),
+        ("응답률 (목표 대비)", f"{total_responses / target_count:.1%}" if target_count > 0 else "N/A"),
+        ("긍정 답변 비율", f"{positive / len(with_sentiment):.1%}" if not with_sentiment.empty else "N/A"),
+        ("분석 기간", f"{(end_date - start_date).days + 1} 일"),
+    ]
+
+
+def daily_chart(responses_df):
+    daily_counts = pd.to_datetime(responses_df['created_at']).dt.date.value_counts().sort_index()
+    fig = px.bar(x=daily_counts.index, y=daily_counts.values, labels={'x': '날짜', 'y': '응답 건수'})
+    fig.update_yaxes(rangemode='tozero')
+    return fig
+
+
+def distribution_chart(counts):
+    fig = px.bar(y=counts.index, x=counts.values, labels={'y': '응답', 'x': '응답 수'}, orientation='h')
+    fig.update_layout(showlegend=False, height=300, yaxis={'categoryorder': 'total ascending'})
+    fig.update_xaxes(dtick=1)
+    return fig
+
+
+def sentiment_groups(text_df):
+    """{질문: {"positive": [...], "negative": [...], "neutral": [...]}}"""
+    return {
+        title: {label: group[group['sentiment'] == label]['response_content'].tolist() for label in ("positive", "negative", "neutral")}
+        for title, group in text_df.groupby('item_title', sort=False)
+    }
+
+
+def ai_evaluation(client, text_df):
+    """주관식 응답과 감성으로 AI 종합 평가를 만듭니다. LLM 호출 실패는 호출하는 쪽에서 처리합니다."""
+    if not client: return {"summary": "AI 클라이언트가 초기화되지 않았습니다.", "insights": []}
+    if text_df.empty: return {"summary": "분석할 텍스트 응답이 없습니다.", "insights": []}
+
+    def format_row(row):
+        return f"질문: {row['item_title']}\n답변: {row['response_content']}\n사전 분석된 감성: {row['sentiment']}"
+
+    response = chat_completion(
+        "dashboard_summary",
+        client=client,
+        model=openai_deployment,
+        response_format={"type": "json_object"},
+        temperature=0.9,
+        max_tokens=500,
+        messages=[
+            {"role": "system", "content": AI_SUMMARY_PROMPT},
+            {"role": "user", "content": "\n\n".join(text_df.apply(format_row, axis=1))},
+        ]
+    )
+    return json.loads(response.choices[0].message.content)
+
+
+def word_cloud_figure(phrases):
+    """핵심 구문으로 워드클라우드 그림을 만듭니다. 구문이 없으면 None입니다."""
+    if not phrases:
+        return None
+    from wordcloud import WordCloud
+    import matplotlib.pyplot as plt
+    wordcloud = WordCloud(width=800, height=350, background_color='white', font_path=WORD_CLOUD_FONT).generate(" ".join(phrases))
+    fig, ax = plt.subplots(figsize=(10, 5))
+    ax.imshow(wordcloud, interpolation='bilinear')
+    ax.axis('off')
+    return fig
+
+
+# --- 보고서 생성 ---
+
+def report_fingerprint(s, survey_id, start_date, end_date):
+    count, max_result_id, id_sum = s.execute(FINGERPRINT_QUERY, {"sid": survey_id, "start": start_date, "end": end_date}).one()
+    payload = json.dumps([REPORT_VERSION, survey_id, str(start_date), str(end_date), count, max_result_id, int(id_sum)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _figure_png(fig):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", bbox_inches="tight")
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def build_report_html(s, survey_id, start_date, end_date, client, language_backend):
+    """대시보드의 통계 탭과 같은 내용을 외부 파일 없이 열리는 HTML 한 장으로 만듭니다."""
+    info = s.execute(text("SELECT survey_title, version FROM surveys WHERE survey_id = :sid;"), {"sid": survey_id}).one()
+    long_df = load_responses(s, survey_id)
+    long_df['created_at'] = pd.to_datetime(long_df['created_at'])
+    long_df = long_df[(long_df['created_at'].dt.date >= start_date) & (long_df['created_at'].dt.date <= end_date)]
+    responses_df = pivot_responses(long_df) if not long_df.empty else pd.DataFrame(columns=['result_id', 'created_at'])
+    text_df = text_responses(long_df)
+    structure_df = load_survey_structure(s, survey_id)
+    target_count = count_targets(s, survey_id)
+
+    parts = [f"<h1>{html.escape(info.survey_title)} (v{info.version}) 통계 결과</h1>",
+             f"<p class='muted'>분석 기간: {start_date} ~ {end_date} · 생성: {datetime.now():%Y-%m-%d %H:%M}</p>"]
+    parts.append("<div class='kpis'>" + "".join(
+        f"<div class='kpi'><div class='muted'>{html.escape(name)}</div><div class='value'>{html.escape(value)}</div></div>"
+        for name, value in kpis(responses_df, text_df, target_count, start_date, end_date)) + "</div>")
+    try: evaluation = ai_evaluation(client, text_df)
+    except ContentFilterError: evaluation = {"summary": "응답 내용이 콘텐츠 정책에 위배되어 AI 평가를 생성할 수 없습니다."}
+    except LLMGatewayError as e: evaluation = {"summary": f"AI 평가를 생성하지 못했습니다: {e}"}
+    parts.append(f"<h2>🤖 AI 종합 평가</h2><p class='box'>{html.escape(evaluation.get('summary', 'AI 평가를 생성하지 못했습니다.'))}</p>")
+
+    # plotly.js는 첫 그래프에만 한 번 넣습니다.
+    include_js = True
+    if not responses_df.empty:
+        parts.append("<h2>🗓️ 일자별 응답 수</h2>" + daily_chart(responses_df).to_html(full_html=False, include_plotlyjs=include_js))
+        include_js = False
+
+    parts.append("<h2>📊 문항별 응답 분포</h2>")
+    for _, row in structure_df.iterrows():
+        fig = distribution_chart(option_counts(long_df, row['item_key'], row['options']))
+        parts.append(f"<h3>Q. {html.escape(row['item_title'])}</h3>" + fig.to_html(full_html=False, include_plotlyjs=include_js))
+        include_js = False
+
+    parts.append("<h2>💬 주관식 답변 분석</h2>")
+    labels = {"positive": "😃 긍정적인 답변", "negative": "😞 부정적인 답변", "neutral": "😐 중립적인 답변"}
+    for title, groups in sentiment_groups(text_df).items():
+        parts.append(f"<h3>Q. {html.escape(title)}</h3>")
+        for label, answers in groups.items():
+            if answers:
+                items = "".join(f"<li>{html.escape(str(answer))}</li>" for answer in answers)
+                parts.append(f"<details><summary>{labels[label]} ({len(answers)}개)</summary><ul>{items}</ul></details>")
+
+    documents = text_df["response_content"].tolist()
+    if documents:
+        phrases = [phrase for doc_phrases in language_backend.extract_key_phrases(documents) for phrase in doc_phrases]
+        try:
+            fig = word_cloud_figure(phrases)
+        except Exception:
+            # 대시보드와 마찬가지로 워드클라우드를 만들지 못해도 나머지 보고서는 저장합니다.
+            logger.warning("word cloud failed for survey %s", survey_id, exc_info=True)
+            fig = None
+        if fig is not None:
+            parts.append(f"<h2>☁️ 주관식 주요 키워드</h2><img src='data:image/png;base64,{_figure_png(fig)}' style='max-width:100%'>")
+
+    return f"""<!DOCTYPE html>
+<html lang="ko"><head><meta charset="utf-8"><title>{html.escape(info.survey_title)} 보고서</title>
+<style>
+    body {{ font-family: sans-serif; max-width: 1100px; margin: 24px auto; padding: 0 16px; }}
+    .muted {{ color: #666; font-size: 0.9em; }}
+    .kpis {{ display: flex; gap: 12px; }}
+    .kpi {{ flex: 1; border: 1px solid #ddd; border-radius: 8px; padding: 12px; }}
+    .kpi .value {{ font-size: 1.6em; font-weight: bold; }}
+    .box {{ background: #eef4ff; border-radius: 8px; padding: 12px; }}
+</style></head>
+<body>{''.join(parts)}</body></html>"""
+
+
+def request_report(s, survey_id, start_date, end_date, send_id=None):
+    """보고서 작업을 예약하고 report_id를 반환합니다. 같은 데이터로 만든 보고서나 진행 중인 작업이 있으면 그 id를 반환합니다."""
+    fingerprint = report_fingerprint(s, survey_id, start_date, end_date)
+    params = {"sid": survey_id, "start": start_date, "end": end_date, "fingerprint": fingerprint, "stale_minutes": REPORT_STALE_MINUTES}
+    existing = s.execute(FIND_REPORT, params).one_or_none()
+    if existing is not None:
+        return existing.report_id
+    return s.execute(ENQUEUE_REPORT, {"sid": survey_id, "send_id": send_id, "start": start_date, "end": end_date}).scalar_one()
+
+
+def get_latest_report(s, survey_id):
+    """마지막으로 만든 보고서를 {report_id, start_date, end_date, finished_at, html}로 반환합니다. 없으면 None입니다."""
+    row = s.execute(LATEST_REPORT, {"sid": survey_id}).mappings().one_or_none()
+    if row is None:
+        return None
+    report = {key: row[key] for key in ("report_id", "start_date", "end_date", "fingerprint", "finished_at")}
+    report["html"] = gzip.decompress(row["content"]).decode("utf-8")
+    return report
+
+
+def count_pending_reports(s, survey_id):
+    return s.execute(PENDING_REPORTS, {"sid": survey_id, "stale_minutes": REPORT_STALE_MINUTES}).scalar_one()
+
+
+def generate_one_report(engine, client, language_backend):
+    """대기 중인 보고서 하나를 만들고 report_id를 반환합니다. 작업이 없으면 None입니다."""
+    with Session(engine) as s:
+        s.execute(SCHEDULE_CLOSED_SENDS, {"hours": REPORT_AFTER_SEND_HOURS})
+        job = s.execute(CLAIM_REPORT, {"stale_minutes": REPORT_STALE_MINUTES}).one_or_none()
+        s.commit()
+    if job is None:
+        return None
+
+    params = {"rid": job.report_id, "sid": job.survey_id, "start": job.start_date, "end": job.end_date}
+    try:
+        with Session(engine) as s:
+            fingerprint = report_fingerprint(s, job.survey_id, job.start_date, job.end_date)
+            if s.execute(REUSE_REPORT, {**params, "fingerprint": fingerprint}).rowcount:
+                s.commit()
+                logger.info("report %s reused an identical report", job.report_id)
+                return job.report_id
+            started = time.perf_counter()
+            body = build_report_html(s, job.survey_id, job.start_date, job.end_date, client, language_backend)
+            s.execute(STORE_REPORT, {"rid": job.report_id, "fingerprint": fingerprint, "content": gzip.compress(body.encode("utf-8"))})
+            s.commit()
+        logger.info("report %s generated in %.1fs", job.report_id, time.perf_counter() - started)
+    except Exception as e:
+        logger.exception("report %s failed", job.report_id)
+        with Session(engine) as s:
+            s.execute(FAIL_REPORT, {"rid": job.report_id, "error": str(e)[:500]})
+            s.commit()
+    return job.report_id
+
+
+def run_report_worker(engine, once=False):
+    from clients import get_openai_client
+    from text_analysis import CachedLanguageBackend, get_language_backend
+    client = get_openai_client()
+    language_backend = CachedLanguageBackend(get_language_backend(), lambda: Session(engine))
+    while True:
+        try:
+            report_id = generate_one_report(engine, client, language_backend)
+        except SQLAlchemyError as e:
+            logger.warning("report worker database error, retrying: %s", e)
+            time.sleep(REPORT_POLL_SECONDS)
+            continue
+        if report_id is None:
+            if once:
+                return
+            time.sleep(REPORT_POLL_SECONDS)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--once", action="store_true", help="대기 중인 작업을 모두 처리하면 종료")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    run_report_worker(create_engine(db_uri), once=args.once)
@@ -0,0 +1,311 @@
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+from text_analysis import is_stop_answer
+
+load_dotenv()
+
+# 작성 중인 답변은 바뀌었을 때만, 그리고 최소 이 간격을 두고 저장합니다.
+DRAFT_SAVE_INTERVAL_SECONDS = float(os.getenv("DRAFT_SAVE_INTERVAL_SECONDS", "5"))
+# 이 기간 동안 이어서 작성하지 않은 임시 저장은 archive.py 실행 때 지웁니다.
+DRAFT_TTL_DAYS = int(os.getenv("DRAFT_TTL_DAYS", "30"))
+
+# 1이면 응답 페이지가 제출을 잠시 모았다가 한 트랜잭션으로 커밋합니다. (그룹 커밋)
+SUBMIT_GROUP_COMMIT = os.getenv("SUBMIT_GROUP_COMMIT", "0") == "1"
+# 첫 제출이 들어온 뒤 이 시간(ms)까지, 최대 SUBMIT_BATCH_MAX건을 모아 함께 커밋합니다.
+SUBMIT_BATCH_WAIT_MS = float(os.getenv("SUBMIT_BATCH_WAIT_MS", "5"))
+SUBMIT_BATCH_MAX = int(os.getenv("SUBMIT_BATCH_MAX", "200"))
+SUBMIT_ACK_TIMEOUT_SECONDS = float(os.getenv("SUBMIT_ACK_TIMEOUT_SECONDS", "10"))
+
+logger = logging.getLogger("survey.response_store")
+
+# 응답 테이블은 completed_at 기준 월 파티션이므로 하위 행에도 같은 completed_at을 넣어 같은 달 파티션에 저장합니다.
+INSERT_RESULT = text("INSERT INTO survey_results (survey_id, send_id, email, status, completed_at) VALUES (:sid, :send_id, :email, 'completed', CURRENT_TIMESTAMP) RETURNING result_id, completed_at;")
+INSERT_OPTION_RESPONSE = text("INSERT INTO user_responses (result_id, completed_at, item_id, option_id) VALUES (:rid, :completed_at, :iid, :oid);")
+INSERT_TEXT_RESPONSE = text("INSERT INTO user_responses (result_id, completed_at, item_id, response_text) VALUES (:rid, :completed_at, :iid, :text) RETURNING response_id;")
+INSERT_SENTIMENT = text("INSERT INTO sentiment_analysis (response_id, completed_at, sentiment_label, sentiment_score) VALUES (:rid, :completed_at, :label, :score);")
+DELETE_DRAFTS = text("DELETE FROM survey_results WHERE send_id = :send_id AND email = :email AND status = 'in_progress';")
+
+FIND_DRAFT = text("""
+    SELECT result_id, draft_answers FROM survey_results
+    WHERE send_id = :send_id AND email = :email AND survey_id = :sid AND status = 'in_progress'
+    ORDER BY updated_at DESC LIMIT 1;
+""")
+# 다른 탭에서 이미 제출해 임시 저장이 지워졌으면 새로 만들지 않습니다. (완료 응답 옆에 남는 in_progress 행 방지)
+INSERT_DRAFT = text("""
+    INSERT INTO survey_results (survey_id, send_id, email, status, completed_at, draft_answers, updated_at)
+    SELECT :sid, CAST(:send_id AS uuid), :email, 'in_progress', CURRENT_TIMESTAMP, CAST(:answers AS jsonb), CURRENT_TIMESTAMP
+    WHERE NOT EXISTS (
+        SELECT 1 FROM survey_results WHERE send_id = :send_id AND email = :email AND status = 'completed'
+    )
+    RETURNING result_id;
+""")
+UPDATE_DRAFT = text("""
+    UPDATE survey_results SET draft_answers = CAST(:answers AS jsonb), updated_at = CURRENT_TIMESTAMP
+    WHERE result_id = :rid AND status = 'in_progress';
+""")
+DELETE_STALE_DRAFTS = text("""
+    DELETE FROM survey_results WHERE status = 'in_progress' AND updated_at < CURRENT_TIMESTAMP - :days * interval '1 day';
+""")
+
+# 그룹 커밋용 다건 쓰기. 배열 파라미터를 unnest로 풀어 테이블마다 한 문장으로 넣습니다.
+# result_id와 주관식 답변의 response_id는 미리 받아 두어야 하위 행과 감성 행을 같은 문장 안에서 연결할 수 있습니다.
+ALLOCATE_BATCH_IDS = text("""
+    SELECT LOCALTIMESTAMP AS completed_at,
+           ARRAY(SELECT nextval('survey_results_result_id_seq') FROM generate_series(1, :results)) AS result_ids,
+           ARRAY(SELECT nextval('user_responses_response_id_seq') FROM generate_series(1, :texts)) AS response_ids;
+""")
+DELETE_BATCH_DRAFTS = text("""
+    DELETE FROM survey_results WHERE status = 'in_progress'
+      AND (send_id, email) IN (SELECT * FROM unnest(CAST(:send_ids AS uuid[]), CAST(:emails AS text[])));
+""")
+INSERT_BATCH_RESULTS = text("""
+    INSERT INTO survey_results (result_id, survey_id, send_id, email, status, completed_at)
+    SELECT r.result_id, r.survey_id, r.send_id, r.email, 'completed', :completed_at
+    FROM unnest(CAST(:result_ids AS int[]), CAST(:survey_ids AS int[]), CAST(:send_ids AS uuid[]), CAST(:emails AS text[]))
+         AS r(result_id, survey_id, send_id, email);
+""")
+INSERT_BATCH_RESPONSES = text("""
+    INSERT INTO user_responses (response_id, result_id, completed_at, item_id, option_id, response_text)
+    SELECT COALESCE(r.response_id, nextval('user_responses_response_id_seq')), r.result_id, :completed_at, r.item_id, r.option_id, r.response_text
+    FROM unnest(CAST(:response_ids AS int[]), CAST(:result_ids AS int[]), CAST(:item_ids AS int[]), CAST(:option_ids AS int[]), CAST(:texts AS text[]))
+         AS r(response_id, result_id, item_id, option_id, response_text);
+""")
+INSERT_BATCH_SENTIMENTS = text("""
+    INSERT INTO sentiment_analysis (response_id, completed_at, sentiment_label, sentiment_score)
+    SELECT r.response_id, :completed_at, r.label, r.score
+    FROM unnest(CAST(:response_ids AS int[]), CAST(:labels AS text[]), CAST(:scores AS float8[])) AS r(response_id, label, score);
+""")
+
+
+def save_responses(s, survey_id, send_id, user_email, responses, analyze_sentiment=None):
+    """응답자 한 명의 제출을 저장하고 result_id를 반환합니다. 커밋은 호출하는 쪽에서 합니다.
+
+    responses는 {item_id: 답변} 형태이며, 답변은 option_id 목록(체크박스), {"option_id": ...}(라디오버튼),
+    {"text": ...}(인풋박스) 중 하나입니다. analyze_sentiment(text)가 주어지면 주관식 답변의 감성도 함께 저장합니다.
+    ("없음"처럼 STOP_ANSWERS에 해당하는 답변은 분석하지 않습니다.) 같은 응답자의 임시 저장은 함께 지웁니다.
+    """
+    s.execute(DELETE_DRAFTS, params={"send_id": send_id, "email": user_email})
+    result_id, completed_at = s.execute(INSERT_RESULT, params={"sid": survey_id, "send_id": send_id, "email": user_email}).one()
+
+    for item_id, answer in responses.items():
+        if not answer: continue
+
+        if isinstance(answer, list):
+            for option_id in answer:
+                s.execute(INSERT_OPTION_RESPONSE, params={"rid": result_id, "completed_at": completed_at, "iid": item_id, "oid": option_id})
+        elif "option_id" in answer:
+            s.execute(INSERT_OPTION_RESPONSE, params={"rid": result_id, "completed_at": completed_at, "iid": item_id, "oid": answer["option_id"]})
+        elif "text" in answer and answer['text'].strip():
+            response_text_to_save = answer['text'].strip()
+            response_id = s.execute(INSERT_TEXT_RESPONSE, params={"rid": result_id, "completed_at": completed_at, "iid": item_id, "text": response_text_to_save}).scalar_one()
+
+            if analyze_sentiment is None or is_stop_answer(response_text_to_save):
+                continue
+            sentiment_label, sentiment_score = analyze_sentiment(response_text_to_save)
+            if sentiment_label and sentiment_score is not None:
+                s.execute(INSERT_SENTIMENT, params={"rid": response_id, "completed_at": completed_at, "label": sentiment_label, "score": sentiment_score})
+    return result_id
+
+
+
+def prepare_submission(survey_id, send_id, user_email, responses, analyze_sentiment=None):
+    """save_responses와 같은 입력을 write_submissions가 받는 형태로 바꿉니다. 감성 분석은 여기서 미리 합니다.
+
+    분석 API 호출을 트랜잭션 밖에서 끝내 두어야, 모아서 커밋하는 동안 다른 제출을 기다리게 하지 않습니다.
+    """
+    options, texts = [], []
+    for item_id, answer in responses.items():
+        if not answer: continue
+
+        if isinstance(answer, list):
+            options.extend((int(item_id), int(option_id)) for option_id in answer)
+        elif "option_id" in answer:
+            options.append((int(item_id), int(answer["option_id"])))
+        elif "text" in answer and answer['text'].strip():
+            response_text = answer['text'].strip()
+            label, score = None, None
+            if analyze_sentiment is not None and not is_stop_answer(response_text):
+                label, score = analyze_sentiment(response_text)
+            texts.append((int(item_id), response_text, label, score if label else None))
+    return {"survey_id": int(survey_id), "send_id": str(send_id), "email": user_email, "options": options, "texts": texts}
+
+
+def write_submissions(s, submissions):
+    """prepare_submission으로 만든 제출 여러 건을 테이블마다 한 문장으로 저장하고, 제출 순서대로 result_id를 반환합니다.
+
+    커밋은 호출하는 쪽에서 합니다. 같은 응답자의 임시 저장은 함께 지웁니다.
+    """
+    texts = [(i, row) for i, sub in enumerate(submissions) for row in sub["texts"]]
+    allocated = s.execute(ALLOCATE_BATCH_IDS, {"results": len(submissions), "texts": len(texts)}).one()
+    result_ids, completed_at = allocated.result_ids, allocated.completed_at
+    send_ids, emails = [sub["send_id"] for sub in submissions], [sub["email"] for sub in submissions]
+
+    s.execute(DELETE_BATCH_DRAFTS, {"send_ids": send_ids, "emails": emails})
+    s.execute(INSERT_BATCH_RESULTS, {"completed_at": completed_at, "result_ids": result_ids, "send_ids": send_ids, "emails": emails,
+                                     "survey_ids": [sub["survey_id"] for sub in submissions]})
+
+    rows = [(None, result_ids[i], item_id, option_id, None) for i, sub in enumerate(submissions) for item_id, option_id in sub["options"]]
+    rows += [(response_id, result_ids[i], item_id, None, response_text)
+             for response_id, (i, (item_id, response_text, _, _)) in zip(allocated.response_ids, texts)]
+    if rows:
+        response_ids, rids, item_ids, option_ids, response_texts = (list(column) for column in zip(*rows))
+        s.execute(INSERT_BATCH_RESPONSES, {"completed_at": completed_at, "response_ids": response_ids, "result_ids": rids,
+                                           "item_ids": item_ids, "option_ids": option_ids, "texts": response_texts})
+
+    sentiments = [(response_id, label, score) for response_id, (_, (_, _, label, score)) in zip(allocated.response_ids, texts) if label]
+    if sentiments:
+        response_ids, labels, scores = (list(column) for column in zip(*sentiments))
+        s.execute(INSERT_BATCH_SENTIMENTS, {"completed_at": completed_at, "response_ids": response_ids, "labels": labels, "scores": scores})
+    return list(result_ids)
+
+
+class SubmissionBuffer:
+    """제출을 SUBMIT_BATCH_WAIT_MS 동안 모아 한 트랜잭션으로 커밋하는 프로세스 내 큐입니다.
+
+    submit()은 자기 제출이 들어간 트랜잭션이 커밋된 뒤에야 result_id를 반환하므로, 응답자에게는 저장이 끝난 뒤에만 완료를 알립니다.
+    묶음 커밋이 실패하면 한 건씩 다시 저장해, 문제 있는 제출 하나 때문에 같은 묶음의 다른 제출이 실패하지 않게 합니다.
+    """
+
+    def __init__(self, engine, wait_ms=SUBMIT_BATCH_WAIT_MS, max_batch=SUBMIT_BATCH_MAX):
+        self.engine = engine
+        self.wait_seconds = wait_ms / 1000
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="survey-submissions", daemon=True)
+        self._thread.start()
+
+    def submit(self, submission, timeout=SUBMIT_ACK_TIMEOUT_SECONDS):
+        """제출 한 건을 큐에 넣고 커밋될 때까지 기다려 result_id를 반환합니다. 저장에 실패하면 그 예외를 그대로 올립니다.
+
+        timeout 안에 저장을 시작하지 못하면 큐에서 취소하고 TimeoutError를 올리므로, 실패를 알린 제출이 나중에 커밋되지 않습니다.
+        이미 저장 중이면 취소할 수 없으므로 그 커밋이 끝날 때까지 기다립니다.
+        """
+        future = Future()
+        self._queue.put((submission, future))
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            if future.cancel():
+                raise
+            return future.result()
+
+    def close(self):
+        """이미 들어온 제출을 저장한 뒤 스레드를 멈춥니다. 엔진은 호출하는 쪽에서 정리합니다."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        closing = False
+        while not closing:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.wait_seconds
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+            # 기다리다 취소된 제출은 빼고 저장합니다. 남은 제출은 이 시점부터 취소할 수 없습니다.
+            batch = [(submission, future) for submission, future in batch if future.set_running_or_notify_cancel()]
+            if batch:
+                self._flush(batch)
+
+    def _flush(self, batch):
+        try:
+            with Session(self.engine) as s:
+                result_ids = write_submissions(s, [submission for submission, _ in batch])
+                s.commit()
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            logger.warning("group commit of %s submissions failed, retrying one by one: %s", len(batch), e)
+            for item in batch:
+                self._flush([item])
+            return
+        for (_, future), result_id in zip(batch, result_ids):
+            future.set_result(result_id)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_submission_buffer(dsn):
+    """프로세스마다 하나의 SubmissionBuffer를 만들어 공유합니다."""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = SubmissionBuffer(create_engine(dsn, pool_size=1, max_overflow=1))
+        return _buffer
+
+def encode_answers(responses):
+    """responses를 {"item_id": option_id | [option_id, ...] | "텍스트"} 형태의 작은 JSON 문자열로 바꿉니다. 빈 답변은 뺍니다."""
+    encoded = {}
+    for item_id, answer in responses.items():
+        if isinstance(answer, list):
+            if answer:
+                encoded[str(item_id)] = [int(option_id) for option_id in answer]
+        elif answer and answer.get("option_id") is not None:
+            encoded[str(item_id)] = int(answer["option_id"])
+        elif answer and answer.get("text", "").strip():
+            encoded[str(item_id)] = answer["text"]
+    return json.dumps(encoded, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+
+
+def decode_answers(draft_answers):
+    """encode_answers로 저장한 값을 save_responses가 받는 responses 형태로 되돌립니다."""
+    responses = {}
+    for item_id, value in (draft_answers or {}).items():
+        if isinstance(value, list):
+            responses[int(item_id)] = value
+        elif isinstance(value, str):
+            responses[int(item_id)] = {"text": value}
+        else:
+            responses[int(item_id)] = {"option_id": value}
+    return responses
+
+
+def answers_digest(encoded):
+    """세션에는 답변 대신 이 짧은 해시만 두고, 바뀌었는지 비교할 때 씁니다."""
+    return hashlib.blake2b(encoded.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def find_draft(s, survey_id, send_id, user_email):
+    """응답자의 임시 저장을 (result_id, responses)로 반환합니다. 없으면 None입니다."""
+    row = s.execute(FIND_DRAFT, {"sid": survey_id, "send_id": send_id, "email": user_email}).one_or_none()
+    if row is None:
+        return None
+    return row.result_id, decode_answers(row.draft_answers)
+
+
+def save_draft(s, draft_id, survey_id, send_id, user_email, encoded):
+    """임시 저장을 만들거나 갱신하고 draft_id(result_id)를 반환합니다. 커밋은 호출하는 쪽에서 합니다.
+
+    이미 제출을 마친 응답자이면 저장하지 않고 None을 반환합니다.
+    """
+    if draft_id is not None and s.execute(UPDATE_DRAFT, {"rid": draft_id, "answers": encoded}).rowcount:
+        return draft_id
+    return s.execute(INSERT_DRAFT, {"sid": survey_id, "send_id": send_id, "email": user_email, "answers": encoded}).scalar_one_or_none()
+
+
+def delete_stale_drafts(s, days=DRAFT_TTL_DAYS):
+    return s.execute(DELETE_STALE_DRAFTS, {"days": days}).rowcount
@@ -0,0 +1,104 @@
+import uuid
+import pandas as pd
+from sqlalchemy import text
+
+SEND_COUNTS_QUERY = text("""
+    SELECT sv.survey_group_id, count(*) FROM survey_sends s
+    JOIN surveys sv ON s.survey_id = sv.survey_id
+    WHERE sv.survey_group_id = ANY(:gids)
+    GROUP BY sv.survey_group_id;
+""")
+
+SENDS_QUERY = text("""
+    SELECT s.*, sv.version FROM survey_sends s
+    JOIN surveys sv ON s.survey_id = sv.survey_id
+    WHERE sv.survey_group_id = :gid ORDER BY s.scheduled_at DESC;
+""")
+
+TARGET_COUNT_QUERY = text("SELECT SUM(jsonb_array_length(recipients)) FROM survey_sends WHERE survey_id = :sid;")
+
+# 선택한 발송(들)의 수신자 중 그 발송으로 응답을 완료하지 않은 사람. 삭제된 설문의 발송과 취소된 발송은 제외합니다.
+# 발송 조건은 먼저 걸러 두고, 수신자 전체와 완료 응답은 해시 안티 조인 한 번으로 비교합니다.
+NON_RESPONDERS_SQL = """
+    WITH sends AS MATERIALIZED (
+        SELECT ss.recipients FROM survey_sends ss
+        JOIN surveys sv ON sv.survey_id = ss.survey_id
+        JOIN survey_groups g ON g.survey_group_id = sv.survey_group_id
+        WHERE ss.send_id = ANY(:send_ids) AND ss.status <> '예약 취소' AND g.deleted_at IS NULL
+    ), recipients AS (
+        SELECT DISTINCT rec->>'이메일' AS email FROM sends, jsonb_array_elements(sends.recipients) rec
+    )
+    SELECT r.email FROM recipients r
+    WHERE NULLIF(btrim(r.email), '') IS NOT NULL
+      AND NOT EXISTS (
+          SELECT 1 FROM survey_results sr
+          WHERE sr.send_id = ANY(:send_ids) AND sr.email = r.email AND sr.status = 'completed'
+      )
+"""
+COUNT_NON_RESPONDERS = text(f"SELECT count(*) FROM ({NON_RESPONDERS_SQL}) n;")
+
+# 수신자 목록과 설문 URL을 DB 안에서 만들어 바로 새 발송으로 넣습니다. 미응답자가 없으면 아무것도 넣지 않습니다.
+INSERT_REMINDER_SEND = text(f"""
+    INSERT INTO survey_sends (send_id, survey_id, scheduled_at, status, recipients)
+    SELECT CAST(:new_send_id AS uuid), :sid, :scheduled_at, '발송 예약',
+           jsonb_agg(jsonb_build_object(
+               '이메일', n.email,
+               '설문 URL', :base_url || '&email=' || url_encode(n.email) || '&send_id=' || :new_send_id
+           ) ORDER BY n.email)
+    FROM ({NON_RESPONDERS_SQL}) n
+    HAVING count(*) > 0
+    RETURNING jsonb_array_length(recipients);
+""")
+
+COMPLETED_USERS_QUERY = text("""
+    SELECT email, completed_at
+    FROM survey_results
+    WHERE send_id = :send_id AND status = 'completed';
+""")
+
+
+def _frame(result):
+    return pd.DataFrame(result.fetchall(), columns=list(result.keys()))
+
+
+def count_sends(s, survey_group_ids):
+    """설문 그룹별 발송 횟수를 {survey_group_id: 횟수}로 반환합니다. 발송이 없는 그룹은 빠집니다."""
+    return dict(s.execute(SEND_COUNTS_QUERY, {"gids": survey_group_ids}).all())
+
+
+def list_sends(s, survey_group_id):
+    """설문 그룹의 모든 버전에 대한 발송 기록을 예약 시간 역순으로 반환합니다."""
+    return _frame(s.execute(SENDS_QUERY, {"gid": survey_group_id}))
+
+
+def list_completed_users(s, send_id):
+    """발송 건에서 응답을 완료한 사람의 이메일과 완료 시간을 반환합니다."""
+    try:
+        uuid_obj = uuid.UUID(str(send_id))
+    except (ValueError, TypeError):
+        return pd.DataFrame()
+    return _frame(s.execute(COMPLETED_USERS_QUERY, {"send_id": uuid_obj}))
+
+
+def count_targets(s, survey_id):
+    """설문 버전에 발송한 수신자 수의 합(응답률의 분모)을 반환합니다."""
+    return s.execute(TARGET_COUNT_QUERY, {"sid": survey_id}).scalar_one_or_none() or 0
+
+
+def count_non_responders(s, send_ids):
+    """선택한 발송들의 수신자 중 아직 응답하지 않은 사람 수를 반환합니다. (여러 발송에 중복된 주소는 한 번만 셉니다)"""
+    return s.execute(COUNT_NON_RESPONDERS, {"send_ids": [uuid.UUID(str(send_id)) for send_id in send_ids]}).scalar_one()
+
+
+def create_reminder_send(s, survey_id, send_ids, scheduled_at, base_url):
+    """미응답자에게 보낼 리마인드 발송을 예약하고 (send_id, 수신자 수)를 반환합니다. 미응답자가 없으면 None입니다.
+
+    주소는 Python으로 가져오지 않고 한 번의 INSERT ... SELECT로 처리합니다. base_url은 "...?survey_id=<id>"까지의 설문 주소입니다.
+    커밋은 호출하는 쪽에서 합니다.
+    """
+    new_send_id = uuid.uuid4()
+    recipients = s.execute(INSERT_REMINDER_SEND, {
+        "new_send_id": str(new_send_id), "sid": survey_id, "scheduled_at": scheduled_at, "base_url": base_url,
+        "send_ids": [uuid.UUID(str(send_id)) for send_id in send_ids],
+    }).scalar_one_or_none()
+    return None if recipients is None else (new_send_id, recipients)
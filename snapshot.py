@@ -0,0 +1,226 @@
+"""대시보드 집계를 DuckDB로 하는 분석 모드(ANALYTICS_ENGINE=duckdb)입니다. duckdb를 따로 설치해야 합니다.
+
+설문 버전의 완료 응답을 로컬 Parquet 스냅샷(SNAPSHOT_DIR/survey_<id>/)으로 뽑아 두고,
+기간 필터, 피벗, 선택지 분포를 그 파일 위에서 DuckDB SQL로 계산합니다. 응답을 프로세스 메모리에 DataFrame으로
+쌓아 두지 않으므로 응답이 많은 설문에서도 대시보드 프로세스의 메모리가 기간 안의 응답 분량만큼만 늘어납니다.
+
+스냅샷은 대시보드를 볼 때 SNAPSHOT_MAX_AGE_SECONDS가 지났으면 새 응답만 delta 파일로 덧붙이고,
+DELTA_FULL_RELOAD_SECONDS가 지나면 처음부터 다시 뽑습니다. cron 등으로 미리 갱신해 둘 수도 있습니다.
+
+    python snapshot.py            # 삭제되지 않은 설문의 응답이 있는 모든 버전
+    python snapshot.py 12 13 --full
+
+한 SNAPSHOT_DIR에는 대시보드 프로세스 하나(또는 위 명령)만 쓰도록 둡니다.
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from pathlib import Path
+import duckdb
+import pandas as pd
+import pyarrow as pa
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+from analytics import (DELTA_FULL_RELOAD_SECONDS, DELTA_MAX_FRAMES, DELTA_OVERLAP_IDS, RESPONSE_COLUMNS, ResponseFrameStore,
+                       load_responses, load_responses_since, pivot_column_name)
+
+load_dotenv()
+
+db_user = os.getenv("DB_USER")
+db_password = os.getenv("DB_PASSWORD")
+db_host = os.getenv("DB_HOST")
+db_port = os.getenv("DB_PORT")
+db_name = os.getenv("DB_NAME")
+
+db_uri = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
+
+SNAPSHOT_DIR = Path(os.getenv("SNAPSHOT_DIR", "snapshots"))
+SNAPSHOT_MAX_AGE_SECONDS = float(os.getenv("SNAPSHOT_MAX_AGE_SECONDS", "60"))
+# delta 파일이 이만큼 쌓이면 base.parquet 하나로 합칩니다.
+SNAPSHOT_MAX_DELTAS = 20
+
+logger = logging.getLogger("survey.snapshot")
+
+SNAPSHOT_SURVEYS = text("""
+    SELECT s.survey_id FROM surveys s
+    JOIN survey_groups g ON g.survey_group_id = s.survey_group_id
+    WHERE g.deleted_at IS NULL
+      AND EXISTS (SELECT 1 FROM survey_results sr WHERE sr.survey_id = s.survey_id AND sr.status = 'completed')
+    ORDER BY s.survey_id;
+""")
+
+# 완료 시간 순으로 정렬해 쓰므로 기간 조건에서 행 그룹 통계로 건너뛸 수 있습니다.
+# row_order는 DB에서 읽은 순서로, 한 응답자가 한 문항에 여러 답을 했을 때 pandas 경로와 같은 순서로 잇는 데 씁니다.
+WRITE_ROWS = "COPY (SELECT *, row_number() OVER () AS row_order FROM new_rows ORDER BY created_at, result_id) TO '{path}' (FORMAT parquet, COMPRESSION zstd);"
+COMPACT = "COPY (SELECT * FROM read_parquet('{glob}') ORDER BY created_at, result_id) TO '{path}' (FORMAT parquet, COMPRESSION zstd);"
+WINDOW = """
+    CREATE OR REPLACE TEMP TABLE window_rows AS
+    SELECT * FROM read_parquet('{glob}') WHERE created_at >= ? AND created_at < ?
+    ORDER BY result_id, row_order;
+"""
+# (응답자, 문항)마다 답을 ", "로 이어 한 행으로 줄입니다. 넓은 표로 펼치는 것은 행이 응답자 x 문항 수뿐이라 pandas에서 합니다.
+# 순서 있는 집계(string_agg ... ORDER BY)보다 list를 모은 뒤 정렬하는 편이 훨씬 빠릅니다.
+ANSWERS_PER_ITEM = """
+    SELECT result_id, created_at, item_title,
+           array_to_string(list_transform(list_sort(list({'o': row_order, 'v': response_content})), x -> x.v), ', ') AS response_content
+    FROM window_rows WHERE response_content IS NOT NULL
+    GROUP BY result_id, created_at, item_title;
+"""
+OPTION_COUNTS = """
+    SELECT response_content, count(*) FROM read_parquet('{glob}')
+    WHERE item_key = ? AND created_at >= ? AND created_at < ?
+    GROUP BY response_content;
+"""
+
+
+def _sql_path(path):
+    return str(path).replace("'", "''")
+
+
+class SnapshotFrame:
+    """설문 하나의 Parquet 스냅샷. analytics.ResponseFrame과 같은 메서드로 대시보드에서 바꿔 쓸 수 있습니다."""
+
+    def __init__(self, survey_id, root=None):
+        self.survey_id = survey_id
+        self.dir = Path(root or SNAPSHOT_DIR) / f"survey_{survey_id}"
+        self.lock = threading.Lock()
+        self.con = duckdb.connect()
+        self.watermark = None
+
+    @property
+    def glob(self):
+        return _sql_path(self.dir / "*.parquet")
+
+    def _files(self):
+        return sorted(self.dir.glob("*.parquet"))
+
+    def _write(self, rows, name):
+        """rows를 임시 파일에 쓰고 이름을 바꿔, 읽는 쪽이 쓰다 만 파일을 보지 않게 합니다."""
+        self.dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.dir / f"{name}.tmp"
+        self.con.register("new_rows", rows[RESPONSE_COLUMNS])
+        try:
+            self.con.execute(WRITE_ROWS.format(path=_sql_path(tmp)))
+        finally:
+            self.con.unregister("new_rows")
+        os.replace(tmp, self.dir / name)
+
+    def _extract_full(self, s):
+        rows = load_responses(s, self.survey_id)
+        for path in self._files():
+            path.unlink()
+        if not rows.empty:
+            self._write(rows, "base.parquet")
+        self.watermark = int(rows['result_id'].max()) if not rows.empty else 0
+        return rows['result_id'].nunique()
+
+    def _extract_delta(self, s):
+        if self.watermark is None:
+            self.watermark = self.con.execute(f"SELECT coalesce(max(result_id), 0) FROM read_parquet('{self.glob}');").fetchone()[0]
+        after = max(0, self.watermark - DELTA_OVERLAP_IDS)
+        rows = load_responses_since(s, self.survey_id, after)
+        if rows.empty:
+            return 0
+        seen = {r[0] for r in self.con.execute(f"SELECT DISTINCT result_id FROM read_parquet('{self.glob}') WHERE result_id > ?;", [after]).fetchall()}
+        rows = rows[~rows['result_id'].isin(seen)]
+        if rows.empty:
+            return 0
+        self._write(rows, f"delta_{uuid.uuid4().hex}.parquet")
+        self.watermark = max(self.watermark, int(rows['result_id'].max()))
+        if len(self._files()) > SNAPSHOT_MAX_DELTAS:
+            self._compact()
+        return rows['result_id'].nunique()
+
+    def _compact(self):
+        files = self._files()
+        tmp = self.dir / "base.parquet.tmp"
+        self.con.execute(COMPACT.format(glob=self.glob, path=_sql_path(tmp)))
+        os.replace(tmp, self.dir / "base.parquet")
+        for path in files:
+            if path.name != "base.parquet":
+                path.unlink()
+
+    def refresh(self, s, full=False):
+        """스냅샷이 SNAPSHOT_MAX_AGE_SECONDS보다 오래됐으면 새 응답만 덧붙이고, 새로 추가된 응답자 수를 반환합니다.
+
+        full이거나 스냅샷이 없거나 DELTA_FULL_RELOAD_SECONDS가 지났으면 처음부터 다시 뽑습니다.
+        """
+        with self.lock:
+            files = self._files()
+            now = time.time()
+            base = self.dir / "base.parquet"
+            if full or not files or (base.exists() and now - base.stat().st_mtime > DELTA_FULL_RELOAD_SECONDS):
+                return self._extract_full(s)
+            if now - max(path.stat().st_mtime for path in files) < SNAPSHOT_MAX_AGE_SECONDS:
+                return 0
+            count = self._extract_delta(s)
+            if count == 0:
+                # 새 응답이 없어도 확인한 시각을 남겨 SNAPSHOT_MAX_AGE_SECONDS 동안 다시 조회하지 않습니다.
+                os.utime(max(files, key=lambda path: path.stat().st_mtime))
+            return count
+
+    def has_responses(self):
+        with self.lock:
+            return bool(self._files())
+
+    def _df(self, query):
+        # 문자열 열이 많아 .df()보다 Arrow를 거쳐 바꾸는 편이 몇 배 빠릅니다.
+        return pa.table(self.con.execute(query).arrow()).to_pandas()
+
+    def _between(self, start, end):
+        if not self._files():
+            return pd.DataFrame(), pd.DataFrame()
+        self.con.execute(WINDOW.format(glob=self.glob), [start, end])
+        long_df = self._df(f"SELECT {', '.join(RESPONSE_COLUMNS)} FROM window_rows;")
+        if long_df.empty:
+            return pd.DataFrame(), long_df
+        answers = self._df(ANSWERS_PER_ITEM)
+        # pivot_responses와 같은 모양: 응답자 한 행, 문항 제목 열(이름순), 답이 없는 칸은 NaN입니다.
+        pivot_df = answers.pivot(index=['result_id', 'created_at'], columns='item_title', values='response_content').reset_index()
+        return pivot_df.rename(columns=pivot_column_name), long_df
+
+    def snapshot(self):
+        """스냅샷 전체를 (pivot, long) DataFrame으로 반환합니다."""
+        with self.lock:
+            return self._between(date.min, date.max)
+
+    def between(self, start_date, end_date):
+        """완료 시간이 기간 안인 (pivot, long) 응답을 반환합니다. 기간 필터와 피벗은 DuckDB에서 합니다."""
+        with self.lock:
+            return self._between(start_date, end_date + timedelta(days=1))
+
+    def option_counts_between(self, item_key, options, start_date, end_date):
+        """기간 안의 선택지별 응답 수를 스냅샷에서 GROUP BY로 계산합니다."""
+        with self.lock:
+            if not self._files():
+                return pd.Series(0, index=options)
+            counts = dict(self.con.execute(OPTION_COUNTS.format(glob=self.glob), [item_key, start_date, end_date + timedelta(days=1)]).fetchall())
+            return pd.Series(0, index=options).add(pd.Series(counts, dtype="int64"), fill_value=0)
+
+
+snapshot_frames = ResponseFrameStore(max_frames=DELTA_MAX_FRAMES, frame_class=SnapshotFrame)
+
+
+def refresh_snapshots(engine, survey_ids=None, full=False):
+    """설문 버전들의 스냅샷을 갱신하고 {survey_id: 새 응답자 수}를 반환합니다. survey_ids가 없으면 응답이 있는 모든 버전입니다."""
+    with Session(engine) as s:
+        survey_ids = survey_ids or s.execute(SNAPSHOT_SURVEYS).scalars().all()
+        results = {}
+        for survey_id in survey_ids:
+            results[survey_id] = snapshot_frames.get(survey_id).refresh(s, full=full)
+            logger.info("survey %s: %s new responses", survey_id, results[survey_id])
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("survey_ids", nargs="*", type=int, help="기본값은 삭제되지 않은 설문의 응답이 있는 모든 버전")
+    parser.add_argument("--full", action="store_true", help="delta를 덧붙이지 않고 처음부터 다시 뽑기")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    print(refresh_snapshots(create_engine(db_uri), args.survey_ids, full=args.full))
@@ -8,7 +8,14 @@ pip install wordcloud
 pip install requests
 pip install openpyxl
 pip install psycopg2
+pip install pyarrow
 pip install azure
 pip install azure-ai-textanalytics==5.3.0
 
+# 보고서 워커: 대시보드의 "보고서 생성" 요청과 발송 마감 후 자동 보고서를 처리합니다. 종료되면 다시 띄웁니다.
+(while true; do python report.py; sleep 10; done) &
+
+# 응답 보관: 하루 한 번 다음 달 파티션을 미리 만들고 닫힌 설문 버전을 Parquet으로 보관합니다.
+(while true; do python archive.py; sleep 86400; done) &
+
 python -m streamlit run main.py --server.port 8000 --server.address 0.0.0.0
\ No newline at end of file
@@ -0,0 +1,130 @@
+import json
+import re
+from llm_gateway import chat_completion
+
+QUESTION_TYPES = ("라디오버튼", "체크박스", "인풋박스")
+
+_KEY_BEFORE_VALUE = re.compile(r'\s*("(?:[^"\\]|\\.)*")\s*:\s*$', re.S)
+
+
+class DraftStreamParser:
+    """스트리밍으로 들어오는 설문 초안 JSON을 조각 단위로 읽고, 완성된 필드와 문항을 바로 돌려줍니다.
+
+    feed()는 이번 조각으로 완성된 (키, 값) 목록을 반환합니다.
+    최상위 필드는 ("survey_title", 값)처럼, questions 배열의 각 문항은 ("question", dict)로 나옵니다.
+    응답이 중간에 잘려도 그때까지 완성된 항목은 모두 반환됩니다.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.closed = False
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._member_start = None
+        self._array_key = None
+        self._question_start = None
+
+    def feed(self, chunk):
+        events = []
+        self.buffer += chunk
+        buf = self.buffer
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+            if self.closed:
+                break
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if self._depth == 0:
+                # 코드 블록 표시 등 JSON 앞의 텍스트는 건너뜁니다.
+                if ch == "{":
+                    self._depth = 1
+                    self._member_start = i + 1
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+                if self._depth == 2 and ch == "[":
+                    match = _KEY_BEFORE_VALUE.match(buf, self._member_start, i)
+                    self._array_key = json.loads(match.group(1)) if match else None
+                elif self._depth == 3 and ch == "{" and self._array_key == "questions":
+                    self._question_start = i
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 2 and ch == "}" and self._question_start is not None:
+                    question = _loads_or_none(buf[self._question_start:i + 1])
+                    if question is not None:
+                        events.append(("question", question))
+                    self._question_start = None
+                elif self._depth == 0:
+                    events.extend(self._finish_member(buf[self._member_start:i]))
+                    self.closed = True
+            elif ch == "," and self._depth == 1:
+                events.extend(self._finish_member(buf[self._member_start:i]))
+                self._member_start = i + 1
+        self._pos = len(buf)
+        return events
+
+    def _finish_member(self, member_text):
+        self._array_key = None
+        if not member_text.strip():
+            return []
+        member = _loads_or_none("{" + member_text + "}")
+        if not member:
+            return []
+        return [(key, value) for key, value in member.items() if key != "questions"]
+
+
+def _loads_or_none(raw):
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError:
+        return None
+
+
+def normalize_question(question):
+    """편집기에서 쓸 수 있는 형태의 문항이면 정리해서 반환하고, 아니면 None을 반환합니다."""
+    if not isinstance(question, dict) or not question.get("title") or question.get("type") not in QUESTION_TYPES:
+        return None
+    options = question.get("options") or []
+    if question["type"] == "인풋박스":
+        options = []
+    return {"title": str(question["title"]), "type": question["type"], "options": [str(opt) for opt in options]}
+
+
+def stream_survey_draft(client, model, messages, **kwargs):
+    """설문 초안을 스트리밍으로 요청하고, 완성되는 필드/문항을 (키, 값)으로 차례대로 내보냅니다.
+
+    마지막에는 ("finish", finish_reason)과 ("complete", JSON 완결 여부)를 내보냅니다.
+    콘텐츠 필터 차단은 llm_gateway.ContentFilterError로 전달됩니다.
+    client는 OpenAI 클라이언트와 같은 with_options()/chat.completions.create(stream=True)만 있으면 되므로
+    청크를 흘려보내는 로컬 스텁으로도 테스트할 수 있습니다.
+    """
+    parser = DraftStreamParser()
+    finish_reason = None
+    stream = chat_completion("survey_draft", client=client, model=model, messages=messages, stream=True, **kwargs)
+    for chunk in stream:
+        # Azure는 프롬프트 필터 결과만 담긴 빈 choices 조각을 보내기도 합니다.
+        if not chunk.choices:
+            continue
+        choice = chunk.choices[0]
+        if choice.delta is not None and choice.delta.content:
+            for key, value in parser.feed(choice.delta.content):
+                if key == "question":
+                    value = normalize_question(value)
+                    if value is None:
+                        continue
+                yield key, value
+        if choice.finish_reason:
+            finish_reason = choice.finish_reason
+    yield "finish", finish_reason
+    yield "complete", parser.closed
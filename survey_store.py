@@ -0,0 +1,202 @@
+import hashlib
+import pandas as pd
+import random
+import time
+import uuid
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from query_cache import invalidate
+
+CHOICE_TYPES = ("라디오버튼", "체크박스")
+UNIQUE_VIOLATION = "23505"
+MAX_VERSION_RETRIES = 5
+
+INSERT_FIRST_VERSION = text("""
+    INSERT INTO surveys (survey_id, survey_group_id, survey_title, survey_content, page, version)
+    SELECT seq.id, seq.id, :title, :content, :page, 1
+    FROM (SELECT nextval('surveys_survey_id_seq') AS id) seq
+    RETURNING survey_id, version;
+""")
+
+INSERT_NEXT_VERSION = text("""
+    INSERT INTO surveys (survey_group_id, version, survey_title, survey_content, page)
+    SELECT :gid, COALESCE(MAX(version), 0) + 1, :title, :content, :page
+    FROM surveys WHERE survey_group_id = :gid
+    RETURNING survey_id, version;
+""")
+
+# 최신 버전 포인터는 버전 번호가 커질 때만 바꿔, 동시에 저장된 이전 버전이 덮어쓰지 않도록 합니다.
+UPSERT_SURVEY_GROUP = text("""
+    INSERT INTO survey_groups (survey_group_id, latest_survey_id, latest_version, survey_title, survey_content, page, latest_created_at, created_at)
+    SELECT survey_group_id, survey_id, version, survey_title, survey_content, page, created_at, created_at
+    FROM surveys WHERE survey_id = :sid
+    ON CONFLICT (survey_group_id) DO UPDATE SET
+        latest_survey_id = EXCLUDED.latest_survey_id,
+        latest_version = EXCLUDED.latest_version,
+        survey_title = EXCLUDED.survey_title,
+        survey_content = EXCLUDED.survey_content,
+        page = EXCLUDED.page,
+        latest_created_at = EXCLUDED.latest_created_at
+    WHERE survey_groups.latest_version < EXCLUDED.latest_version;
+""")
+
+SURVEY_GROUPS_PAGE_SQL = """
+    SELECT latest_survey_id AS survey_id, survey_group_id, survey_title, survey_content,
+           latest_version AS version, page, latest_created_at, created_at
+    FROM survey_groups
+    WHERE deleted_at IS NULL
+      AND (CAST(:search AS text) IS NULL OR (survey_title || ' ' || COALESCE(survey_content, '')) ILIKE :search)
+      AND (CAST(:after_created_at AS timestamp) IS NULL OR (created_at, survey_group_id) < (:after_created_at, :after_group_id))
+    ORDER BY created_at DESC, survey_group_id DESC
+    LIMIT :limit;
+"""
+SURVEY_GROUPS_PAGE = text(SURVEY_GROUPS_PAGE_SQL)
+
+ALLOCATE_ITEM_IDS = text("SELECT nextval('survey_items_item_id_seq') FROM generate_series(1, :n);")
+
+FIND_REUSABLE_ITEMS = text("""
+    SELECT DISTINCT ON (item_key, content_hash) CAST(item_key AS text), content_hash, item_id
+    FROM survey_items
+    WHERE item_key = ANY(CAST(:item_keys AS uuid[])) AND content_hash = ANY(CAST(:hashes AS text[]))
+    ORDER BY item_key, content_hash, item_id DESC;
+""")
+
+# 바뀐 문항만 미리 할당한 item_id로 새로 저장하고, 옵션은 문항 순번(ordinality)으로 item_id에 매핑합니다.
+# 버전의 문항 구성(survey_version_items)에는 재사용 문항과 새 문항이 모두 순서대로 들어갑니다.
+INSERT_VERSION_ITEMS = text("""
+    WITH new_items AS (
+        INSERT INTO survey_items (item_id, survey_id, item_title, item_type, item_key, content_hash)
+        SELECT t.item_id, :sid, t.item_title, t.item_type, t.item_key, t.content_hash
+        FROM unnest(CAST(:new_item_ids AS integer[]), CAST(:titles AS text[]), CAST(:types AS text[]),
+                    CAST(:new_item_keys AS uuid[]), CAST(:new_hashes AS text[]))
+             WITH ORDINALITY AS t(item_id, item_title, item_type, item_key, content_hash, ord)
+        ORDER BY t.ord
+        RETURNING item_id
+    ), new_options AS (
+        INSERT INTO item_options (item_id, option_content)
+        SELECT i.item_id, o.option_content
+        FROM unnest(CAST(:option_item_ords AS integer[]), CAST(:option_contents AS text[]))
+             WITH ORDINALITY AS o(item_ord, option_content, ord)
+        JOIN unnest(CAST(:new_item_ids AS integer[])) WITH ORDINALITY AS i(item_id, ord) ON i.ord = o.item_ord
+        ORDER BY o.ord
+        RETURNING option_id
+    )
+    INSERT INTO survey_version_items (survey_id, position, item_id)
+    SELECT :sid, m.position, m.item_id
+    FROM unnest(CAST(:member_ids AS integer[])) WITH ORDINALITY AS m(item_id, position);
+""")
+
+
+def _options_of(q_item):
+    return list(q_item["options"]) if q_item["type"] in CHOICE_TYPES else []
+
+
+def item_content_hash(q_item):
+    """문항 유형, 제목, 옵션으로 내용 해시를 만듭니다. (0016_item_owner_fk.sql의 재계산과 같은 방식)"""
+    parts = [q_item["type"], q_item["title"], *_options_of(q_item)]
+    return hashlib.md5("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def _write_survey_version(s, document):
+    params = {
+        "title": document["survey_title"],
+        "content": document.get("survey_content", ""),
+        "page": bool(document.get("page", False)),
+    }
+    group_id = document.get("survey_group_id")
+    if group_id is None:
+        survey_id, version = s.execute(INSERT_FIRST_VERSION, params).one()
+    else:
+        survey_id, version = s.execute(INSERT_NEXT_VERSION, {**params, "gid": group_id}).one()
+    s.execute(UPSERT_SURVEY_GROUP, {"sid": survey_id})
+
+    questions = document.get("questions", [])
+    if not questions:
+        return survey_id, version
+
+    hashes = [item_content_hash(q_item) for q_item in questions]
+    known_keys = [q_item["item_key"] for q_item in questions if q_item.get("item_key")]
+    reusable = {}
+    if known_keys:
+        rows = s.execute(FIND_REUSABLE_ITEMS, {"item_keys": known_keys, "hashes": hashes}).all()
+        reusable = {(item_key, content_hash): item_id for item_key, content_hash, item_id in rows}
+
+    # 내용이 같은 문항은 기존 item_id를 그대로 쓰고, 바뀐 문항만 같은 item_key로 새로 저장합니다.
+    member_ids, used_ids, new_questions = [], set(), []
+    for q_item, content_hash in zip(questions, hashes):
+        item_id = reusable.get((q_item.get("item_key"), content_hash))
+        if item_id is None or item_id in used_ids:
+            item_key = q_item.get("item_key") if item_id is None and q_item.get("item_key") else str(uuid.uuid4())
+            new_questions.append((len(member_ids), q_item, item_key, content_hash))
+        used_ids.add(item_id)
+        member_ids.append(item_id)
+
+    new_item_ids = []
+    if new_questions:
+        new_item_ids = list(s.execute(ALLOCATE_ITEM_IDS, {"n": len(new_questions)}).scalars().all())
+    option_item_ords, option_contents = [], []
+    for ord_, ((position, q_item, _, _), item_id) in enumerate(zip(new_questions, new_item_ids), start=1):
+        member_ids[position] = item_id
+        for option_content in _options_of(q_item):
+            option_item_ords.append(ord_)
+            option_contents.append(option_content)
+
+    s.execute(INSERT_VERSION_ITEMS, {
+        "sid": survey_id,
+        "new_item_ids": new_item_ids,
+        "titles": [q_item["title"] for _, q_item, _, _ in new_questions],
+        "types": [q_item["type"] for _, q_item, _, _ in new_questions],
+        "new_item_keys": [item_key for _, _, item_key, _ in new_questions],
+        "new_hashes": [content_hash for _, _, _, content_hash in new_questions],
+        "option_item_ords": option_item_ords,
+        "option_contents": option_contents,
+        "member_ids": member_ids,
+    })
+    return survey_id, version
+
+
+def save_survey_version(conn, document):
+    """설문과 모든 문항, 옵션을 고정된 수의 SQL 문으로 저장하고 (survey_id, version)을 반환합니다.
+
+    document에 survey_group_id가 없으면 새 설문 그룹(v1)을, 있으면 해당 그룹의 다음 버전을 만듭니다.
+    문항에 item_key가 있고 내용이 이전 버전과 같으면 기존 문항 행을 공유합니다.
+    같은 트랜잭션에서 survey_groups의 최신 버전 포인터도 갱신합니다.
+    동시 저장으로 (survey_group_id, version) 유니크 제약에 걸리면 잠시 후 다시 시도합니다.
+    """
+    for attempt in range(MAX_VERSION_RETRIES):
+        try:
+            with conn.session as s:
+                saved = _write_survey_version(s, document)
+                s.commit()
+            invalidate("surveys", survey_id=saved[0], group_id=document.get("survey_group_id") or saved[0])
+            return saved
+        except IntegrityError as e:
+            if getattr(e.orig, "pgcode", None) != UNIQUE_VIOLATION or attempt == MAX_VERSION_RETRIES - 1:
+                raise
+            time.sleep(random.uniform(0.01, 0.05) * (attempt + 1))
+
+
+def _like_pattern(search):
+    escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def list_survey_groups(s, search=None, after=None, limit=20):
+    """설문 그룹을 생성 시각 역순으로 한 페이지 읽고 (페이지, 다음 페이지 커서)를 반환합니다.
+
+    after는 이전 페이지가 돌려준 (created_at, survey_group_id) 커서이며, 마지막 페이지면 다음 커서는 None입니다.
+    search는 제목과 내용에서 부분 일치로 찾습니다. (pg_trgm GIN 인덱스 사용)
+    """
+    after_created_at, after_group_id = after if after else (None, None)
+    result = s.execute(SURVEY_GROUPS_PAGE, {
+        "search": _like_pattern(search.strip()) if search and search.strip() else None,
+        "after_created_at": after_created_at,
+        "after_group_id": after_group_id,
+        "limit": limit + 1,
+    })
+    page_df = pd.DataFrame(result.fetchall(), columns=list(result.keys()))
+    if len(page_df) <= limit:
+        return page_df, None
+    page_df = page_df.iloc[:limit]
+    last = page_df.iloc[-1]
+    return page_df, (last["created_at"].to_pydatetime(), int(last["survey_group_id"]))
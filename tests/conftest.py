@@ -0,0 +1,115 @@
+"""테스트 공용 준비물. 로컬 포트에 OpenAI 호환 가짜 서버를 띄워 실제 SDK/httpx 경로로 요청을 보냅니다."""
+import json
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import openai
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def completion(content="ok", finish_reason="stop"):
+    return {
+        "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": "gpt-test",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": finish_reason}],
+        "usage": {"prompt_tokens": 3, "completion_tokens": 5, "total_tokens": 8},
+    }
+
+
+def chunk(content=None, finish_reason=None):
+    return {
+        "id": "chatcmpl-test", "object": "chat.completion.chunk", "created": 0, "model": "gpt-test",
+        "choices": [{"index": 0, "delta": {"content": content} if content is not None else {}, "finish_reason": finish_reason}],
+    }
+
+
+def stream_of(text, size, finish_reason="stop"):
+    """text를 size 글자씩 잘라 스트리밍 조각 목록으로 만듭니다."""
+    return [chunk(text[i:i + size]) for i in range(0, len(text), size)] + [chunk(finish_reason=finish_reason)]
+
+
+class FakeOpenAI:
+    """요청마다 reply()로 넣어 둔 응답을 차례대로 돌려주는 가짜 서버입니다. 넣어 둔 응답이 없으면 마지막 응답을 반복합니다."""
+
+    def __init__(self):
+        self.replies = deque()
+        self.last = None
+        self.requests = []
+        self.lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("content-length", 0)))
+                with fake.lock:
+                    fake.requests.append(json.loads(body or b"{}"))
+                    reply = fake.replies.popleft() if fake.replies else fake.last
+                    fake.last = reply
+                try:
+                    fake._respond(self, **reply)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}/v1"
+
+    def reply(self, status=200, body=None, headers=None, delay=0, stream=None, cut=False):
+        """다음 요청의 응답을 넣어 둡니다. stream은 SSE로 보낼 조각 목록, cut이면 조각을 다 보낸 뒤 연결을 끊습니다."""
+        self.replies.append({"status": status, "body": body, "headers": headers or {}, "delay": delay, "stream": stream, "cut": cut})
+        return self
+
+    def client(self):
+        return openai.OpenAI(api_key="test", base_url=self.base_url, max_retries=0)
+
+    @staticmethod
+    def _respond(handler, status, body, headers, delay, stream, cut):
+        if delay:
+            time.sleep(delay)
+        handler.send_response(status)
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        if stream is None:
+            payload = json.dumps(body if body is not None else completion()).encode()
+            handler.send_header("content-type", "application/json")
+            handler.send_header("content-length", str(len(payload)))
+            handler.end_headers()
+            handler.wfile.write(payload)
+            return
+        handler.send_header("content-type", "text/event-stream")
+        handler.send_header("transfer-encoding", "chunked")
+        handler.end_headers()
+        events = [f"data: {json.dumps(item, ensure_ascii=False)}\n\n" for item in stream]
+        if not cut:
+            events.append("data: [DONE]\n\n")
+        for event in events:
+            data = event.encode()
+            handler.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            handler.wfile.flush()
+        if cut:
+            # 마지막 0 크기 청크 없이 끊어 httpx가 RemoteProtocolError를 내게 합니다.
+            handler.close_connection = True
+            return
+        handler.wfile.write(b"0\r\n\r\n")
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def fake_openai():
+    fake = FakeOpenAI()
+    yield fake
+    fake.close()
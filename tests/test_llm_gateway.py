@@ -0,0 +1,144 @@
+import threading
+import time
+from types import SimpleNamespace
+import httpx
+import pytest
+import llm_gateway
+from llm_gateway import ContentFilterError, LLMTimeoutError, LLMUnavailableError, chat_completion
+from conftest import chunk, completion
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    # 지터 백오프는 짧게 줄이고 Retry-After 대기만 남깁니다.
+    monkeypatch.setattr(llm_gateway, "LLM_BACKOFF_BASE_SECONDS", 0.01)
+    monkeypatch.setattr(llm_gateway, "_semaphore", threading.BoundedSemaphore(4))
+
+
+def call(fake, feature, **kwargs):
+    return chat_completion(feature, client=fake.client(), model="gpt-test", messages=MESSAGES, **kwargs)
+
+
+def test_rate_limit_honours_retry_after(fake_openai):
+    fake_openai.reply(429, {"error": {"message": "slow down"}}, headers={"retry-after": "1"}).reply(200, completion("done"))
+    started = time.monotonic()
+    response = call(fake_openai, "t_retry_after", deadline_seconds=10)
+    assert response.choices[0].message.content == "done"
+    assert time.monotonic() - started >= 1.0
+    assert len(fake_openai.requests) == 2
+    assert llm_gateway.ledger.summary()["t_retry_after"]["retries"] == 1
+
+
+def test_rate_limit_honours_retry_after_ms(fake_openai):
+    fake_openai.reply(429, {"error": {"message": "slow down"}}, headers={"retry-after-ms": "300", "retry-after": "30"})
+    fake_openai.reply(200, completion("done"))
+    started = time.monotonic()
+    call(fake_openai, "t_retry_after_ms", deadline_seconds=10)
+    # retry-after-ms가 있으면 retry-after(30초)보다 우선합니다.
+    assert 0.3 <= time.monotonic() - started < 5
+
+
+def test_server_errors_exhaust_retries(fake_openai, monkeypatch):
+    monkeypatch.setattr(llm_gateway, "LLM_MAX_RETRIES", 2)
+    fake_openai.reply(503, {"error": {"message": "unavailable"}})
+    with pytest.raises(LLMUnavailableError):
+        call(fake_openai, "t_exhaust", deadline_seconds=10)
+    assert len(fake_openai.requests) == 3
+
+
+def test_slow_server_times_out_at_deadline(fake_openai):
+    fake_openai.reply(200, completion(), delay=2)
+    started = time.monotonic()
+    with pytest.raises(LLMTimeoutError):
+        call(fake_openai, "t_timeout", deadline_seconds=0.5)
+    assert time.monotonic() - started < 1.5
+    assert llm_gateway.ledger.summary()["t_timeout"]["errors"] == 1
+
+
+def test_retry_after_past_deadline_fails_without_waiting(fake_openai):
+    fake_openai.reply(429, {"error": {"message": "slow down"}}, headers={"retry-after": "30"})
+    started = time.monotonic()
+    with pytest.raises(LLMUnavailableError):
+        call(fake_openai, "t_deadline", deadline_seconds=2)
+    assert time.monotonic() - started < 1
+    assert len(fake_openai.requests) == 1
+
+
+def test_saturated_semaphore_times_out_and_stream_holds_slot(fake_openai, monkeypatch):
+    monkeypatch.setattr(llm_gateway, "_semaphore", threading.BoundedSemaphore(1))
+    fake_openai.reply(stream=[chunk("a"), chunk("b"), chunk(finish_reason="stop")])
+    stream = call(fake_openai, "t_semaphore", stream=True)
+
+    with pytest.raises(LLMTimeoutError):
+        call(fake_openai, "t_semaphore", deadline_seconds=0.2)
+    assert len(fake_openai.requests) == 1
+
+    assert "".join(c.choices[0].delta.content or "" for c in stream if c.choices) == "ab"
+    fake_openai.reply(200, completion("after"))
+    assert call(fake_openai, "t_semaphore").choices[0].message.content == "after"
+
+
+def test_prompt_content_filter_is_normalized(fake_openai):
+    fake_openai.reply(400, {"error": {"message": "The prompt was filtered", "code": "content_filter", "param": "prompt", "type": None}})
+    with pytest.raises(ContentFilterError) as info:
+        call(fake_openai, "t_prompt_filter")
+    assert info.value.source == "prompt"
+    assert len(fake_openai.requests) == 1
+    assert llm_gateway.ledger.summary()["t_prompt_filter"]["filtered"] == 1
+
+
+def test_completion_content_filter_is_normalized(fake_openai):
+    fake_openai.reply(200, completion("", finish_reason="content_filter"))
+    with pytest.raises(ContentFilterError) as info:
+        call(fake_openai, "t_completion_filter")
+    assert info.value.source == "completion"
+
+
+def test_streamed_completion_content_filter_is_normalized(fake_openai, monkeypatch):
+    monkeypatch.setattr(llm_gateway, "_semaphore", threading.BoundedSemaphore(1))
+    fake_openai.reply(stream=[chunk("part"), chunk(finish_reason="content_filter")])
+    with pytest.raises(ContentFilterError) as info:
+        list(call(fake_openai, "t_stream_filter", stream=True))
+    assert info.value.source == "completion"
+    # 차단으로 끝난 스트림도 동시 실행 슬롯을 돌려줍니다.
+    assert llm_gateway._semaphore.acquire(timeout=0.1)
+
+
+def test_stream_cut_mid_response_is_normalized(fake_openai):
+    fake_openai.reply(stream=[chunk("part")], cut=True)
+    with pytest.raises(LLMTimeoutError):
+        list(call(fake_openai, "t_stream_cut", stream=True))
+    assert llm_gateway.ledger.summary()["t_stream_cut"]["errors"] == 1
+
+
+class RaisingStream:
+    """청크를 내보내다 httpx 전송 오류를 그대로 올리는 스트림입니다. (SDK 버전에 따라 감싸지 않고 올라오는 경우)"""
+
+    def __init__(self, error):
+        self.error = error
+        self.closed = False
+
+    def __iter__(self):
+        yield SimpleNamespace(usage=None, choices=[SimpleNamespace(finish_reason=None, delta=SimpleNamespace(content="part"))])
+        raise self.error
+
+    def close(self):
+        self.closed = True
+
+
+class StreamClient:
+    def __init__(self, stream):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=lambda **kwargs: stream))
+
+    def with_options(self, **kwargs):
+        return self
+
+
+@pytest.mark.parametrize("error", [httpx.ReadTimeout("read timed out"), httpx.RemoteProtocolError("peer closed connection")])
+def test_raw_transport_error_mid_stream_is_normalized(error):
+    stream = RaisingStream(error)
+    with pytest.raises(LLMTimeoutError):
+        list(chat_completion("t_raw_stream", client=StreamClient(stream), model="gpt-test", messages=MESSAGES, stream=True))
+    assert stream.closed
@@ -0,0 +1,94 @@
+import json
+import pytest
+from survey_draft import DraftStreamParser, stream_survey_draft
+from conftest import stream_of
+
+QUESTIONS = [
+    {"title": "서비스에 \"전반적으로\" 만족하셨나요? {괄호} [대괄호]", "type": "라디오버튼", "options": ["매우 만족", "보통, 그럭저럭", "불만족 \\ 기타"]},
+    {"title": "이용한 기능을 모두 고르세요", "type": "체크박스", "options": ["검색", "알림 {설정}", "결제 [카드]"]},
+    {"title": "개선할 점을 적어주세요\n(자유롭게)", "type": "인풋박스", "options": []},
+]
+DRAFT = {"survey_title": "만족도 \"조사\"", "survey_content": "설명\\경로 C:\\temp", "questions": QUESTIONS, "footer": {"note": [1, {"x": "}"}]}}
+TEXT = json.dumps(DRAFT, ensure_ascii=False)
+
+
+def feed_in_chunks(text, size):
+    parser = DraftStreamParser()
+    events = []
+    for i in range(0, len(text), size):
+        events.extend(parser.feed(text[i:i + size]))
+    return parser, events
+
+
+def expected_events():
+    return ([("question", q) for q in QUESTIONS]
+            + [("survey_title", DRAFT["survey_title"]), ("survey_content", DRAFT["survey_content"]), ("footer", DRAFT["footer"])])
+
+
+def test_whole_document():
+    parser, events = feed_in_chunks(TEXT, len(TEXT))
+    assert sorted(events, key=repr) == sorted(expected_events(), key=repr)
+    assert parser.closed
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 13])
+def test_chunk_boundaries_inside_strings_and_escapes(size):
+    # 크기 1~3이면 모든 이스케이프(\", \\, \n)와 문자열 안 괄호 사이에서 조각이 나뉩니다.
+    parser, events = feed_in_chunks(TEXT, size)
+    assert sorted(events, key=repr) == sorted(expected_events(), key=repr)
+    assert parser.closed
+
+
+def test_questions_are_emitted_as_soon_as_they_close():
+    parser = DraftStreamParser()
+    end_of_first = TEXT.index(json.dumps(QUESTIONS[0], ensure_ascii=False)) + len(json.dumps(QUESTIONS[0], ensure_ascii=False))
+    head = parser.feed(TEXT[:end_of_first])
+    assert ("question", QUESTIONS[0]) in head
+    assert all(key != "question" or value == QUESTIONS[0] for key, value in head)
+
+
+def test_nested_option_arrays_do_not_end_the_question():
+    text = json.dumps({"questions": [{"title": "q", "type": "체크박스", "options": [["a", "b"], {"c": ["d"]}]}]}, ensure_ascii=False)
+    _, events = feed_in_chunks(text, 4)
+    assert events == [("question", {"title": "q", "type": "체크박스", "options": [["a", "b"], {"c": ["d"]}]})]
+
+
+def test_text_before_json_is_skipped():
+    parser, events = feed_in_chunks("```json\n" + TEXT + "\n```", 6)
+    assert sorted(events, key=repr) == sorted(expected_events(), key=repr)
+    assert parser.closed
+
+
+def test_truncated_stream_keeps_completed_items():
+    cut = TEXT.index(json.dumps(QUESTIONS[1], ensure_ascii=False)) + 20
+    parser, events = feed_in_chunks(TEXT[:cut], 3)
+    assert ("question", QUESTIONS[0]) in events
+    assert ("survey_title", DRAFT["survey_title"]) in events
+    assert all(value != QUESTIONS[1] for _, value in events)
+    assert not parser.closed
+
+
+def test_truncated_inside_top_level_string():
+    parser, events = feed_in_chunks('{"survey_title": "끝나지 않은 \\"제목', 2)
+    assert events == []
+    assert not parser.closed
+
+
+def test_stream_survey_draft_against_local_server(fake_openai):
+    draft = dict(DRAFT, questions=QUESTIONS + [{"title": "", "type": "라디오버튼"}, {"title": "x", "type": "없는유형"}])
+    fake_openai.reply(stream=stream_of(json.dumps(draft, ensure_ascii=False), 9))
+    events = list(stream_survey_draft(fake_openai.client(), "gpt-test", [{"role": "user", "content": "주제"}]))
+    questions = [value for key, value in events if key == "question"]
+    # 편집기에서 쓸 수 없는 문항은 빠지고, 인풋박스의 선택지는 비웁니다.
+    assert [q["title"] for q in questions] == [q["title"] for q in QUESTIONS]
+    assert questions[2]["options"] == []
+    assert ("survey_title", DRAFT["survey_title"]) in events
+    assert events[-2:] == [("finish", "stop"), ("complete", True)]
+
+
+def test_stream_survey_draft_reports_truncation(fake_openai):
+    cut = TEXT.index(json.dumps(QUESTIONS[2], ensure_ascii=False)) + 5
+    fake_openai.reply(stream=stream_of(TEXT[:cut], 11, finish_reason="length"))
+    events = list(stream_survey_draft(fake_openai.client(), "gpt-test", [{"role": "user", "content": "주제"}]))
+    assert [value["title"] for key, value in events if key == "question"] == [QUESTIONS[0]["title"], QUESTIONS[1]["title"]]
+    assert events[-2:] == [("finish", "length"), ("complete", False)]
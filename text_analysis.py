@@ -0,0 +1,311 @@
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from functools import lru_cache
+import streamlit as st
+from dotenv import load_dotenv
+from sqlalchemy import text
+from tracing import span
+
+load_dotenv()
+
+# "azure"(기본값) 또는 "local"
+LANGUAGE_BACKEND = os.getenv("LANGUAGE_BACKEND", "azure")
+
+# Azure Language는 한 요청에 최대 10개 문서까지 분석합니다.
+AZURE_BATCH_SIZE = 10
+
+# 분석할 의미가 없는 답변입니다. 정규화한 뒤 비교하므로 "없음."이나 "특별히  없습니다!"도 걸러집니다. (쉼표로 구분)
+STOP_ANSWERS = os.getenv("STOP_ANSWERS", "없음,없습니다,없어요,특별히 없습니다,특별히 없음,딱히 없습니다,딱히 없음,모름,x,.")
+
+_PUNCTUATION_RUN = re.compile(r"[\s\W_]+")
+
+CACHE_LOOKUP = text("""
+    SELECT text_hash, sentiment_label, sentiment_score, key_phrases FROM text_analysis_cache
+    WHERE backend = :backend AND text_hash = ANY(:hashes);
+""")
+CACHE_STORE_SENTIMENT = text("""
+    INSERT INTO text_analysis_cache (backend, text_hash, normalized_text, sentiment_label, sentiment_score)
+    VALUES (:backend, :hash, :normalized, :label, :score)
+    ON CONFLICT (backend, text_hash) DO UPDATE SET sentiment_label = EXCLUDED.sentiment_label, sentiment_score = EXCLUDED.sentiment_score;
+""")
+CACHE_STORE_KEY_PHRASES = text("""
+    INSERT INTO text_analysis_cache (backend, text_hash, normalized_text, key_phrases)
+    VALUES (:backend, :hash, :normalized, CAST(:phrases AS jsonb))
+    ON CONFLICT (backend, text_hash) DO UPDATE SET key_phrases = EXCLUDED.key_phrases;
+""")
+
+
+def normalize_answer(answer):
+    """NFC로 맞추고 소문자로 바꾼 뒤, 공백과 문장부호가 이어진 부분을 공백 하나로 접습니다."""
+    return _PUNCTUATION_RUN.sub(" ", unicodedata.normalize("NFC", answer).lower()).strip()
+
+
+def answer_hash(normalized):
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+_STOP_ANSWERS = frozenset(normalize_answer(answer) for answer in STOP_ANSWERS.split(","))
+
+
+def is_stop_answer(answer):
+    """비어 있거나 문장부호뿐이거나 STOP_ANSWERS에 해당하는 답변이면 True입니다."""
+    normalized = normalize_answer(answer or "")
+    return not normalized or normalized in _STOP_ANSWERS
+
+
+class AzureLanguageBackend:
+    """Azure AI Language의 analyze_sentiment / extract_key_phrases를 사용하는 백엔드입니다."""
+
+    name = "azure"
+
+    def __init__(self, client=None):
+        if client is None:
+            from clients import get_text_analytics_client
+            client = get_text_analytics_client()
+        self.client = client
+
+    def analyze_sentiment(self, texts):
+        """문서별 (레이블, 점수) 목록을 반환합니다. 분석에 실패한 문서는 (None, None)입니다."""
+        results = []
+        with span("language.analyze_sentiment", "language", backend=self.name, docs=len(texts)):
+            for start in range(0, len(texts), AZURE_BATCH_SIZE):
+                for doc in self.client.analyze_sentiment(documents=texts[start:start + AZURE_BATCH_SIZE]):
+                    if doc.is_error:
+                        results.append((None, None))
+                        continue
+                    # mixed는 기존 레이블 체계(positive/negative/neutral)에 맞춰 neutral로 저장합니다.
+                    label = doc.sentiment if doc.sentiment in ("positive", "negative") else "neutral"
+                    results.append((label, getattr(doc.confidence_scores, label)))
+        return results
+
+    def extract_key_phrases(self, texts):
+        """문서별 핵심 구문 목록을 반환합니다."""
+        results = []
+        with span("language.extract_key_phrases", "language", backend=self.name, docs=len(texts)):
+            for start in range(0, len(texts), AZURE_BATCH_SIZE):
+                for doc in self.client.extract_key_phrases(texts[start:start + AZURE_BATCH_SIZE]):
+                    results.append([] if doc.is_error else list(doc.key_phrases))
+        return results
+
+
+POSITIVE_STEMS = (
+    "좋", "만족", "훌륭", "최고", "친절", "편리", "편하", "편해", "깨끗", "맛있", "감사", "고맙", "추천", "빠르", "빨라",
+    "유용", "도움", "쾌적", "기쁘", "즐겁", "즐거", "행복", "괜찮", "신선", "다양", "저렴", "완벽", "멋지", "멋져", "충분",
+)
+NEGATIVE_STEMS = (
+    "나쁘", "나빠", "불만", "불편", "불친절", "별로", "최악", "싫", "느리", "느려", "비싸", "비싼", "더럽", "더러", "맛없",
+    "부족", "아쉽", "아쉬", "문제", "짜증", "실망", "어렵", "어려", "복잡", "시끄", "좁", "늦", "불쾌", "불안", "힘들",
+)
+PREDICATE_ENDINGS = ("요", "다", "고", "며", "서", "지", "게", "면", "데", "죠", "네")
+JOSA_SUFFIXES = tuple(sorted((
+    "으로부터", "에서부터", "이라고", "에게서", "으로서", "으로써", "에서는", "에게는", "에서", "에게", "으로", "부터",
+    "까지", "처럼", "보다", "이나", "라고", "하고", "이며", "이고", "에는", "은", "는", "이", "가", "을", "를", "에",
+    "의", "도", "로", "와", "과", "만",
+), key=len, reverse=True))
+STOPWORDS = {
+    "있습니다", "합니다", "했습니다", "입니다", "같습니다", "좋겠습니다", "있으면", "했으면", "있어요", "해요", "같아요",
+    "그리고", "하지만", "그래서", "너무", "정말", "조금", "많이", "매우", "아주", "그냥", "가끔", "항상", "특히", "없음", "없습니다",
+}
+
+_TOKEN_PATTERN = re.compile(r"[가-힣A-Za-z0-9]+")
+
+
+@lru_cache(maxsize=50000)
+def _token_polarity(token):
+    # 부정 어간을 먼저 확인해야 "불친절"이 "친절"로 잡히지 않습니다.
+    if any(stem in token for stem in NEGATIVE_STEMS):
+        return -1
+    if any(stem in token for stem in POSITIVE_STEMS):
+        return 1
+    return 0
+
+
+@lru_cache(maxsize=50000)
+def _is_negation(token):
+    return token in ("안", "못") or any(token.startswith(neg) for neg in ("않", "없", "못하"))
+
+
+@lru_cache(maxsize=50000)
+def _strip_josa(token):
+    for suffix in JOSA_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 2:
+            return token[:-len(suffix)]
+    return token
+
+
+@lru_cache(maxsize=50000)
+def _is_predicate(token):
+    # 핵심 구문은 명사구 위주로 뽑기 위해 용언 활용형으로 끝나는 토큰은 제외합니다.
+    return token.endswith(PREDICATE_ENDINGS)
+
+
+def _tokens(text):
+    return _TOKEN_PATTERN.findall(text)
+
+
+class LocalLanguageBackend:
+    """외부 호출 없이 한국어 감성 사전 규칙과 TextRank로 분석하는 프로세스 내 백엔드입니다.
+
+    대량 백필처럼 API 비용과 지연이 부담되는 작업을 위한 것으로, Azure 결과와의 일치율은
+    bench/language_backends.py로 확인할 수 있습니다.
+    """
+
+    name = "local"
+
+    def __init__(self, top_k=5, window=2, iterations=20, damping=0.85):
+        self.top_k = top_k
+        self.window = window
+        self.iterations = iterations
+        self.damping = damping
+
+    def analyze_sentiment(self, texts):
+        with span("language.analyze_sentiment", "language", backend=self.name, docs=len(texts)):
+            return [self._score(_tokens(text)) for text in texts]
+
+    def _score(self, tokens):
+        positive = negative = 0
+        for i, token in enumerate(tokens):
+            polarity = _token_polarity(token)
+            if not polarity:
+                continue
+            # "좋지 않아요", "불만 없습니다", "안 좋아요"처럼 앞뒤의 부정 표현은 극성을 뒤집습니다.
+            if (i + 1 < len(tokens) and _is_negation(tokens[i + 1])) or (i > 0 and tokens[i - 1] in ("안", "못")):
+                polarity = -polarity
+            if polarity > 0:
+                positive += 1
+            else:
+                negative += 1
+
+        if positive == negative:
+            return "neutral", round(1 / (1 + positive + negative), 4)
+        label = "positive" if positive > negative else "negative"
+        return label, round((max(positive, negative) + 0.5) / (positive + negative + 1), 4)
+
+    def extract_key_phrases(self, texts):
+        with span("language.extract_key_phrases", "language", backend=self.name, docs=len(texts)):
+            return self._extract_key_phrases(texts)
+
+    def _extract_key_phrases(self, texts):
+        # 제외된 토큰 자리는 None으로 남겨, 원문에서 실제로 붙어 있던 단어끼리만 2-gram을 만듭니다.
+        slots = [[self._content_token(token) for token in _tokens(text)] for text in texts]
+        ranks = self._textrank([[token for token in doc if token] for doc in slots])
+
+        results = []
+        for doc in slots:
+            candidates = Counter()
+            for i, token in enumerate(doc):
+                if not token:
+                    continue
+                candidates[token] = max(candidates[token], ranks.get(token, 0))
+                if i + 1 < len(doc) and doc[i + 1] and doc[i + 1] != token:
+                    bigram = f"{token} {doc[i + 1]}"
+                    candidates[bigram] = max(candidates[bigram], ranks.get(token, 0) + ranks.get(doc[i + 1], 0))
+            picked = []
+            for phrase, _ in candidates.most_common():
+                # 이미 고른 구문과 단어가 겹치면 중복으로 보고 건너뜁니다.
+                if any(set(phrase.split(" ")) & set(chosen.split(" ")) for chosen in picked):
+                    continue
+                picked.append(phrase)
+                if len(picked) >= self.top_k:
+                    break
+            results.append(picked)
+        return results
+
+    @staticmethod
+    def _content_token(token):
+        token = _strip_josa(token)
+        if len(token) < 2 or token in STOPWORDS or _is_predicate(token):
+            return None
+        return token
+
+    def _textrank(self, docs):
+        """배치 전체의 동시 출현 그래프로 단어 중요도를 계산합니다."""
+        graph = defaultdict(Counter)
+        for doc in docs:
+            for i, token in enumerate(doc):
+                for other in doc[i + 1:i + 1 + self.window]:
+                    if other != token:
+                        graph[token][other] += 1
+                        graph[other][token] += 1
+        if not graph:
+            return {token: 1.0 for doc in docs for token in doc}
+
+        out_weight = {node: sum(edges.values()) for node, edges in graph.items()}
+        rank = dict.fromkeys(graph, 1.0)
+        for _ in range(self.iterations):
+            rank = {
+                node: (1 - self.damping) + self.damping * sum(rank[other] * weight / out_weight[other] for other, weight in edges.items())
+                for node, edges in graph.items()
+            }
+        for doc in docs:
+            for token in doc:
+                rank.setdefault(token, 1 - self.damping)
+        return rank
+
+
+class CachedLanguageBackend:
+    """text_analysis_cache에 결과가 없는 답변만 backend로 분석하는 래퍼입니다.
+
+    session_factory는 `with session_factory() as s:`로 쓸 수 있는 세션을 돌려주는 함수입니다.
+    (st.connection이면 `lambda: conn.session`, 워커에서는 `lambda: Session(engine)`)
+    같은 배치 안에서 정규화 결과가 같은 답변도 한 번만 분석합니다.
+    """
+
+    def __init__(self, backend, session_factory):
+        self.backend = backend
+        self.name = backend.name
+        self.session_factory = session_factory
+
+    def analyze_sentiment(self, texts):
+        return self._cached(texts, "sentiment", self.backend.analyze_sentiment, CACHE_STORE_SENTIMENT,
+                            lambda row: (row.sentiment_label, row.sentiment_score) if row.sentiment_label else None,
+                            lambda result: {"label": result[0], "score": result[1]} if result[0] and result[1] is not None else None)
+
+    def extract_key_phrases(self, texts):
+        return self._cached(texts, "key_phrases", self.backend.extract_key_phrases, CACHE_STORE_KEY_PHRASES,
+                            lambda row: row.key_phrases,
+                            lambda result: {"phrases": json.dumps(result, ensure_ascii=False)})
+
+    def _cached(self, texts, kind, analyze, store_query, from_row, to_params):
+        normalized = [normalize_answer(t) for t in texts]
+        hashes = [answer_hash(n) for n in normalized]
+        with self.session_factory() as s:
+            rows = s.execute(CACHE_LOOKUP, {"backend": self.name, "hashes": list(set(hashes))}).all()
+        found = {row.text_hash: from_row(row) for row in rows}
+        found = {h: result for h, result in found.items() if result is not None}
+
+        # 캐시에 없는 답변은 정규화 결과마다 첫 원문 하나만 분석합니다.
+        misses = {}
+        for original, h in zip(texts, hashes):
+            if h not in found:
+                misses.setdefault(h, original)
+        with span(f"language.cache.{kind}", "language", backend=self.name, docs=len(texts), misses=len(misses)):
+            if misses:
+                results = analyze(list(misses.values()))
+                params = []
+                for (h, original), result in zip(misses.items(), results):
+                    found[h] = result
+                    stored = to_params(result)
+                    if stored is not None:
+                        params.append({"backend": self.name, "hash": h, "normalized": normalize_answer(original), **stored})
+                if params:
+                    with self.session_factory() as s:
+                        s.execute(store_query, params)
+                        s.commit()
+        return [found[h] for h in hashes]
+
+
+BACKENDS = {"azure": AzureLanguageBackend, "local": LocalLanguageBackend}
+
+
+@st.cache_resource
+def get_language_backend(name=None):
+    """LANGUAGE_BACKEND 환경변수로 선택한 감성/핵심구문 분석 백엔드를 반환합니다."""
+    name = name or LANGUAGE_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"지원하지 않는 LANGUAGE_BACKEND입니다: {name}")
+    return BACKENDS[name]()
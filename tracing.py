@@ -0,0 +1,164 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from collections import defaultdict, deque
+from contextlib import contextmanager, nullcontext
+from dotenv import load_dotenv
+from sqlalchemy import event
+
+load_dotenv()
+
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "0") == "1"
+# 관리자 화면 사이드바에 실행 시간 패널을 표시합니다. (TRACE_ENABLED=1일 때만 의미가 있습니다)
+TRACE_PANEL = os.getenv("TRACE_PANEL", "0") == "1"
+HISTOGRAM_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+logger = logging.getLogger("survey.trace")
+if TRACE_ENABLED and not logger.handlers:
+    # Streamlit 앱은 logging을 설정하지 않으므로, 스팬 로그(한 줄에 JSON 하나)는 여기서 직접 stderr로 내보냅니다.
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+_NOOP_SPAN = nullcontext()
+_local = threading.local()
+_instrumented_engines = weakref.WeakSet()
+
+
+class SpanRegistry:
+    """페이지별, 스팬별 실행 시간 히스토그램과 최근 스팬을 보관합니다."""
+
+    def __init__(self, recent=200):
+        self._lock = threading.Lock()
+        self._histograms = defaultdict(lambda: {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "buckets": [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)})
+        self._recent = defaultdict(lambda: deque(maxlen=recent))
+
+    def record(self, page, kind, name, duration_ms, attrs):
+        with self._lock:
+            hist = self._histograms[(page, kind, name)]
+            hist["count"] += 1
+            hist["total_ms"] += duration_ms
+            hist["max_ms"] = max(hist["max_ms"], duration_ms)
+            hist["buckets"][bisect_left(HISTOGRAM_BUCKETS_MS, duration_ms)] += 1
+            self._recent[page].append({"kind": kind, "name": name, "ms": round(duration_ms, 2), **attrs})
+
+    def histograms(self, page=None):
+        with self._lock:
+            rows = []
+            for (span_page, kind, name), hist in self._histograms.items():
+                if page is not None and span_page != page:
+                    continue
+                rows.append({
+                    "page": span_page, "kind": kind, "name": name, "count": hist["count"],
+                    "avg_ms": round(hist["total_ms"] / hist["count"], 2), "max_ms": round(hist["max_ms"], 2),
+                    "buckets": dict(zip([f"<={b}ms" for b in HISTOGRAM_BUCKETS_MS] + ["inf"], hist["buckets"])),
+                })
+            return rows
+
+    def recent(self, page):
+        with self._lock:
+            return list(self._recent[page])
+
+
+registry = SpanRegistry()
+
+
+def current_page():
+    return getattr(_local, "page", "unknown")
+
+
+def record_span(name, kind, duration_ms, **attrs):
+    if not TRACE_ENABLED:
+        return
+    page = current_page()
+    registry.record(page, kind, name, duration_ms, attrs)
+    logger.info(json.dumps({"page": page, "kind": kind, "name": name, "ms": round(duration_ms, 2), **attrs}, ensure_ascii=False, default=str))
+
+
+def span(name, kind="render", **attrs):
+    """이름 붙은 구간의 실행 시간을 기록합니다. 비활성화 상태에서는 아무 일도 하지 않는 컨텍스트를 반환합니다."""
+    if not TRACE_ENABLED:
+        return _NOOP_SPAN
+    return _timed_span(name, kind, attrs)
+
+
+@contextmanager
+def _timed_span(name, kind, attrs):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, kind, (time.perf_counter() - started) * 1000, **attrs)
+
+
+def _params_shape(params):
+    # 값 대신 형태만 남겨 로그에 개인정보가 남지 않도록 합니다.
+    if isinstance(params, (list, tuple)) and params and isinstance(params[0], dict):
+        return f"{len(params)} rows"
+    if isinstance(params, dict):
+        return {key: f"list[{len(value)}]" if isinstance(value, (list, tuple)) else type(value).__name__ for key, value in params.items()}
+    return type(params).__name__
+
+
+def _statement_name(statement):
+    return re.sub(r"\s+", " ", statement).strip()[:120]
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("trace_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["trace_started"].pop()
+    record_span(_statement_name(statement), "sql", (time.perf_counter() - started) * 1000, params=_params_shape(parameters))
+
+
+def _handle_error(context):
+    # 실패한 문장은 after_cursor_execute가 불리지 않으므로 여기서 시작 시각을 꺼냅니다.
+    # 남겨 두면 풀로 돌아간 연결의 다음 SQL 스팬 시간이 모두 어긋납니다.
+    started = context.connection.info.get("trace_started") if context.connection is not None else None
+    if started:
+        record_span(_statement_name(context.statement or ""), "sql", (time.perf_counter() - started.pop()) * 1000,
+                    params=_params_shape(context.parameters), ok=False)
+
+
+def trace_page(page, conn=None):
+    """현재 스크립트 실행의 페이지 이름을 지정하고, 연결의 SQL 실행 시간을 기록하도록 합니다."""
+    _local.page = page
+    if not TRACE_ENABLED or conn is None:
+        return
+    engine = conn.engine
+    if engine not in _instrumented_engines:
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+        _instrumented_engines.add(engine)
+
+
+def render_timing_panel():
+    """관리자용 실행 시간 패널을 사이드바에 그립니다."""
+    if not (TRACE_ENABLED and TRACE_PANEL):
+        return
+    import pandas as pd
+    import streamlit as st
+    from clients import get_latency_stats
+    from llm_gateway import get_llm_ledger
+
+    page = current_page()
+    with st.sidebar.expander("⏱️ 실행 시간", expanded=False):
+        hist = registry.histograms(page)
+        if hist:
+            df = pd.DataFrame(hist).drop(columns=["page", "buckets"]).sort_values("avg_ms", ascending=False)
+            st.dataframe(df, hide_index=True, use_container_width=True)
+        st.caption("최근 스팬")
+        st.dataframe(pd.DataFrame(registry.recent(page)[-30:]), hide_index=True, use_container_width=True)
+        st.caption("외부 호출 지연 시간")
+        st.json(get_latency_stats(), expanded=False)
+        st.caption("LLM 사용량")
+        st.json(get_llm_ledger(), expanded=False)